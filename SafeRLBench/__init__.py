@@ -9,6 +9,7 @@ config = SRBConfig(logging.getLogger(__name__))
 
 from .monitor import AlgoMonitor, EnvMonitor
 from .base import EnvironmentBase, Space, AlgorithmBase, Policy, ProbPolicy
+from .evaluation import evaluate
 from .bench import Bench, BenchConfig
 from . import algo
 from . import envs
@@ -28,6 +29,7 @@ __all__ = ['EnvironmentBase',
            'SRBConfig',
            'Bench',
            'BenchConfig',
+           'evaluate',
            'envs',
            'algo',
            'policy',
@@ -8,6 +8,9 @@ PolicyGradient      Different Policy Gradient Implementations
 DiscreteQLearning   Q-Learning using a table
 SafeOpt             Bayesian Optimization with SafeOpt
 SafeOptSwarm        Bayesion Optimization with SafeOptSwarm
+CrossEntropy        Cross-Entropy Method
+CMAES               Covariance Matrix Adaptation Evolution Strategy
+ARS                 Augmented Random Search
 =================== =========================================
 """
 
@@ -15,6 +18,7 @@ from .policygradient import PolicyGradient
 from .safeopt import SafeOpt, SafeOptSwarm
 from .a3c import A3C
 from .q_learning import DiscreteQLearning
+from .population import CrossEntropy, CMAES, ARS
 
 __all__ = ['PolicyGradient', 'SafeOpt', 'A3C', 'DiscreteQLearning',
-           'SafeOptSwarm']
+           'SafeOptSwarm', 'CrossEntropy', 'CMAES', 'ARS']
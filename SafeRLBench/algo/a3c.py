@@ -232,9 +232,6 @@ class _Worker(object):
         with sess.as_default():
             sess.run(self.copy_params_op)
 
-            # perform a rollout
-            trace = self.env.rollout(self.local_policy)
-
             advantages = []
             values = []
             states = []
@@ -242,8 +239,10 @@ class _Worker(object):
 
             value = 0.
 
+            # perform a rollout
             tot_reward = 0.
-            for (action, state, reward) in trace:
+            for (action, state, reward) in self.env.rollout_iter(
+                    self.local_policy):
                 state = state.flatten()
 
                 value = reward + self.discount * value
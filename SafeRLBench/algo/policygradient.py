@@ -1,12 +1,14 @@
 """Policy Gradient implementations."""
 
 from SafeRLBench import AlgorithmBase
+from SafeRLBench.evaluation import evaluate
 from SafeRLBench.spaces import BoundedSpace
 
 import numpy as np
 from numpy.linalg import solve, norm
 
 from abc import ABCMeta, abstractmethod
+from collections import deque
 from six import add_metaclass
 
 import logging
@@ -17,8 +19,8 @@ logger = logging.getLogger(__name__)
 class PolicyGradient(AlgorithmBase):
     """Implementing many policy gradient methods.
 
-    This uses standard gradient descent using different policy gradient
-    estimators.
+    This uses gradient ascent using different policy gradient estimators and
+    update rules.
 
     Attributes
     ----------
@@ -38,6 +40,16 @@ class PolicyGradient(AlgorithmBase):
         smaller than `eps`.
     rate : float
         This is the rate we use for the updates in each step
+    optimizer :
+        PolicyGradientOptimizer instance computing the updates.
+    init_candidates : int
+        Number of candidate parameters screened at once during
+        initialization.
+    init_screen : int
+        Number of the best screened candidates receiving a full gradient
+        estimate during initialization.
+    seed : int
+        Seed of the shift of the initialization candidates.
 
     Notes
     -----
@@ -52,13 +64,34 @@ class PolicyGradient(AlgorithmBase):
     +------------+---------------------------------+
     |'gpomdp'    | Uses GPOMDP estimator.          |
     +------------+---------------------------------+
+    |'analytic'  | Uses the environment gradient.  |
+    +------------+---------------------------------+
+
+    These strings can be used to access the implemented optimizers.
+
+    +--------------+-------------------------------------------+
+    |'sgd'         | Plain gradient steps.                     |
+    +--------------+-------------------------------------------+
+    |'momentum'    | Gradient steps with momentum.             |
+    +--------------+-------------------------------------------+
+    |'adam'        | Adam.                                     |
+    +--------------+-------------------------------------------+
+    |'rmsprop'     | RMSProp.                                  |
+    +--------------+-------------------------------------------+
+    |'natural'     | Natural gradient with a sampled Fisher.   |
+    +--------------+-------------------------------------------+
+    |'line_search' | Backtracking line search along the        |
+    |              | gradient.                                 |
+    +--------------+-------------------------------------------+
     """
 
     def __init__(self,
                  environment, policy, estimator='reinforce',
                  max_it=1000, eps=0.0001, est_eps=0.001,
                  parameter_space=BoundedSpace(0, 1, (3,)),
-                 rate=1, var=0.5):
+                 rate=1, var=0.5, estimator_kwargs=None, optimizer='sgd',
+                 optimizer_kwargs=None, init_candidates=32, init_screen=4,
+                 seed=None):
         """Initialize PolicyGradient.
 
         Parameters
@@ -87,6 +120,27 @@ class PolicyGradient(AlgorithmBase):
             This parameter will be used depending on the estimator type. e.g.
             for central differences this value corresponds to the grid size
             that is used.
+        estimator_kwargs : dict
+            Additional keyword arguments for the estimator, e.g. n_jobs for
+            the finite difference estimators.
+        optimizer :
+            Either an optimizer class, that is a subclass of
+            PolicyGradientOptimizer or a string. A list of possible optimizer
+            strings can be found in the Notes section. By default 'sgd' will
+            be used.
+        optimizer_kwargs : dict
+            Additional keyword arguments for the optimizer, e.g. beta for
+            momentum.
+        init_candidates : int
+            If the policy is not initialized, candidate parameters are drawn
+            from a randomly shifted Halton sequence in batches of this size
+            and screened with a single rollout each.
+        init_screen : int
+            Number of the best screened candidates of a batch, which get a
+            full gradient estimate.
+        seed : int
+            Seed for the random shift of the Halton sequence, such that the
+            initialization can be reproduced.
         """
         super(PolicyGradient, self).__init__(environment, policy, max_it)
 
@@ -102,36 +156,70 @@ class PolicyGradient(AlgorithmBase):
         else:
             raise ImportError('Invalid Estimator')
 
+        if estimator_kwargs is None:
+            estimator_kwargs = {}
+
         self.estimator = estimator(environment, self.parameter_space, max_it,
-                                   est_eps, var)
+                                   est_eps, var, **estimator_kwargs)
+
+        if isinstance(optimizer, str):
+            optimizer = optimizers[optimizer]
+        elif not issubclass(optimizer, PolicyGradientOptimizer):
+            raise ImportError('Invalid Optimizer')
+
+        if optimizer_kwargs is None:
+            optimizer_kwargs = {}
+
+        self.optimizer = optimizer(environment, rate, **optimizer_kwargs)
+
+        self.init_candidates = init_candidates
+        self.init_screen = init_screen
+        self.seed = seed
 
     def _initialize(self):
+        self.optimizer.reset()
+
         logger.debug("Initializing Policy.")
         # check if policy is already initialized by the user
         if self.policy.initialized:
             logger.debug("Use pre-set policy parameters.")
             return self.policy.parameters
 
-        # outerwise draw an element at random from the parameter space
-        parameter = self.parameter_space.sample()
+        # otherwise screen batches of candidates from the parameter space
+        # and estimate the gradient of the most promising ones
+        random = np.random.RandomState(self.seed)
+        shift = random.rand(self.parameter_space.dimension)
 
-        for _ in range(1000):
-            self.policy.parameters = parameter
-            grad = self.estimator(self.policy)
+        n_jobs = getattr(self.estimator, 'n_jobs', 1)
+        backend = 'process' if n_jobs > 1 else 'vectorized'
+        for skip in range(0, 1000, self.init_candidates):
+            candidates = self._candidates(self.init_candidates, skip, shift)
 
-            if (norm(grad) >= 1000 * self.eps):
-                return parameter
+            self.policy.parameters = candidates[0]
+            scores = evaluate(self.environment, self.policy, candidates,
+                              backend=backend, n_jobs=n_jobs,
+                              average=True)[:, 0]
 
-            parameter = self.parameter_space.sample()
+            for i in np.argsort(-scores)[:self.init_screen]:
+                self.policy.parameters = candidates[i]
+                grad = self.estimator(self.policy)
+
+                if (norm(grad) >= 1000 * self.eps):
+                    return candidates[i]
 
         logger.error('Unable to find non-zero gradient.')
 
+    def _candidates(self, n, skip, shift):
+        """Return n points of the shifted Halton sequence in the space."""
+        space = self.parameter_space
+        points = (_halton(n, space.dimension, skip + 1) + shift) % 1.
+        points = points.reshape((n,) + space.shape)
+        return space.lower + points * (space.upper - space.lower)
+
     def _step(self):
         grad = self.estimator(self.policy)
 
-        parameter = self.policy.parameters
-
-        self.policy.parameters = parameter + self.rate * grad
+        self.policy.parameters = self.optimizer(self.policy, grad)
 
         self.grad = grad
 
@@ -170,143 +258,290 @@ class PolicyGradientEstimator(object):
     def _estimate_gradient(self, policy):
         pass
 
+    def _evaluate(self, policy, parameters, n_jobs=1, seed=None):
+        """Return the average reward of a rollout for every parameter.
+
+        The rollouts are performed by `evaluate` with the vectorized
+        backend, hence with rollout_batch. If n_jobs is larger than one, the
+        process backend is used instead. If a seed is given, the environment
+        and the policy are reseeded with it before every rollout.
+        """
+        if n_jobs > 1:
+            backend = 'process'
+        elif seed is None:
+            backend = 'vectorized'
+        else:
+            backend = 'serial'
+
+        seeds = None if seed is None else [seed]
+        return evaluate(self.environment, policy, parameters, seeds=seeds,
+                        backend=backend, n_jobs=n_jobs, average=True)[:, 0]
+
+    def _common_seed(self):
+        """Draw the seed shared by the rollouts of an estimate, if any."""
+        if not getattr(self, 'crn', False):
+            return None
+        return self.random.randint(2**31)
+
+    def _sample_traces(self, policy, n):
+        """Sample n traces of a probabilistic policy.
+
+        The traces are drawn with a single call of `evaluate` and the scores
+        of all their steps are computed with one call of grad_log_prob_batch.
+
+        Returns
+        -------
+        scores : ndarray
+            Array of shape (n, horizon) + parameters.shape containing the
+            gradients of the log probabilities, zero after the end of a trace.
+        rewards : ndarray
+            Array of shape (n, horizon) containing the rewards, zero after
+            the end of a trace.
+        mask : ndarray
+            Boolean array of shape (n, horizon) indicating the steps which
+            are part of the trace.
+        """
+        h = self.environment.horizon
+        parameters = np.repeat(policy.parameters[np.newaxis], n, axis=0)
+        _, traces = evaluate(self.environment, policy, parameters,
+                             traces=True)
+        traces = [trace for trace, in traces]
+
+        scores = np.zeros((n, h) + policy.parameters.shape)
+        rewards = np.zeros((n, h))
+        mask = np.zeros((n, h), dtype=bool)
+
+        lengths = np.array([len(trace) for trace in traces])
+        if not lengths.any():
+            return scores, rewards, mask
+        mask[:] = np.arange(h) < lengths[:, np.newaxis]
+
+        # the steps of all traces in the order of the mask
+        actions = [a for trace in traces for a, _, _ in trace]
+        states = [s for trace in traces for _, s, _ in trace]
+        rewards[mask] = [r for trace in traces for _, _, r in trace]
+        scores[mask] = policy.grad_log_prob_batch(states, actions)
+
+        buffer = getattr(self, '_buffer', None)
+        if buffer is not None:
+            starts = np.cumsum(lengths) - lengths
+            log_probs = np.add.reduceat(
+                policy.log_prob_batch(states, actions), starts[lengths > 0])
+            for i, log_prob in zip(np.flatnonzero(lengths), log_probs):
+                step = slice(starts[i], starts[i] + lengths[i])
+                buffer.append((np.array(states[step]),
+                               np.array(actions[step]), rewards[i].copy(),
+                               log_prob))
+
+        return scores, rewards, mask
+
+    def _replay_traces(self, policy):
+        """Reweight the buffered traces for the current parameters.
+
+        The traces are weighted with the ratio of their probability under the
+        current and under the sampling parameters, truncated at max_weight.
+
+        Returns
+        -------
+        scores, rewards, mask :
+            As returned by _sample_traces.
+        weights : ndarray
+            Array of shape (m,) containing the importance weights.
+        """
+        h = self.environment.horizon
+        m = len(self._buffer)
+
+        scores = np.zeros((m, h) + policy.parameters.shape)
+        rewards = np.zeros((m, h))
+        mask = np.zeros((m, h), dtype=bool)
+        log_ratios = np.zeros(m)
+
+        for i, (states, actions, trace_rewards, log_prob) in enumerate(
+                self._buffer):
+            length = len(states)
+            scores[i, :length] = policy.grad_log_prob_batch(states, actions)
+            rewards[i] = trace_rewards
+            mask[i, :length] = True
+            log_ratios[i] = (policy.log_prob_batch(states, actions).sum()
+                             - log_prob)
+
+        weights = np.exp(np.minimum(log_ratios, np.log(self.max_weight)))
+
+        # traces which are impossible under the current parameters
+        keep = weights > 0
+        return scores[keep], rewards[keep], mask[keep], weights[keep]
+
+    def _weighted_batches(self, policy):
+        """Yield the replayed traces followed by batches of new traces.
+
+        New traces are sampled in batches of batch_size until max_it traces
+        have been sampled, they have unit weight. The last element of every
+        tuple indicates whether the traces are replayed.
+        """
+        if getattr(self, '_buffer', None):
+            replayed = self._replay_traces(policy)
+            if len(replayed[3]):
+                yield replayed + (True,)
+
+        n = 0
+        while n < self.max_it:
+            size = min(self.batch_size, self.max_it - n)
+            scores, rewards, mask = self._sample_traces(policy, size)
+            yield scores, rewards, mask, np.ones(size), False
+            n += size
+
 
 class ForwardFDEstimator(PolicyGradientEstimator):
-    """Forward Finite Differences Gradient Estimator."""
+    """Forward Finite Differences Gradient Estimator.
+
+    All perturbed parameters are evaluated with a single batched rollout,
+    which is distributed over a process pool of environment replicas if
+    `n_jobs` is larger than one.
+
+    With `antithetic` the negated variations are evaluated as well and the
+    gradient is fitted to both sides of the reference. With `crn` all
+    rollouts of one estimate use common random numbers, that is the
+    environment and the policy are reseeded with the same seed, drawn from
+    `seed`, before every rollout.
+    """
 
     name = 'Forward Finite Differences'
 
     def __init__(self, environment, parameter_space=BoundedSpace(0, 1, (3,)),
-                 max_it=200, eps=0.001, var=1):
+                 max_it=200, eps=0.001, var=1, n_jobs=1, crn=False,
+                 antithetic=False, seed=None):
         """Initialize."""
         super(ForwardFDEstimator, self).__init__(environment, parameter_space,
                                                  max_it, eps)
         self.var = var
+        self.n_jobs = n_jobs
+        self.crn = crn
+        self.antithetic = antithetic
+        self.random = np.random.RandomState(seed)
 
     def _estimate_gradient(self, policy):
-        env = self.environment
-        var = self.var
-        # store current policy parameter
-        parameter = policy.parameters
+        parameter = np.ravel(policy.parameters)
         par_dim = policy.parameter_space.dimension
 
-        # using forward differences
-        trace = env.rollout(policy)
-        j_ref = sum([x[2] for x in trace]) / len(trace)
-
-        dj = np.zeros((2 * par_dim))
-        dv = np.append(np.eye(par_dim), -np.eye(par_dim), axis=0)
-        dv *= var
-
-        for n in range(par_dim):
-            variation = dv[n]
+        dv = np.eye(par_dim) * self.var
+        if self.antithetic:
+            dv = np.append(dv, -dv, axis=0)
 
-            policy.parameters = parameter + variation
-            trace_n = env.rollout(policy)
-
-            jn = sum([x[2] for x in trace]) / len(trace_n)
-
-            dj[n] = j_ref - jn
+        # evaluate the reference parameter along with the variations
+        j = self._evaluate(policy, np.vstack((parameter, parameter + dv)),
+                           self.n_jobs, self._common_seed())
+        dj = j[1:] - j[0]
 
         grad = solve(dv.T.dot(dv), dv.T.dot(dj))
 
-        # reset current policy parameter
-        policy.parameters = parameter
-
         return grad
 
 
 class CentralFDEstimator(PolicyGradientEstimator):
-    """Central Finite Differences Gradient Estimator."""
+    """Central Finite Differences Gradient Estimator.
+
+    All perturbed parameters are evaluated with a single batched rollout,
+    which is distributed over a process pool of environment replicas if
+    `n_jobs` is larger than one.
+
+    The variations are antithetic pairs by construction. With `crn` all
+    rollouts of one estimate use common random numbers, that is the
+    environment and the policy are reseeded with the same seed, drawn from
+    `seed`, before every rollout.
+    """
 
     name = 'Central Finite Differences'
 
     def __init__(self, environment, parameter_space=BoundedSpace(0, 1, (3,)),
-                 max_it=200, eps=0.001, var=1):
+                 max_it=200, eps=0.001, var=1, n_jobs=1, crn=False,
+                 seed=None):
         """Initialize."""
         super(CentralFDEstimator, self).__init__(environment, parameter_space,
                                                  max_it, eps)
         self.var = var
+        self.n_jobs = n_jobs
+        self.crn = crn
+        self.random = np.random.RandomState(seed)
 
     def _estimate_gradient(self, policy):
-        env = self.environment
-
-        parameter = policy.parameters
+        parameter = np.ravel(policy.parameters)
         par_dim = policy.parameter_space.dimension
 
-        dj = np.zeros((par_dim,))
         dv = np.eye(par_dim) * self.var / 2
 
-        for n in range(par_dim):
-            variation = dv[n]
+        j = self._evaluate(policy, np.vstack((parameter + dv,
+                                              parameter - dv)),
+                           self.n_jobs, self._common_seed())
+        dj = j[:par_dim] - j[par_dim:]
 
-            policy.parameters = parameter + variation
-            trace_n = env.rollout(policy)
-
-            policy.parameters = parameter - variation
-            trace_n_ref = env.rollout(policy)
-
-            jn = sum([x[2] for x in trace_n]) / len(trace_n)
-            jn_ref = sum([x[2] for x in trace_n_ref]) / len(trace_n_ref)
-
-            dj[n] = jn - jn_ref
-
-        grad = solve(dv.T.dot(dv), dv.T.dot(dj))
-        policy.parameters = parameter
+        # the differences span twice the variation
+        grad = solve(dv.T.dot(dv), dv.T.dot(dj)) / 2
 
         return grad
 
 
 class ReinforceEstimator(PolicyGradientEstimator):
-    """Reinforce Gradient Estimator."""
+    """Reinforce Gradient Estimator.
+
+    The traces are sampled in batches of `batch_size`. The statistics of the
+    optimal baseline and the gradient are kept as running means, which are
+    updated once per batch, and convergence is checked after every batch.
+
+    If `replay` is positive, the last `replay` traces are kept and reused by
+    the next estimates, weighted with truncated importance weights. This
+    requires a policy implementing log_prob_batch(states, actions).
+    """
 
     name = 'Reinforce'
 
     def __init__(self, environment, parameter_space=BoundedSpace(0, 1, (3,)),
-                 max_it=200, eps=0.001, lam=0.5):
+                 max_it=200, eps=0.001, lam=0.5, batch_size=1, replay=0,
+                 max_weight=1.):
         """Initialize."""
         super(ReinforceEstimator, self).__init__(environment, parameter_space,
                                                  max_it, eps)
         self.lam = lam
+        self.batch_size = batch_size
+        self.max_weight = max_weight
+        self._buffer = deque(maxlen=replay) if replay > 0 else None
 
     def _estimate_gradient(self, policy):
-        env = self.environment
+        h = self.environment.horizon
         par_shape = policy.parameters.shape
-        max_it = self.max_it
+        extend = (1,) * len(par_shape)
 
+        # weighted running means of the baseline statistics and the gradient
         b_div = np.zeros(par_shape)
         b_nom = np.zeros(par_shape)
-
-        grads = np.zeros(par_shape)
         grad = np.zeros(par_shape)
 
-        for n in range(max_it):
-            trace = env.rollout(policy)
-
-            lam = self.lam
-
-            actions = [x[0] for x in trace]
-            states = [x[1] for x in trace]
+        discounts = self.lam**np.arange(h)
 
-            rewards_sum = sum([x[2] * lam**k for k, x in enumerate(trace)])
+        n = 0
+        total = 0.
+        batches = self._weighted_batches(policy)
+        for scores, rewards, _, weights, replayed in batches:
+            size = len(weights)
+            lg_sum = scores.sum(axis=1)
+            rewards_sum = rewards.dot(discounts).reshape((size,) + extend)
+            w = weights.reshape((size,) + extend)
 
-            lg_sum = sum(list(map(policy.grad_log_prob, states, actions)))
+            n += size
+            total += weights.sum()
 
-            b_div_n = lg_sum**2
-            b_nom_n = b_div_n * rewards_sum
-
-            b_div += b_div_n
-            b_nom += b_nom_n
+            b_div_n = w * lg_sum**2
+            b_div += (b_div_n.sum(axis=0) - weights.sum() * b_div) / total
+            b_nom += ((b_div_n * rewards_sum).sum(axis=0)
+                      - weights.sum() * b_nom) / total
 
             b = b_nom / b_div
-            grad_n = lg_sum * (rewards_sum - b)
-
-            grads += grad_n
+            grad_n = w * lg_sum * (rewards_sum - b)
 
             grad_old = grad
-            grad = grads / (n + 1)
+            grad = grad + (grad_n.sum(axis=0) - weights.sum() * grad) / total
 
-            if (n > 2 and norm(grad_old - grad) < self.eps):
+            # at least one batch of new traces is needed to converge
+            if (not replayed and n > 3 and norm(grad_old - grad) < self.eps):
                 return grad
 
         logger.warning('ReinforceEstimator did not converge!'
@@ -315,64 +550,136 @@ class ReinforceEstimator(PolicyGradientEstimator):
 
 
 class GPOMDPEstimator(PolicyGradientEstimator):
-    """GPOMDP Gradient Estimator."""
+    """GPOMDP Gradient Estimator.
+
+    The traces are processed in batches of `batch_size`. For every trace the
+    scores are stored in a (horizon, ...) matrix, such that the baselines and
+    the gradient are computed with cumulative sums in O(horizon).
+    Convergence is still checked for every trace, hence the estimate does not
+    depend on the batch size, although up to `batch_size - 1` traces may be
+    sampled in vain.
+
+    If `replay` is positive, the last `replay` traces are kept and reused by
+    the next estimates, weighted with truncated importance weights. This
+    requires a policy implementing log_prob_batch(states, actions).
+    """
 
     name = 'GPOMDP'
 
     def __init__(self, environment, parameter_space=BoundedSpace(0, 1, (3,)),
-                 max_it=200, eps=0.001, lam=0.5):
+                 max_it=200, eps=0.001, lam=0.5, batch_size=1, replay=0,
+                 max_weight=1.):
         """Initialize."""
         super(GPOMDPEstimator, self).__init__(environment, parameter_space,
                                               max_it, eps)
         self.lam = lam
+        self.batch_size = batch_size
+        self.max_weight = max_weight
+        self._buffer = deque(maxlen=replay) if replay > 0 else None
 
     def _estimate_gradient(self, policy):
-        env = self.environment
-        h = env.horizon
+        h = self.environment.horizon
         shape = policy.parameters.shape
+        extend = (1,) * len(shape)
 
-        b_nom = np.zeros((h, shape))
-        b_div = np.zeros((h, shape))
-        b = np.zeros((h, shape))
+        # weighted baseline numerator and denominator summed over all traces
+        b_nom = np.zeros((h,) + shape)
+        b_div = np.zeros((h,) + shape)
         grad = np.zeros(shape)
 
-        lam = self.lam
+        discounts = self.lam**np.arange(h)
+
+        n = 0
+        total = 0.
+        batches = self._weighted_batches(policy)
+        for scores, rewards, mask, weights, replayed in batches:
+            size = len(weights)
+            rewards = (rewards * discounts).reshape((size, h) + extend)
+            mask = mask.reshape((size, h) + extend)
+            w = weights.reshape((size, 1) + extend)
+
+            # b_n[k] is the squared sum of the scores from step k on.
+            b_n = w * np.cumsum(scores[:, ::-1], axis=1)[:, ::-1]**2
+
+            # baselines after adding each trace of the batch
+            b_noms = b_nom + np.cumsum(b_n * rewards, axis=0)
+            b_divs = b_div + np.cumsum(b_n, axis=0)
+            b_nom, b_div = b_noms[-1], b_divs[-1]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                b = b_noms / b_divs
+                updates = np.where(mask,
+                                   np.cumsum(scores, axis=1) * (rewards - b),
+                                   0).sum(axis=1)
+            updates *= weights.reshape((size,) + extend)
+
+            counts = n + 1 + np.arange(size)
+            totals = total + np.cumsum(weights)
+            # at least one new trace is needed to converge
+            converged = (~replayed & (counts > 3)
+                         & (norm(updates.reshape(size, -1), axis=1)
+                            < self.eps * totals))
+            if converged.any():
+                i = converged.argmax()
+                grad += np.nan_to_num(updates[:i]).sum(axis=0)
+                return grad / totals[i]
+
+            grad += np.nan_to_num(updates).sum(axis=0)
+            n += size
+            total = totals[-1]
 
-        for n in range(self.max_it):
-            trace = env.rollout(policy)
-            b_n = np.zeros((h, shape))
+        logger.warning('GPOMDP did not converge! '
+                       + 'You may want to raise max_it.')
+        grad /= total
+        return grad
 
-            for k, state in enumerate(trace):
-                update = policy.grad_log_prob(state[1], state[0])
-                for j in range(k + 1):
-                    b_n[j] += update
 
-            fac = n / (n + 1)
+class AnalyticEstimator(PolicyGradientEstimator):
+    """Analytic Gradient Estimator.
 
-            b_n = b_n**2
-            b_div = fac * b_div + b_n / (n + 1)
+    Computes the exact gradient of the average reward of a rollout, the
+    quantity approximated by the finite difference estimators, with a single
+    rollout. This requires an environment implementing
+    rollout_gradient(policy) and a policy implementing jacobians(state).
+    """
 
-            for k, state in enumerate(trace):
-                b_nom[k] = fac * b_nom[k]
-                b_nom[k] += b_n[k] * state[2] * lam**k / (n + 1)
+    name = 'Analytic'
 
-            b = b_nom / b_div
+    def __init__(self, environment, parameter_space=BoundedSpace(0, 1, (3,)),
+                 max_it=200, eps=0.001, var=None):
+        """Initialize."""
+        super(AnalyticEstimator, self).__init__(environment, parameter_space,
+                                                max_it, eps)
 
-            grad_update = np.zeros(shape)
-            update = np.zeros(shape)
-            for k, state in enumerate(trace):
-                update += policy.grad_log_prob(state[1], state[0])
-                grad_update += update * (-b[k] + state[2] * lam**k)
+    def _estimate_gradient(self, policy):
+        trace, grad = self.environment.rollout_gradient(policy)
+        if len(trace) == 0:
+            return grad
+        return grad / len(trace)
 
-            if (n > 2 and norm(grad_update / (n + 1)) < self.eps):
-                grad /= (n + 1)
-                return grad
-            grad += np.nan_to_num(grad_update)
 
-        logger.warning('GPOMDP did not converge! '
-                       + 'You may want to raise max_it.')
-        grad /= n + 1
-        return grad
+def _halton(n, dim, skip=0):
+    """Return n points of the Halton sequence in the unit cube.
+
+    The i-th coordinate is the radical inverse of the index in the base of
+    the i-th prime, starting with the index `skip`.
+    """
+    primes = []
+    candidate = 2
+    while len(primes) < dim:
+        if all(candidate % p for p in primes):
+            primes.append(candidate)
+        candidate += 1
+
+    points = np.zeros((n, dim))
+    for d, base in enumerate(primes):
+        index = np.arange(skip, skip + n)
+        fraction = 1.
+        while index.any():
+            fraction /= base
+            index, digit = np.divmod(index, base)
+            points[:, d] += fraction * digit
+    return points
 
 
 """Dictionary for resolving estimator strings."""
@@ -380,5 +687,220 @@ estimators = {
     'forward_fd': ForwardFDEstimator,
     'central_fd': CentralFDEstimator,
     'reinforce': ReinforceEstimator,
-    'gpomdp': GPOMDPEstimator
+    'gpomdp': GPOMDPEstimator,
+    'analytic': AnalyticEstimator
+}
+
+
+@add_metaclass(ABCMeta)
+class PolicyGradientOptimizer(object):
+    """Interface for the update rules of PolicyGradient.
+
+    Any subclass must implement _update(policy, parameter, grad) returning the
+    new parameters for an ascent along grad, and may keep state between
+    updates, which is cleared in reset().
+    """
+
+    name = 'Optimizer'
+
+    def __init__(self, environment, rate=1):
+        """Initialize."""
+        self.environment = environment
+        self.rate = rate
+
+    def __repr__(self):
+        return self.__class__.__name__
+
+    def __call__(self, policy, grad):
+        """Return the updated parameters of policy."""
+        return self._update(policy, policy.parameters, grad)
+
+    def reset(self):
+        """Clear the state kept between updates."""
+        pass
+
+    @abstractmethod
+    def _update(self, policy, parameter, grad):
+        pass
+
+
+class SGDOptimizer(PolicyGradientOptimizer):
+    """Plain gradient steps."""
+
+    name = 'SGD'
+
+    def _update(self, policy, parameter, grad):
+        return parameter + self.rate * grad
+
+
+class MomentumOptimizer(PolicyGradientOptimizer):
+    """Gradient steps with heavy ball momentum."""
+
+    name = 'Momentum'
+
+    def __init__(self, environment, rate=1, beta=0.9):
+        """Initialize."""
+        super(MomentumOptimizer, self).__init__(environment, rate)
+        self.beta = beta
+        self.reset()
+
+    def reset(self):
+        """Clear the velocity."""
+        self._velocity = 0.
+
+    def _update(self, policy, parameter, grad):
+        self._velocity = self.beta * self._velocity + grad
+        return parameter + self.rate * self._velocity
+
+
+class AdamOptimizer(PolicyGradientOptimizer):
+    """Adam, gradient steps scaled by bias corrected moment estimates."""
+
+    name = 'Adam'
+
+    def __init__(self, environment, rate=1, beta1=0.9, beta2=0.999,
+                 epsilon=1e-8):
+        """Initialize."""
+        super(AdamOptimizer, self).__init__(environment, rate)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.reset()
+
+    def reset(self):
+        """Clear the moment estimates."""
+        self._m = 0.
+        self._v = 0.
+        self._t = 0
+
+    def _update(self, policy, parameter, grad):
+        self._t += 1
+        self._m = self.beta1 * self._m + (1 - self.beta1) * grad
+        self._v = self.beta2 * self._v + (1 - self.beta2) * grad**2
+
+        m = self._m / (1 - self.beta1**self._t)
+        v = self._v / (1 - self.beta2**self._t)
+
+        return parameter + self.rate * m / (np.sqrt(v) + self.epsilon)
+
+
+class RMSPropOptimizer(PolicyGradientOptimizer):
+    """RMSProp, gradient steps scaled by a running mean square."""
+
+    name = 'RMSProp'
+
+    def __init__(self, environment, rate=1, decay=0.9, epsilon=1e-8):
+        """Initialize."""
+        super(RMSPropOptimizer, self).__init__(environment, rate)
+        self.decay = decay
+        self.epsilon = epsilon
+        self.reset()
+
+    def reset(self):
+        """Clear the mean square."""
+        self._square = 0.
+
+    def _update(self, policy, parameter, grad):
+        self._square = (self.decay * self._square
+                        + (1 - self.decay) * grad**2)
+        return parameter + self.rate * grad / (np.sqrt(self._square)
+                                               + self.epsilon)
+
+
+class NaturalOptimizer(PolicyGradientOptimizer):
+    """Natural gradient steps.
+
+    The Fisher information matrix is estimated from the scores, i.e. the
+    summed grad_log_prob of `samples` traces of the current policy, which
+    therefore needs to be a ProbPolicy. `damping` is added to the diagonal
+    before solving.
+    """
+
+    name = 'Natural Gradient'
+
+    def __init__(self, environment, rate=1, samples=10, damping=1e-3):
+        """Initialize."""
+        super(NaturalOptimizer, self).__init__(environment, rate)
+        self.samples = samples
+        self.damping = damping
+
+    def _update(self, policy, parameter, grad):
+        scores = np.zeros((self.samples, np.size(grad)))
+        for i in range(self.samples):
+            states, actions = [], []
+            for action, state, _ in self.environment.rollout_iter(policy):
+                states.append(state)
+                actions.append(action)
+            if states:
+                scores[i] = np.ravel(
+                    policy.grad_log_prob_batch(states, actions).sum(axis=0))
+
+        fisher = scores.T.dot(scores) / self.samples
+        fisher += self.damping * np.eye(len(fisher))
+
+        step = solve(fisher, np.ravel(grad)).reshape(np.shape(grad))
+        return parameter + self.rate * step
+
+
+class LineSearchOptimizer(PolicyGradientOptimizer):
+    """Backtracking line search along the gradient.
+
+    Starting at `rate`, the step is shrunk by `beta` until the average reward
+    of a rollout increases by at least `c` times the step size times the
+    squared gradient norm, or `max_backtracks` steps were rejected, in which
+    case the parameters are kept. The value of the accepted parameters is
+    reused as the reference of the next update, and with the rollout cache
+    enabled, rollouts of deterministic environments are not repeated.
+    """
+
+    name = 'Line Search'
+
+    def __init__(self, environment, rate=1, beta=0.5, c=1e-4,
+                 max_backtracks=10):
+        """Initialize."""
+        super(LineSearchOptimizer, self).__init__(environment, rate)
+        self.beta = beta
+        self.c = c
+        self.max_backtracks = max_backtracks
+        self.reset()
+
+    def reset(self):
+        """Forget the value of the last accepted parameters."""
+        self._last = None
+
+    def _value(self, policy, parameter):
+        policy.parameters = parameter
+        trace = self.environment.rollout(policy)
+        return sum([t[2] for t in trace]) / max(len(trace), 1)
+
+    def _update(self, policy, parameter, grad):
+        if (self._last is not None
+                and np.array_equal(self._last[0], parameter)):
+            value = self._last[1]
+        else:
+            value = self._value(policy, parameter)
+
+        slope = self.c * np.sum(grad**2)
+        step = self.rate
+        for _ in range(self.max_backtracks):
+            candidate = parameter + step * grad
+            candidate_value = self._value(policy, candidate)
+            if candidate_value >= value + step * slope:
+                self._last = (candidate, candidate_value)
+                return candidate
+            step *= self.beta
+
+        policy.parameters = parameter
+        self._last = (parameter, value)
+        return parameter
+
+
+"""Dictionary for resolving optimizer strings."""
+optimizers = {
+    'sgd': SGDOptimizer,
+    'momentum': MomentumOptimizer,
+    'adam': AdamOptimizer,
+    'rmsprop': RMSPropOptimizer,
+    'natural': NaturalOptimizer,
+    'line_search': LineSearchOptimizer
 }
@@ -0,0 +1,415 @@
+"""Population based search implementations."""
+
+from SafeRLBench import AlgorithmBase
+from SafeRLBench.evaluation import evaluate
+
+import numpy as np
+from numpy.linalg import norm, eigh
+from numpy.random import RandomState
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ('CrossEntropy', 'CMAES', 'ARS')
+
+
+class _PopulationSearch(AlgorithmBase):
+    """Common base of the population based search algorithms.
+
+    Subclasses implement _generation(), which evaluates one population
+    through _evaluate(population) and updates the search distribution, and
+    _is_finished(). The policy parameters are set to the mean of the search
+    distribution after every step.
+    """
+
+    def __init__(self, environment, policy, max_it, eps, n_jobs, seed):
+        super(_PopulationSearch, self).__init__(environment, policy, max_it)
+
+        self.eps = eps
+        self.n_jobs = n_jobs
+        self.seed = seed
+
+        self.random = RandomState(seed)
+        self.mean = None
+
+    def _initialize(self):
+        logger.debug("Initializing Policy.")
+        self.random = RandomState(self.seed)
+        # check if policy is already initialized by the user
+        if self.policy.initialized:
+            logger.debug("Use pre-set policy parameters.")
+            parameters = self.policy.parameters
+        else:
+            logger.debug("Draw parameters at random.")
+            parameters = self.policy.parameter_space.sample()
+            self.policy.parameters = parameters
+
+        self.shape = np.shape(parameters)
+        self.mean = np.ravel(parameters).astype(float)
+
+        self._reset()
+
+    def _reset(self):
+        """Reset the state of the search distribution."""
+        pass
+
+    def _step(self):
+        rewards = self._generation()
+
+        self.monitor.population_rewards.append(rewards)
+        self.policy.parameters = self.mean.reshape(self.shape)
+
+    def _evaluate(self, population):
+        """Return the total reward of a rollout for every member.
+
+        The rollouts are performed with rollout_batch, hence vectorized if
+        the environment supports it. If n_jobs is larger than one, the
+        population is split among a process pool, each process evaluating
+        its part on a replica of the environment.
+        """
+        parameters = population.reshape((len(population),) + self.shape)
+        backend = 'process' if self.n_jobs > 1 else 'vectorized'
+
+        return evaluate(self.environment, self.policy, parameters,
+                        backend=backend, n_jobs=self.n_jobs)[:, 0]
+
+    def _generation(self):
+        raise NotImplementedError
+
+
+class CrossEntropy(_PopulationSearch):
+    """Cross-entropy method.
+
+    In every step a population is sampled from a diagonal gaussian around
+    the current mean. The mean and standard deviation are then refit to the
+    elite, i.e. the members achieving the highest rewards.
+
+    Attributes
+    ----------
+    environment :
+        Environment we want to optimize the policy on. This should be a
+        subclass of `EnvironmentBase`.
+    policy :
+        Policy we want to find parameters for. This should be a subclass of
+        `Policy`.
+    max_it : int
+        Maximal number of generations.
+    population : int
+        Number of members evaluated in every generation.
+    elite : float
+        Fraction of the population used to refit the distribution.
+    sigma : float
+        Initial standard deviation of the search distribution.
+    noise : float
+        Standard deviation added after every refit to prevent premature
+        convergence.
+    eps : float
+        The optimization stops once the largest standard deviation is
+        smaller than `eps`.
+    n_jobs : int
+        Number of processes evaluating a population.
+    std : ndarray
+        Current standard deviation of the search distribution.
+    """
+
+    def __init__(self, environment, policy, max_it=100, population=20,
+                 elite=0.2, sigma=1., noise=0., eps=1e-4, n_jobs=1,
+                 seed=None):
+        """Initialize CrossEntropy.
+
+        Parameters
+        ----------
+        environment :
+            Environment we want to optimize the policy on. This should be a
+            subclass of `EnvironmentBase`.
+        policy :
+            Policy we want to find parameters for. This should be a subclass
+            of `Policy`.
+        max_it : int
+            Maximal number of generations.
+        population : int
+            Number of members evaluated in every generation.
+        elite : float
+            Fraction of the population used to refit the distribution.
+        sigma : float
+            Initial standard deviation of the search distribution.
+        noise : float
+            Standard deviation added after every refit.
+        eps : float
+            Stop once the largest standard deviation is smaller than `eps`.
+        n_jobs : int
+            Number of processes evaluating a population.
+        seed : int
+            Seed for sampling the populations.
+        """
+        super(CrossEntropy, self).__init__(environment, policy, max_it, eps,
+                                           n_jobs, seed)
+
+        self.population = population
+        self.elite = elite
+        self.sigma = sigma
+        self.noise = noise
+
+        self.std = None
+
+    def _reset(self):
+        self.std = self.sigma * np.ones(len(self.mean))
+
+    def _generation(self):
+        population = (self.mean + self.std
+                      * self.random.randn(self.population, len(self.mean)))
+        rewards = self._evaluate(population)
+
+        n_elite = max(int(round(self.elite * self.population)), 1)
+        elite = population[np.argsort(-rewards)[:n_elite]]
+
+        self.mean = elite.mean(axis=0)
+        self.std = elite.std(axis=0) + self.noise
+
+        return rewards
+
+    def _is_finished(self):
+        return self.std.max() < self.eps
+
+
+class CMAES(_PopulationSearch):
+    """Covariance matrix adaptation evolution strategy.
+
+    Standard (mu/mu_w, lambda)-CMA-ES with cumulative step size adaptation
+    and rank-one and rank-mu updates of the covariance matrix, using the
+    default strategy parameters.
+
+    Attributes
+    ----------
+    environment :
+        Environment we want to optimize the policy on. This should be a
+        subclass of `EnvironmentBase`.
+    policy :
+        Policy we want to find parameters for. This should be a subclass of
+        `Policy`.
+    max_it : int
+        Maximal number of generations.
+    population : int
+        Number of members evaluated in every generation.
+    sigma : float
+        Current step size.
+    cov : ndarray
+        Current covariance matrix of the search distribution.
+    eps : float
+        The optimization stops once the largest standard deviation is
+        smaller than `eps`.
+    n_jobs : int
+        Number of processes evaluating a population.
+    """
+
+    def __init__(self, environment, policy, max_it=100, population=None,
+                 sigma=1., eps=1e-4, n_jobs=1, seed=None):
+        """Initialize CMAES.
+
+        Parameters
+        ----------
+        environment :
+            Environment we want to optimize the policy on. This should be a
+            subclass of `EnvironmentBase`.
+        policy :
+            Policy we want to find parameters for. This should be a subclass
+            of `Policy`.
+        max_it : int
+            Maximal number of generations.
+        population : int
+            Number of members evaluated in every generation. By default
+            4 + 3 log(d) for d parameters.
+        sigma : float
+            Initial step size.
+        eps : float
+            Stop once the largest standard deviation is smaller than `eps`.
+        n_jobs : int
+            Number of processes evaluating a population.
+        seed : int
+            Seed for sampling the populations.
+        """
+        super(CMAES, self).__init__(environment, policy, max_it, eps, n_jobs,
+                                    seed)
+
+        self._population = population
+        self.sigma0 = sigma
+
+        self.sigma = None
+        self.cov = None
+
+    def _reset(self):
+        d = len(self.mean)
+
+        if self._population is None:
+            self.population = 4 + int(3 * np.log(d))
+        else:
+            self.population = self._population
+        mu = self.population // 2
+
+        weights = np.log(mu + .5) - np.log(np.arange(1, mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1. / (self.weights**2).sum()
+
+        # strategy parameters
+        self.c_sigma = (self.mu_eff + 2) / (d + self.mu_eff + 5)
+        self.d_sigma = (1 + self.c_sigma
+                        + 2 * max(0, np.sqrt((self.mu_eff - 1) / (d + 1)) - 1))
+        self.c_c = (4 + self.mu_eff / d) / (d + 4 + 2 * self.mu_eff / d)
+        self.c_1 = 2 / ((d + 1.3)**2 + self.mu_eff)
+        self.c_mu = min(1 - self.c_1,
+                        2 * (self.mu_eff - 2 + 1 / self.mu_eff)
+                        / ((d + 2)**2 + self.mu_eff))
+        self.chi_n = np.sqrt(d) * (1 - 1. / (4 * d) + 1. / (21 * d**2))
+
+        self.sigma = self.sigma0
+        self.cov = np.eye(d)
+        self.p_sigma = np.zeros(d)
+        self.p_c = np.zeros(d)
+        self._t = 0
+
+    def _generation(self):
+        d = len(self.mean)
+        self._t += 1
+
+        eigval, eigvec = eigh(self.cov)
+        eigval = np.sqrt(np.maximum(eigval, 0))
+
+        z = self.random.randn(self.population, d)
+        y = (z * eigval).dot(eigvec.T)
+        population = self.mean + self.sigma * y
+
+        rewards = self._evaluate(population)
+
+        mu = len(self.weights)
+        order = np.argsort(-rewards)[:mu]
+        y_w = self.weights.dot(y[order])
+
+        self.mean = self.mean + self.sigma * y_w
+
+        # step size adaptation in the whitened coordinates
+        c_inv_sqrt = (eigvec / np.where(eigval > 0, eigval, 1)).dot(eigvec.T)
+        self.p_sigma = ((1 - self.c_sigma) * self.p_sigma
+                        + np.sqrt(self.c_sigma * (2 - self.c_sigma)
+                                  * self.mu_eff) * c_inv_sqrt.dot(y_w))
+        p_norm = norm(self.p_sigma)
+
+        h_sigma = float(p_norm / np.sqrt(1 - (1 - self.c_sigma)**(2 * self._t))
+                        < (1.4 + 2. / (d + 1)) * self.chi_n)
+
+        self.p_c = ((1 - self.c_c) * self.p_c
+                    + h_sigma * np.sqrt(self.c_c * (2 - self.c_c)
+                                        * self.mu_eff) * y_w)
+
+        rank_mu = (self.weights * y[order].T).dot(y[order])
+        self.cov = ((1 - self.c_1 - self.c_mu) * self.cov
+                    + self.c_1 * (np.outer(self.p_c, self.p_c)
+                                  + (1 - h_sigma) * self.c_c
+                                  * (2 - self.c_c) * self.cov)
+                    + self.c_mu * rank_mu)
+
+        self.sigma *= np.exp(self.c_sigma / self.d_sigma
+                             * (p_norm / self.chi_n - 1))
+
+        return rewards
+
+    def _is_finished(self):
+        return self.sigma * np.sqrt(np.diag(self.cov).max()) < self.eps
+
+
+class ARS(_PopulationSearch):
+    """Augmented random search.
+
+    In every step `directions` gaussian perturbations of the parameters are
+    evaluated in positive and negative direction. The parameters are then
+    moved along the best `top` directions weighted by their reward
+    differences and scaled by the standard deviation of the used rewards.
+
+    Attributes
+    ----------
+    environment :
+        Environment we want to optimize the policy on. This should be a
+        subclass of `EnvironmentBase`.
+    policy :
+        Policy we want to find parameters for. This should be a subclass of
+        `Policy`.
+    max_it : int
+        Maximal number of steps.
+    rate : float
+        Step size of the updates.
+    directions : int
+        Number of directions sampled in every step.
+    top : int
+        Number of best directions used for the update.
+    noise : float
+        Standard deviation of the perturbations.
+    eps : float
+        The optimization stops once the norm of the update direction is
+        smaller than `eps`.
+    n_jobs : int
+        Number of processes evaluating a population.
+    """
+
+    def __init__(self, environment, policy, max_it=100, rate=0.02,
+                 directions=8, top=None, noise=0.03, eps=1e-6, n_jobs=1,
+                 seed=None):
+        """Initialize ARS.
+
+        Parameters
+        ----------
+        environment :
+            Environment we want to optimize the policy on. This should be a
+            subclass of `EnvironmentBase`.
+        policy :
+            Policy we want to find parameters for. This should be a subclass
+            of `Policy`.
+        max_it : int
+            Maximal number of steps.
+        rate : float
+            Step size of the updates.
+        directions : int
+            Number of directions sampled in every step.
+        top : int
+            Number of best directions used for the update. By default all
+            directions are used.
+        noise : float
+            Standard deviation of the perturbations.
+        eps : float
+            Stop once the norm of the update direction is smaller than `eps`.
+        n_jobs : int
+            Number of processes evaluating a population.
+        seed : int
+            Seed for sampling the directions.
+        """
+        super(ARS, self).__init__(environment, policy, max_it, eps, n_jobs,
+                                  seed)
+
+        self.rate = rate
+        self.directions = directions
+        self.top = directions if top is None else top
+        self.noise = noise
+
+    def _generation(self):
+        delta = self.random.randn(self.directions, len(self.mean))
+
+        population = np.concatenate([self.mean + self.noise * delta,
+                                     self.mean - self.noise * delta])
+        rewards = self._evaluate(population)
+        r_plus = rewards[:self.directions]
+        r_minus = rewards[self.directions:]
+
+        order = np.argsort(-np.maximum(r_plus, r_minus))[:self.top]
+        used = np.concatenate([r_plus[order], r_minus[order]])
+        std = used.std()
+        if std == 0:
+            std = 1.
+
+        self.grad = (r_plus[order] - r_minus[order]).dot(delta[order])
+        self.grad /= self.top * std
+
+        self.mean = self.mean + self.rate * self.grad
+
+        return rewards
+
+    def _is_finished(self):
+        return norm(self.grad) < self.eps
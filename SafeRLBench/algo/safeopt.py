@@ -2,6 +2,7 @@
 
 from SafeRLBench import AlgorithmBase
 from SafeRLBench.error import add_dependency
+from SafeRLBench.evaluation import evaluate
 
 from numpy import mean, array
 
@@ -51,8 +52,7 @@ class _SafeOptWrap(AlgorithmBase):
             self.policy.parameters = parameters
 
         # Compute a rollout
-        trace = self.environment.rollout(self.policy)
-        reward = sum([t[2] for t in trace])
+        reward = evaluate(self.environment, self.policy, [parameters])[0, 0]
 
         # Initialize gaussian process with args:
         gp = []
@@ -67,8 +67,7 @@ class _SafeOptWrap(AlgorithmBase):
         parameters = self.gp_opt.optimize()
         self.policy.parameters = parameters
 
-        trace = self.environment.rollout(self.policy)
-        reward = sum([t[2] for t in trace])
+        reward = evaluate(self.environment, self.policy, [parameters])[0, 0]
 
         self.gp_opt.add_new_data_point(parameters, reward)
         self.rewards.append(reward)
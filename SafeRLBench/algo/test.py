@@ -1,10 +1,14 @@
 """Algorithm Tests."""
 
-from SafeRLBench.algo import PolicyGradient, A3C
+from SafeRLBench.algo import PolicyGradient, A3C, CrossEntropy, CMAES, ARS
 from SafeRLBench.envs import LinearCar
-from .policygradient import CentralFDEstimator, estimators
+from .policygradient import (CentralFDEstimator, GPOMDPEstimator,
+                             ReinforceEstimator, estimators, optimizers,
+                             _halton)
 
-from SafeRLBench.policy import NeuralNetwork
+from SafeRLBench.policy import NeuralNetwork, LinearPolicy, NoisyLinearPolicy
+
+import numpy as np
 
 from unittest2 import TestCase
 from mock import MagicMock, Mock
@@ -28,6 +32,221 @@ class TestPolicyGradient(TestCase):
         self.assertRaises(ImportError, PolicyGradient,
                           env_mock, pol_mock, CentralFDEstimator(env_mock))
 
+    def test_pg_stochastic_estimators(self):
+        """Test: POLICYGRADIENT: reinforce and gpomdp estimators."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, 0.1, par=np.array([-1., -1.]))
+        policy.random_state.seed(0)
+
+        for key in ['reinforce', 'gpomdp']:
+            estimator = estimators[key](env, policy.parameter_space,
+                                        max_it=10)
+            grad = estimator(policy)
+
+            self.assertEqual(grad.shape, policy.parameters.shape)
+            assert(np.all(np.isfinite(grad)))
+
+    def test_pg_gpomdp_batch(self):
+        """Test: POLICYGRADIENT: gpomdp batch size."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, 0.1, par=np.array([-1., -1.]))
+
+        grads = []
+        for batch_size in [1, 4]:
+            policy.random_state.seed(0)
+            estimator = GPOMDPEstimator(env, policy.parameter_space,
+                                        max_it=30, batch_size=batch_size)
+            grads.append(estimator(policy))
+
+        assert(np.allclose(grads[0], grads[1]))
+
+    def test_pg_reinforce_batch(self):
+        """Test: POLICYGRADIENT: reinforce batch size."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, 0.1, par=np.array([-1., -1.]))
+        policy.random_state.seed(0)
+
+        estimator = ReinforceEstimator(env, policy.parameter_space,
+                                       max_it=30, eps=0, batch_size=8)
+        grad = estimator(policy)
+
+        self.assertEqual(env.monitor.rollout_cnt, 30)
+        self.assertEqual(grad.shape, (2,))
+        assert(np.all(np.isfinite(grad)))
+
+        # convergence is checked after every batch
+        estimator.eps = np.inf
+        estimator(policy)
+        self.assertEqual(env.monitor.rollout_cnt, 38)
+
+    def test_pg_replay(self):
+        """Test: POLICYGRADIENT: importance sampling replay."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, 0.1, par=np.array([-1., -1.]),
+                                   seed=0)
+
+        for key in ['reinforce', 'gpomdp']:
+            estimator = estimators[key](env, policy.parameter_space,
+                                        max_it=50, eps=0.01, replay=100)
+            policy.parameters = np.array([-1., -1.])
+            estimator(policy)
+            first = len(estimator._buffer)
+
+            # traces of the same parameters are replayed with unit weight
+            estimator(policy)
+            self.assertLess(len(estimator._buffer) - first, first)
+
+            policy.parameters = np.array([-.9, -1.1])
+            _, _, _, weights = estimator._replay_traces(policy)
+            self.assertEqual(len(weights), len(estimator._buffer))
+            assert(np.all((weights > 0) & (weights <= 1)))
+
+    def test_pg_fd_estimators(self):
+        """Test: POLICYGRADIENT: finite difference estimators."""
+        env = LinearCar(horizon=20)
+        policy = LinearPolicy(2, 1, par=np.array([-.5, -1.2, .3]))
+        grad = estimators['analytic'](env, policy.parameter_space)(policy)
+
+        for key, rollouts in [('forward_fd', 4), ('central_fd', 6)]:
+            for n_jobs in [1, 2]:
+                cnt = env.monitor.rollout_cnt
+                estimator = estimators[key](env, policy.parameter_space,
+                                            var=1e-5, n_jobs=n_jobs)
+                assert(np.allclose(estimator(policy), grad, rtol=1e-3))
+                assert(np.all(policy.parameters == [-.5, -1.2, .3]))
+                self.assertEqual(env.monitor.rollout_cnt, cnt + rollouts)
+
+        pg = PolicyGradient(env, policy, estimator='central_fd',
+                            estimator_kwargs={'n_jobs': 2})
+        self.assertEqual(pg.estimator.n_jobs, 2)
+
+    def test_pg_fd_common_random_numbers(self):
+        """Test: POLICYGRADIENT: common random numbers and antithetic."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, 0.3, par=np.array([-.5, -1.2, .3]),
+                                   seed=0)
+
+        stds = {}
+        for key, kwargs in [('forward_fd', {}),
+                            ('forward_fd', {'crn': True}),
+                            ('forward_fd', {'crn': True, 'antithetic': True}),
+                            ('central_fd', {'crn': True})]:
+            estimator = estimators[key](env, policy.parameter_space, var=0.05,
+                                        seed=0, **kwargs)
+            cnt = env.monitor.rollout_cnt
+            grads = np.array([estimator(policy) for _ in range(20)])
+            stds[(key,) + tuple(kwargs)] = grads.std(axis=0).max()
+
+            rollouts = 7 if kwargs.get('antithetic') else 4
+            rollouts = 6 if key == 'central_fd' else rollouts
+            self.assertEqual(env.monitor.rollout_cnt, cnt + 20 * rollouts)
+
+        for key, std in stds.items():
+            if 'crn' in key:
+                self.assertLess(std, stds[('forward_fd',)] / 1.5)
+
+    def test_pg_analytic_estimator(self):
+        """Test: POLICYGRADIENT: analytic estimator."""
+        env = LinearCar(horizon=20)
+        policy = LinearPolicy(2, 1, par=np.array([-.5, -1.2, .3]))
+
+        analytic = estimators['analytic'](env, policy.parameter_space)
+
+        cnt = env.monitor.rollout_cnt
+        grad = analytic(policy)
+        self.assertEqual(env.monitor.rollout_cnt, cnt + 1)
+
+        # central differences of the average reward
+        parameters = policy.parameters
+        for n, variation in enumerate(1e-6 * np.eye(3)):
+            policy.parameters = parameters + variation
+            j_plus = np.mean([t[2] for t in env.rollout(policy)])
+            policy.parameters = parameters - variation
+            j_minus = np.mean([t[2] for t in env.rollout(policy)])
+            self.assertAlmostEqual(grad[n], (j_plus - j_minus) / 2e-6)
+        policy.parameters = parameters
+
+        pg = PolicyGradient(env, policy, estimator='analytic', max_it=5)
+        pg.optimize()
+        self.assertEqual(pg.estimator.name, 'Analytic')
+
+    def test_pg_optimizers(self):
+        """Test: POLICYGRADIENT: update rules."""
+        env = LinearCar(horizon=20)
+        policy = LinearPolicy(2, 1, par=np.array([-.5, -1.2, .3]))
+        grad = np.array([1., -2., .5])
+
+        sgd = optimizers['sgd'](env, rate=.1)
+        assert(np.allclose(sgd(policy, grad), policy.parameters + .1 * grad))
+
+        # the first bias corrected adam step has the size of the rate
+        adam = optimizers['adam'](env, rate=.1)
+        assert(np.allclose(adam(policy, grad) - policy.parameters,
+                           .1 * np.sign(grad)))
+
+        momentum = optimizers['momentum'](env, rate=.1, beta=.5)
+        momentum(policy, grad)
+        assert(np.allclose(momentum(policy, grad) - policy.parameters,
+                           .15 * grad))
+        momentum.reset()
+        assert(np.allclose(momentum(policy, grad) - policy.parameters,
+                           .1 * grad))
+
+        # the line search never decreases the average reward
+        search = optimizers['line_search'](env, rate=10.)
+        value = np.mean([t[2] for t in env.rollout(policy)])
+        grad = estimators['analytic'](env, policy.parameter_space)(policy)
+        policy.parameters = search(policy, grad)
+        self.assertGreaterEqual(
+            np.mean([t[2] for t in env.rollout(policy)]), value)
+        self.assertGreaterEqual(search._last[1], value)
+
+        for key in ['momentum', 'adam', 'rmsprop', 'line_search']:
+            policy.parameters = np.array([-.5, -1.2, .3])
+            pg = PolicyGradient(env, policy, estimator='analytic', max_it=5,
+                                rate=.1, optimizer=key)
+            pg.optimize()
+            self.assertIsInstance(pg.optimizer, optimizers[key])
+
+    def test_pg_natural_gradient(self):
+        """Test: POLICYGRADIENT: natural gradient optimizer."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, 0.1, par=np.array([-1., -1.]),
+                                   seed=0)
+        grad = np.array([1., -1.])
+
+        natural = optimizers['natural'](env, rate=1e-3, samples=20)
+        step = natural(policy, grad) - policy.parameters
+
+        # the natural gradient stays an ascent direction
+        self.assertGreater(step.dot(grad), 0)
+        self.assertEqual(step.shape, grad.shape)
+
+    def test_pg_initialization(self):
+        """Test: POLICYGRADIENT: screened initialization."""
+        assert(np.allclose(_halton(3, 2, skip=1),
+                           [[.5, 1. / 3], [.25, 2. / 3], [.75, 1. / 9]]))
+
+        env = LinearCar(horizon=20)
+        policy = LinearPolicy(2, 1)
+        pg = PolicyGradient(env, policy, estimator='analytic',
+                            init_candidates=16, init_screen=2, seed=0)
+
+        cnt = env.monitor.rollout_cnt
+        parameter = pg._initialize()
+
+        # one screening rollout per candidate and a single gradient estimate
+        self.assertEqual(env.monitor.rollout_cnt - cnt, 16 + 1)
+        assert(pg.parameter_space.contains(parameter))
+        self.assertGreaterEqual(np.linalg.norm(
+            pg.estimator(policy)), 1000 * pg.eps)
+
+        # the same seed reproduces the initialization
+        policy = LinearPolicy(2, 1)
+        pg = PolicyGradient(env, policy, estimator='analytic',
+                            init_candidates=16, init_screen=2, seed=0)
+        assert(np.all(pg._initialize() == parameter))
+
 
 class TestA3C(TestCase):
     """A3C Test Class."""
@@ -42,3 +261,31 @@ class TestA3C(TestCase):
 
         for field in fields:
             assert hasattr(a3c, field)
+
+
+class TestPopulationSearch(TestCase):
+    """Population based search Test Class."""
+
+    def test_population_search(self):
+        """Test: POPULATION: cross-entropy, cma-es and ars."""
+        env = LinearCar(horizon=20)
+        par = np.array([-.5, -1.2, .3])
+        policy = LinearPolicy(2, 1, par=par)
+        start = sum([t[2] for t in env.rollout(policy)])
+
+        for algo, size in [(CrossEntropy(env, policy, max_it=10, sigma=.5,
+                                         seed=0), 20),
+                           (CMAES(env, policy, max_it=10, sigma=.5, seed=0),
+                            7),
+                           (ARS(env, policy, max_it=10, rate=.1, seed=0),
+                            16)]:
+            policy.parameters = par
+            algo.optimize()
+            monitor = algo.monitor
+
+            # every step evaluates one population in a batch
+            self.assertEqual(len(monitor.population_rewards),
+                             monitor.step_cnt)
+            self.assertEqual(monitor.rollout_cnts, [size] * monitor.step_cnt)
+            self.assertEqual(policy.parameters.shape, par.shape)
+            self.assertGreater(monitor.rewards[-1], start)
@@ -3,9 +3,12 @@
 from __future__ import division, print_function, absolute_import
 
 from abc import ABCMeta, abstractmethod
-from six import add_metaclass
+from copy import deepcopy
+from six import add_metaclass, get_unbound_function
 
-from SafeRLBench import AlgoMonitor, EnvMonitor
+import numpy as np
+
+from SafeRLBench import AlgoMonitor, EnvMonitor, config
 
 __all__ = ('EnvironmentBase', 'Space')
 
@@ -23,7 +26,13 @@ class EnvironmentBase(EnvMonitor):
         * _reset()
 
     Any subclass might override:
+        * _rollout_iter(policy)
         * _rollout(policy)
+        * _rollout_batch(policy, parameters)
+        * _rollout_gradient(policy)
+        * _snapshot()
+        * _restore(snapshot)
+        * _config_key()
 
     Make sure the `state_space`, `action_space` and `horizon` attributes will
     be set in any subclass, as the default implementation and / or the monitor
@@ -37,6 +46,9 @@ class EnvironmentBase(EnvMonitor):
         Action space of the environment.
     horizon :
         Maximum number of iterations until rollout will stop.
+    deterministic : bool
+        Class attribute indicating that rollouts are fully determined by the
+        configuration of the environment and the policy.
     monitor : EnvData instance
         Contains the monitoring data. The monitor will be automatically
         initialized during creation.
@@ -45,17 +57,55 @@ class EnvironmentBase(EnvMonitor):
     -------
     rollout(policy)
         Perform a rollout according to the actions selected by policy.
+    rollout_iter(policy)
+        Perform a rollout and yield the transitions as they are produced.
+    rollout_batch(policy, parameters)
+        Perform a rollout for every parameter in a batch of parameters.
+    rollout_gradient(policy)
+        Perform a rollout and compute the gradient of its return.
     update(action)
         Update the environment state according to the action.
     reset()
         Reset the environment to the initial state.
+    snapshot()
+        Return a snapshot of the current environment state.
+    restore(snapshot)
+        Restore the environment state from a snapshot.
 
     Notes
     -----
-    When overwriting _rollout(policy) use the provided interface functions
-    and do not directly call the private implementation.
+    When overwriting _rollout_iter(policy) or _rollout(policy) use the
+    provided interface functions and do not directly call the private
+    implementation. The default _rollout(policy) collects the transitions of
+    _rollout_iter(policy), so overriding the latter changes both. Subclasses
+    which only override _rollout(policy) still support rollout_iter(policy),
+    but the transitions are only yielded after the rollout is complete.
+
+    The default implementation of _rollout_batch(policy, parameters) performs
+    the rollouts sequentially. Environments which can simulate several
+    rollouts at once should override it for the policies they support and
+    fall back to the default implementation otherwise.
+
+    Environments supporting snapshots implement _snapshot() and
+    _restore(snapshot). The snapshot has to contain everything that
+    determines the future of the environment, including the state of random
+    number generators, so that updates after a restore reproduce the updates
+    after taking the snapshot.
+
+    Environments with differentiable dynamics and rewards may implement
+    _rollout_gradient(policy), which propagates the sensitivities of the
+    state with respect to the policy parameters along the rollout. It relies
+    on the policy providing jacobians(state).
+
+    Rollouts of deterministic environments may be memoized by enabling
+    ``SafeRLBench.config.rollout_cache_set(maxsize)``. Such environments set
+    the class attribute `deterministic` and implement _config_key(), which
+    has to return a hashable representation of everything besides the policy
+    that determines a rollout. Stochastic environments are never memoized.
     """
 
+    deterministic = False
+
     def __init__(self, state_space, action_space, horizon=0):
         """Initialize EnvironmentBase.
 
@@ -85,13 +135,67 @@ class EnvironmentBase(EnvMonitor):
         raise NotImplementedError
 
     # Override in subclasses if necessary
+    # The default implementations only delegate to an override of the other
+    # method, which may safely call them through super.
+    def _rollout_iter(self, policy):
+        if (self._overrides('_rollout')
+                and not self._overrides('_rollout_iter')):
+            # the subclass only implements the complete rollout.
+            transitions = self._rollout(policy)
+        else:
+            transitions = self._step_rollout(policy)
+        for transition in transitions:
+            yield transition
+
     def _rollout(self, policy):
+        if self._overrides('_rollout_iter'):
+            return list(self._rollout_iter(policy))
+        return list(self._step_rollout(policy))
+
+    def _step_rollout(self, policy):
+        """Yield the transitions of a rollout based on update and reset."""
         self.reset()
-        trace = []
         for n in range(self.horizon):
             action = policy(self.state)
-            trace.append(self.update(action))
-        return trace
+            yield self.update(action)
+
+    def _overrides(self, name):
+        """Return True if the class of self overrides the method `name`."""
+        return (get_unbound_function(getattr(type(self), name))
+                is not get_unbound_function(getattr(EnvironmentBase, name)))
+
+    # Override in subclasses to support snapshots
+    # See snapshot(self) for more information
+    def _snapshot(self):
+        raise NotImplementedError(
+            "%s does not support snapshots." % self.__class__.__name__)
+
+    # See restore(self, snapshot) for more information
+    def _restore(self, snapshot):
+        raise NotImplementedError(
+            "%s does not support snapshots." % self.__class__.__name__)
+
+    # Override in differentiable subclasses
+    # See rollout_gradient(self, policy) for more information
+    def _rollout_gradient(self, policy):
+        raise NotImplementedError(
+            "%s does not support analytic gradients."
+            % self.__class__.__name__)
+
+    # Override in deterministic subclasses to support memoization
+    def _config_key(self):
+        return None
+
+    # Override in subclasses if a vectorized implementation exists
+    def _rollout_batch(self, policy, parameters):
+        returns = np.zeros(len(parameters))
+        lengths = np.zeros(len(parameters), dtype=int)
+        for n, par in enumerate(parameters):
+            policy.parameters = par
+            for _, _, reward in self._rollout_iter(policy):
+                returns[n] += reward
+                lengths[n] += 1
+        return returns, lengths
 
     def update(self, action):
         """Update the environment state according to the action.
@@ -128,11 +232,49 @@ class EnvironmentBase(EnvMonitor):
         with self.monitor_reset():
             self._reset()
 
+    def snapshot(self):
+        """Return a snapshot of the current environment state.
+
+        The snapshot is a copy of the internal state, which is not affected
+        by subsequent updates and can be restored any number of times, e.g.
+        to branch several continuations from a shared prefix.
+
+        Returns
+        -------
+        snapshot :
+            Environment specific copy of the state, only to be used with
+            restore() of the same environment.
+
+        Raises
+        ------
+        NotImplementedError
+            If the environment does not support snapshots.
+        """
+        return self._snapshot()
+
+    def restore(self, snapshot):
+        """Restore the environment state from a snapshot.
+
+        Parameters
+        ----------
+        snapshot :
+            Snapshot as returned by snapshot().
+
+        Raises
+        ------
+        NotImplementedError
+            If the environment does not support snapshots.
+        """
+        self._restore(snapshot)
+
     def rollout(self, policy):
         """Perform a rollout according to the actions selected by policy.
 
         Wraps the implementation _rollout(policy) providing monitoring
-        capabilities.
+        capabilities. If the rollout cache is enabled, rollouts of
+        deterministic environments are memoized. A memoized rollout is
+        neither simulated nor counted by the monitor and leaves the
+        environment state unchanged.
 
         Parameters
         ----------
@@ -144,10 +286,143 @@ class EnvironmentBase(EnvMonitor):
         trace : list of 3-tuple
             List of (action, state, reward)-tuple as returned by update().
         """
-        with self.monitor_rollout():
+        return self._cached_rollout(policy)
+
+    def _cached_rollout(self, policy, monitor=True):
+        """Return the trace of a rollout, consulting the rollout cache.
+
+        The cache stores a copy of the trace and every hit returns a new
+        copy, such that callers may modify the returned trace in place.
+        """
+        cache = config.rollout_cache
+        key = None if cache is None else self._rollout_key(policy)
+
+        if key is not None:
+            trace = cache.get(key)
+            if trace is not None:
+                return deepcopy(trace)
+
+        if monitor:
+            with self.monitor_rollout():
+                trace = self._rollout(policy)
+        else:
             trace = self._rollout(policy)
+
+        if key is not None:
+            cache.put(key, deepcopy(trace))
         return trace
 
+    def _rollout_key(self, policy):
+        """Return the cache key for a rollout or None if not cacheable."""
+        if not self.deterministic or isinstance(policy, ProbPolicy):
+            return None
+
+        if (not isinstance(policy, Policy)
+                or not getattr(policy, 'initialized', True)):
+            return None
+
+        config_key = self._config_key()
+        if config_key is None:
+            return None
+
+        parameters = np.asarray(policy.parameters)
+        if parameters.dtype == object:
+            return None
+
+        return (type(self), config_key, type(policy),
+                parameters.dtype.str, parameters.shape, parameters.tobytes())
+
+    def rollout_iter(self, policy):
+        """Perform a rollout and yield the transitions as they are produced.
+
+        Generator version of rollout(policy), which does not keep the trace
+        in memory. The consumer may stop early, in which case the rollout is
+        not continued, but still counted by the monitor.
+
+        Parameters
+        ----------
+        Policy : callable
+            Maps element of state_space to element of action_space
+
+        Yields
+        ------
+        transition : 3-tuple
+            (action, state, reward)-tuple as returned by update().
+        """
+        iterator = self._rollout_iter(policy)
+        with self.monitor_rollout():
+            try:
+                for transition in iterator:
+                    yield transition
+            except GeneratorExit:
+                iterator.close()
+
+    def rollout_batch(self, policy, parameters):
+        """Perform a rollout for every parameter in a batch of parameters.
+
+        Wraps the implementation _rollout_batch(policy, parameters) providing
+        monitoring capabilities. The parameters of the policy will be the
+        same before and after the call.
+
+        Parameters
+        ----------
+        policy : Policy
+            Policy instance used to select the actions.
+        parameters : array-like
+            Batch of policy parameters, the first dimension indexes the
+            parameters.
+
+        Returns
+        -------
+        returns : ndarray
+            Array of shape (n,) containing the total reward of every rollout.
+        lengths : ndarray
+            Array of shape (n,) containing the length of every rollout.
+        """
+        parameters = np.asarray(parameters)
+
+        initialized = getattr(policy, 'initialized', True)
+        if initialized:
+            current = policy.parameters
+
+        with self.monitor_rollout_batch(len(parameters)):
+            returns, lengths = self._rollout_batch(policy, parameters)
+
+        if initialized:
+            policy.parameters = current
+
+        return returns, lengths
+
+    def rollout_gradient(self, policy):
+        """Perform a rollout and compute the gradient of its return.
+
+        Wraps the implementation _rollout_gradient(policy) providing
+        monitoring capabilities. The gradient is computed with forward
+        sensitivities alongside the rollout and is exact for the realized
+        trace, where saturated actions and states do not contribute.
+
+        Parameters
+        ----------
+        policy : Policy
+            Policy implementing jacobians(state).
+
+        Returns
+        -------
+        trace : list of 3-tuple
+            List of (action, state, reward)-tuple as returned by update().
+        grad : ndarray
+            Gradient of the sum of rewards with respect to the policy
+            parameters, with the shape of the parameters.
+
+        Raises
+        ------
+        NotImplementedError
+            If the environment or the policy is not differentiable.
+        """
+        with self.monitor_rollout():
+            trace, grad = self._rollout_gradient(policy)
+        return trace, grad
+
     def __repr__(self):
         """Return class name."""
         return self.__class__.__name__
@@ -364,3 +639,53 @@ class ProbPolicy(Policy):
     def grad_log_prob(self, state, action):
         """Return the :math:log(grad p(action | state)):math:."""
         pass
+
+    def log_prob(self, state, action):
+        """Return the :math:log(p(action | state)):math:.
+
+        Optional, needed to reweight traces sampled with other parameters.
+        """
+        raise NotImplementedError(
+            "%s does not provide log probabilities."
+            % self.__class__.__name__)
+
+    def log_prob_batch(self, states, actions):
+        """Return log_prob for every state action pair of a trace.
+
+        Subclasses should override this with a vectorized implementation.
+
+        Parameters
+        ----------
+        states : array-like
+            Array of shape (h, ...) containing the states.
+        actions : array-like
+            Array of shape (h, ...) containing the actions.
+
+        Returns
+        -------
+        log_probs : ndarray
+            Array of shape (h,).
+        """
+        return np.array([self.log_prob(state, action)
+                         for state, action in zip(states, actions)])
+
+    def grad_log_prob_batch(self, states, actions):
+        """Return grad_log_prob for every state action pair of a trace.
+
+        Subclasses should override this with a vectorized implementation.
+
+        Parameters
+        ----------
+        states : array-like
+            Array of shape (h, ...) containing the states.
+        actions : array-like
+            Array of shape (h, ...) containing the actions.
+
+        Returns
+        -------
+        grads : ndarray
+            Array of shape (h,) + parameters.shape, the i-th element being
+            grad_log_prob(states[i], actions[i]).
+        """
+        return np.array([self.grad_log_prob(state, action)
+                         for state, action in zip(states, actions)])
@@ -0,0 +1,87 @@
+"""Rollout memoization."""
+
+from collections import OrderedDict
+
+__all__ = ('RolloutCache',)
+
+
+class RolloutCache(object):
+    """Bounded least recently used cache for rollout traces.
+
+    The cache maps keys as generated by the environments to the traces of
+    the corresponding rollouts. Once `maxsize` traces are stored, the least
+    recently used entry is discarded when a new trace is added.
+
+    In general the cache should not be created directly, but enabled through
+    ``SafeRLBench.config.rollout_cache_set(maxsize)``, after which rollouts
+    of deterministic environments will be memoized.
+
+    Attributes
+    ----------
+    maxsize : int
+        Maximum number of traces stored.
+    hits : int
+        Number of lookups which found a trace.
+    misses : int
+        Number of lookups which did not find a trace.
+
+    Methods
+    -------
+    get(key)
+        Return the trace stored for key or None.
+    put(key, trace)
+        Store the trace for key.
+    clear()
+        Remove all traces and reset the counters.
+    """
+
+    def __init__(self, maxsize=128):
+        """Initialize RolloutCache.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of traces stored, needs to be larger than 0.
+        """
+        if maxsize <= 0:
+            raise ValueError('Cache size needs to be larger than 0.')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._traces = OrderedDict()
+
+    def get(self, key):
+        """Return the trace stored for key or None.
+
+        A successful lookup marks the entry as most recently used.
+        """
+        trace = self._traces.pop(key, None)
+        if trace is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._traces[key] = trace
+        return trace
+
+    def put(self, key, trace):
+        """Store the trace for key, evicting the least recently used entry."""
+        self._traces.pop(key, None)
+        self._traces[key] = trace
+        while len(self._traces) > self.maxsize:
+            self._traces.popitem(last=False)
+
+    def clear(self):
+        """Remove all traces and reset the counters."""
+        self._traces.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._traces
+
+    def __len__(self):
+        return len(self._traces)
+
+    def __repr__(self):
+        return ('RolloutCache(maxsize=%d, size=%d, hits=%d, misses=%d)'
+                % (self.maxsize, len(self), self.hits, self.misses))
@@ -2,6 +2,8 @@
 import logging
 import sys
 
+from .cache import RolloutCache
+
 
 class SRBConfig(object):
     """SafeRLBench configuration class.
@@ -39,6 +41,9 @@ class SRBConfig(object):
         Number of jobs used by the library
     monitor_verbosity :
         Verbosity of the monitor.
+    rollout_cache : RolloutCache
+        Cache memoizing the rollouts of deterministic environments, None if
+        memoization is disabled.
 
     Methods
     -------
@@ -46,6 +51,8 @@ class SRBConfig(object):
         Set monitor verbosity level.
     jobs_set(n_jobs)
         Set the amount of jobs used by a worker pool.
+    rollout_cache_set(maxsize=128)
+        Enable or disable the memoization of rollouts.
     logger_set_level(level=logging.INFO)
         Set the logger level package wide.
     logger_add_stream_handler()
@@ -85,6 +92,7 @@ class SRBConfig(object):
         self.log = log
         self.n_jobs = 1
         self.monitor_verbosity = 0
+        self.rollout_cache = None
 
         self._stream_handler = None
         self._file_handler = None
@@ -116,6 +124,25 @@ class SRBConfig(object):
             raise ValueError('Number of jobs needs to be larger than 0.')
         self.n_jobs = n_jobs
 
+    def rollout_cache_set(self, maxsize=128):
+        """Enable or disable the memoization of rollouts.
+
+        When enabled, rollouts of deterministic environments with
+        deterministic policies are stored in a least recently used cache and
+        repeated rollouts with the same environment configuration, policy
+        class and parameters return the stored trace.
+
+        Parameters
+        ----------
+        maxsize : Int
+            Maximum number of traces stored. If None or 0, memoization is
+            disabled.
+        """
+        if not maxsize:
+            self.rollout_cache = None
+        else:
+            self.rollout_cache = RolloutCache(maxsize)
+
     def logger_set_level(self, level=logging.INFO):
         """Set the logger level package wide.
 
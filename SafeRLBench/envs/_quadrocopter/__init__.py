@@ -1,6 +1,8 @@
 from __future__ import print_function, division, absolute_import
 
-from .quadrotor_dynamics import QuadrotorDynamics
+from .quadrotor_dynamics import QuadrotorDynamics, BatchQuadrotorDynamics
+from .quadrotor_dynamics import wind_creator, random_disturbance_creator
 from .quadrocopter_classes import StateVector
 
-__all__ = ['QuadrotorDynamics', 'StateVector']
+__all__ = ['QuadrotorDynamics', 'BatchQuadrotorDynamics', 'StateVector',
+           'wind_creator', 'random_disturbance_creator']
@@ -21,10 +21,12 @@ from __future__ import print_function, division, absolute_import
 import numpy as np
 
 from .transformations import (quaternion_from_euler, euler_from_matrix,
-                              euler_matrix, euler_from_quaternion)
+                              euler_matrix, euler_from_quaternion,
+                              quaternion_from_euler_batch,
+                              euler_from_matrix_batch)
 
 
-__all__ = ['State', 'Parameters', 'StateVector']
+__all__ = ['State', 'BatchState', 'Parameters', 'StateVector']
 
 
 class StateVector(np.ndarray):
@@ -96,50 +98,260 @@ class StateVector(np.ndarray):
 
 
 class State:
+    """State of the quadrotor kept in a single flat array.
+
+    The position, velocity, acceleration, angular velocity and rotation
+    matrix are views into ``x`` and may be modified in place. Derived
+    quantities (rpy, quaternion, omega_g and the StateVector) are computed
+    lazily and cached. On access, the cache is dropped if ``x`` changed since
+    it was computed, hence ``invalidate()`` is never required for correctness.
+    The cached arrays are read-only, `state_vector` returns a copy.
+    """
+
+    # Layout of the flat state array.
+    _POS = slice(0, 3)
+    _VEL = slice(3, 6)
+    _ACC = slice(6, 9)
+    _OMEGA = slice(9, 12)
+    _R = slice(12, 21)
 
     def __init__(self):
 
-        self.R = np.eye(3)
-        self.pos = np.zeros(3)
-        self.vel = np.zeros(3)
-        self.acc = np.zeros(3)
-        self.omega = np.zeros(3)
+        self.x = np.zeros(21)
+        self.x[self._R] = np.eye(3).ravel()
+
+        self._pos = self.x[self._POS]
+        self._vel = self.x[self._VEL]
+        self._acc = self.x[self._ACC]
+        self._omega = self.x[self._OMEGA]
+        self._R_view = self.x[self._R].reshape(3, 3)
+
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached derived quantities."""
+        # values of x the cached quantities are computed from
+        self._x_cached = self.x.tolist()
+        self._rpy = None
+        self._quaternion = None
+        self._omega_g = None
+        self._state_vector = None
+
+    def _check_cache(self):
+        """Drop the cached quantities if x has been modified."""
+        if self.x.tolist() != self._x_cached:
+            self.invalidate()
+
+    @property
+    def pos(self):
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos):
+        self._pos[:] = pos
+        self.invalidate()
+
+    @property
+    def vel(self):
+        return self._vel
+
+    @vel.setter
+    def vel(self, vel):
+        self._vel[:] = vel
+        self.invalidate()
+
+    @property
+    def acc(self):
+        return self._acc
+
+    @acc.setter
+    def acc(self, acc):
+        self._acc[:] = acc
+        self.invalidate()
+
+    @property
+    def omega(self):
+        return self._omega
+
+    @omega.setter
+    def omega(self, omega):
+        self._omega[:] = omega
+        self.invalidate()
+
+    @property
+    def R(self):
+        return self._R_view
+
+    @R.setter
+    def R(self, R):
+        self._R_view[:] = R
+        self.invalidate()
 
     @property
     def quaternion(self):
         """Rotation quaternion corresponding to R."""
-        return quaternion_from_euler(*self.rpy)
+        self._check_cache()
+        return self._get_quaternion()
 
     @property
     def rpy(self):
         """Roll, pitch, yaw corresponding to R."""
-        return np.array(euler_from_matrix(self.R))
+        self._check_cache()
+        return self._get_rpy()
+
+    @property
+    def omega_g(self):
+        """Angular velocity in global coordinates."""
+        self._check_cache()
+        return self._get_omega_g()
 
     @property
     def state_vector(self):
-        """Return the state as a StateVector."""
-        state = StateVector()
-        state.pos = self.pos
-        state.vel = self.vel
-        state.acc = self.acc
-        state.quat = self.quaternion
-        state.euler = self.rpy
-        state.omega_b = self.omega
-        state.omega_g = self.R.dot(self.omega)
-        return state
+        """Return a copy of the state as a StateVector."""
+        self._check_cache()
+        if self._state_vector is None:
+            state = StateVector()
+            state.pos = self._pos
+            state.vel = self._vel
+            state.acc = self._acc
+            state.quat = self._get_quaternion()
+            state.euler = self._get_rpy()
+            state.omega_b = self._omega
+            state.omega_g = self._get_omega_g()
+            self._state_vector = state
+        return self._state_vector.copy()
 
     @state_vector.setter
     def state_vector(self, state):
-        self.pos = state.pos
-        self.vel = state.vel
-        self.acc = state.acc
-        self.omega = state.omega_b
-        self.R = self.rpy_to_R(euler_from_quaternion(state.quat))
+        self._pos[:] = state.pos
+        self._vel[:] = state.vel
+        self._acc[:] = state.acc
+        self._omega[:] = state.omega_b
+        self._R_view[:] = self.rpy_to_R(euler_from_quaternion(state.quat))
+        self.invalidate()
+
+    def _get_quaternion(self):
+        if self._quaternion is None:
+            self._quaternion = _read_only(
+                quaternion_from_euler(*self._get_rpy()))
+        return self._quaternion
+
+    def _get_rpy(self):
+        if self._rpy is None:
+            self._rpy = _read_only(euler_from_matrix(self._R_view))
+        return self._rpy
+
+    def _get_omega_g(self):
+        if self._omega_g is None:
+            self._omega_g = _read_only(self._R_view.dot(self._omega))
+        return self._omega_g
 
     def rpy_to_R(self, rpy):
         return euler_matrix(*rpy)[:3, :3]
 
 
+def _read_only(value):
+    """Return value as a non-writeable array."""
+    value = np.array(value)
+    value.flags.writeable = False
+    return value
+
+
+class BatchState:
+    """States of several quadrotors kept in a single (n, 21) array.
+
+    Uses the same layout as `State`, with one row per quadrotor. The
+    attributes are views into ``x``, i.e. pos, vel, acc and omega have shape
+    (n, 3) and R has shape (n, 3, 3). Derived quantities are cached until
+    ``invalidate()`` is called.
+    """
+
+    def __init__(self, n):
+
+        self.n = n
+        self.x = np.zeros((n, 21))
+        self.x[:, State._R] = np.eye(3).ravel()
+
+        self._pos = self.x[:, State._POS]
+        self._vel = self.x[:, State._VEL]
+        self._acc = self.x[:, State._ACC]
+        self._omega = self.x[:, State._OMEGA]
+        self._R_view = self.x[:, State._R].reshape(n, 3, 3)
+
+        self.invalidate()
+
+    def invalidate(self):
+        """Mark the cached derived quantities as dirty."""
+        self._rpy = None
+        self._state_vectors = None
+
+    @property
+    def pos(self):
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos):
+        self._pos[:] = pos
+        self.invalidate()
+
+    @property
+    def vel(self):
+        return self._vel
+
+    @vel.setter
+    def vel(self, vel):
+        self._vel[:] = vel
+        self.invalidate()
+
+    @property
+    def acc(self):
+        return self._acc
+
+    @acc.setter
+    def acc(self, acc):
+        self._acc[:] = acc
+        self.invalidate()
+
+    @property
+    def omega(self):
+        return self._omega
+
+    @omega.setter
+    def omega(self, omega):
+        self._omega[:] = omega
+        self.invalidate()
+
+    @property
+    def R(self):
+        return self._R_view
+
+    @R.setter
+    def R(self, R):
+        self._R_view[:] = R
+        self.invalidate()
+
+    @property
+    def rpy(self):
+        """Roll, pitch, yaw corresponding to R, shape (n, 3)."""
+        if self._rpy is None:
+            self._rpy = euler_from_matrix_batch(self.R)
+        return self._rpy
+
+    @property
+    def state_vectors(self):
+        """Return the states as (n, 22) array in the StateVector layout."""
+        if self._state_vectors is None:
+            rpy = self.rpy
+            states = np.zeros((self.n, 22))
+            states[:, 0:9] = self.x[:, 0:9]
+            states[:, 9:12] = rpy
+            states[:, 12:15] = np.einsum('nij,nj->ni', self.R, self.omega)
+            states[:, 15:18] = self.omega
+            states[:, 18:22] = quaternion_from_euler_batch(*rpy.T)
+            self._state_vectors = states
+        return self._state_vectors
+
+
 class Parameters:
     """Parameters for quadrotor the define the physics."""
 
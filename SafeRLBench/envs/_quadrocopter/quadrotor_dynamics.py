@@ -4,11 +4,21 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+import math
+from functools import partial
+
 import numpy as np
 
-from .quadrocopter_classes import State, Parameters
+from .quadrocopter_classes import State, BatchState, Parameters
+
+# Tolerance used by euler_from_matrix to detect gimbal lock.
+_EPS = np.finfo(float).eps * 4.0
+
+# Available integration schemes.
+INTEGRATORS = ['euler', 'semi_implicit', 'rk4']
 
-__all__ = ['QuadrotorDynamics', 'wind_creator', 'random_disturbance_creator']
+__all__ = ['QuadrotorDynamics', 'BatchQuadrotorDynamics', 'wind_creator',
+           'random_disturbance_creator', 'RandomDisturbance', 'INTEGRATORS']
 
 
 class QuadrotorDynamics(object):
@@ -27,15 +37,23 @@ class QuadrotorDynamics(object):
     external_forces: list
         a list of callables that take the state as input and return forces on
         the quadrotor in global coordinates.
+    integrator: str
+        Integration scheme, one of 'euler', 'semi_implicit' or 'rk4'.
+    substeps: int
+        Number of integration steps per call of `update_position`.
 
     Notes
     -----
     There seems to be an instability where the acceleration overflows and then
     causes issues in the controller.
+
+    The constants derived from `params` are precomputed on initialization.
+    If the parameters are changed afterwards, ``setup_constants()`` needs to
+    be called.
     """
 
     def __init__(self, pos=None, vel=None, acc=None, R=None,
-                 external_forces=None):
+                 external_forces=None, integrator='euler', substeps=1):
         """Initialize quadrocopter dynamics.
 
         Parameters
@@ -51,9 +69,19 @@ class QuadrotorDynamics(object):
         external_forces: list
             a list of callables that take the state as input and return forces
             on the quadrotor in global coordinates.
+        integrator: str
+            Integration scheme. 'euler' is the original explicit scheme,
+            'semi_implicit' is the symplectic Euler scheme and 'rk4' the
+            classical Runge-Kutta scheme. Default: 'euler'.
+        substeps: int
+            Number of integration steps per call of `update_position`.
         """
+        _check_integrator(integrator, substeps)
+
         self.state = State()
         self.params = Parameters()
+        self.integrator = integrator
+        self.substeps = substeps
 
         if external_forces is None:
             self.external_forces = ()
@@ -69,182 +97,481 @@ class QuadrotorDynamics(object):
         if R is not None:
             self.state.R = R.copy()
 
+        # preallocated stage buffers with the same layout as state.x
+        self._stages = np.zeros((5,) + self.state.x.shape)
+
+        self.setup_constants()
+
+    def setup_constants(self):
+        """Precompute the constants used by the dynamics from `params`."""
+        params = self.params
+        L = params.L
+        K = params.K
+        m = params.m
+
+        # Scalar constants for the fused kernel: the inverse of the mixing
+        # matrix mapping torques and thrust to forces, the inertias, the rate
+        # gains and the drag coefficients in body coordinates
+        self._kernel_constants = (
+            tuple(np.linalg.inv(_mixing_matrix(params)).tolist()),
+            (params.Ix, params.Iy, params.Iz),
+            (1. / params.tau_p, 1. / params.tau_q, 1. / params.tau_r),
+            (params.CD_bx, params.CD_by, params.CD_bz),
+            (params.Iy - params.Iz, params.Iz - params.Ix,
+             params.Ix - params.Iy),
+            (L, K, m, params.g),
+            (params.tau_Iz, params.tau_Iyaw, params.tau_rp))
+
+        self._dt = params.inner_loop_cycle * 1e-6
+
     def dynamics_derivative(self, pitch, roll, z_vel, yaw_vel):
         """Return the state derivatives for the current state and input."""
-        rates = self._inputs_to_desired_rates(pitch, roll, z_vel, yaw_vel)
-
-        forces = self._determine_forces(*rates)
+        derivatives = State()
+        self._fused_derivatives(self.state.x, (pitch, roll, z_vel, yaw_vel),
+                                derivatives.x)
+        derivatives.invalidate()
+        return derivatives
 
-        return self._forces_to_derivatives(forces)
+    def update_position(self, inputs, duration=None):
+        """Compute the derivatives and integrate them based on inputs.
 
-    def update_position(self, inputs):
-        """Compute the derivatives and integrate them based on inputs."""
-        pitch, roll, z_vel, yaw_vel = inputs
-        derivatives = self.dynamics_derivative(pitch, roll, z_vel, yaw_vel)
-        self._integrate_derivatives(derivatives,
-                                    self.params.inner_loop_cycle * 1e-6)
+        The inputs are held constant while the dynamics are integrated over
+        `duration` in `substeps` steps. External forces are evaluated once at
+        the beginning of every step.
 
-    def _inputs_to_desired_rates(self, pitch, roll, z_vel, yaw_vel):
-        """Convert inputs to desired angular rates and thrust."""
-        # Current roll, and yaw angles
-        roll_cur, _, yaw_cur = self.state.rpy
+        Parameters
+        ----------
+        inputs: array-like
+            Pitch, roll, z velocity and yaw velocity commands.
+        duration: float
+            Simulated time in seconds. Default: None ; which will use the
+            inner loop cycle of the parameters.
+        """
+        if duration is None:
+            duration = self._dt
+        h = duration / self.substeps
+
+        for _ in range(self.substeps):
+            derivatives = partial(self._fused_derivatives, inputs=inputs,
+                                  forces=self._external_force())
+            _integrate(self.integrator, derivatives, self.state.x, h,
+                       self._stages)
+            self.state.invalidate()
+
+    def _external_force(self):
+        """Return the sum of the external forces on the current state."""
+        f_x = f_y = f_z = 0.
+        for force in self.external_forces:
+            force_x, force_y, force_z = force(self.state)
+            f_x += force_x
+            f_y += force_y
+            f_z += force_z
+        return f_x, f_y, f_z
+
+    def _fused_derivatives(self, x, inputs, out, forces=None):
+        """Write the state derivatives for state `x` and `inputs` into `out`.
+
+        The inputs are converted to desired angular rates and thrust, these
+        to rotor forces and, together with drag and external forces, to the
+        derivatives in a single pass over scalars using the precomputed
+        constants. `x` and `out` use the layout of `State.x`, where the
+        velocity slot holds the acceleration of `x` and the
+        acceleration slot holds the new acceleration. `forces` is the sum of
+        the external forces, if None it is evaluated on the current state.
+        """
+        (a_inv, inertia, gains, drag, inertia_diff, (L, K, m, g),
+         (tau_Iz, tau_Iyaw, tau_rp)) = self._kernel_constants
+        Ix, Iy, Iz = inertia
+
+        pitch, roll, z_vel, yaw_vel = [float(u) for u in inputs]
+        (_, _, _, vx, vy, vz, ax, ay, az, p, q, r,
+         r00, r01, r02, r10, r11, r12, r20, r21, r22) = x.tolist()
+
+        # Current roll and yaw angles, see euler_from_matrix
+        cy = math.sqrt(r00 * r00 + r10 * r10)
+        if cy > _EPS:
+            roll_cur = math.atan2(r21, r22)
+            yaw_cur = math.atan2(r10, r00)
+        else:
+            roll_cur = math.atan2(-r12, r11)
+            yaw_cur = 0.0
 
-        # r_des is simply the commanded yaw rate
-        r_des = yaw_vel
+        # Desired rates and thrust
+        z_ddot_des = (z_vel - vz) / tau_Iz
+        c_des = (g + z_ddot_des) / r22
 
-        # calculate the commanded acceleration in the z direction,
-        # (z_dot_des - z_dot) / tau_z
-        z_ddot_des = (z_vel - self.state.vel[2]) / self.params.tau_Iz
+        yaw_des = yaw_vel * tau_Iyaw + yaw_cur
+        sin_yaw, cos_yaw = math.sin(yaw_des), math.cos(yaw_des)
+        sin_roll, cos_roll = math.sin(roll), math.cos(roll)
+        sin_pitch = math.sin(pitch)
 
-        # And from this we may find the commanded thrust, (g + z_ddot_cmd)/R33
-        c_des = (self.params.g + z_ddot_des) / self.state.R[2, 2]
+        e_13 = (sin_yaw * sin_roll + cos_yaw * cos_roll * sin_pitch) - r02
+        e_23 = (cos_roll * sin_yaw * sin_pitch - cos_yaw * sin_roll) - r12
 
-        # Calculate the commanded yaw angle from:
-        yaw_des = yaw_vel * self.params.tau_Iyaw + yaw_cur
+        p_des = (r10 * e_13 - r00 * e_23) / (r22 * tau_rp)
+        q_des = (r11 * e_13 - r01 * e_23) / (r22 * tau_rp)
+        r_des = yaw_vel
 
-        # R13_des = sin(yaw_des) * sin(roll_cmd)
-        #         + cos(yaw_des) * cos(roll_cmd) * sin(pitch_cmd)
-        r_13_des = (np.sin(yaw_des) * np.sin(roll) +
-                    np.cos(yaw_des) * np.cos(roll) * np.sin(pitch))
+        # Rotor forces, J * rates + omega x (J * omega) mixed to the rotors
+        b_0 = Ix * (gains[0] * (p_des - p)) + (q * (Iz * r) - r * (Iy * q))
+        b_1 = Iy * (gains[1] * (q_des - q)) + (r * (Ix * p) - p * (Iz * r))
+        b_2 = Iz * (gains[2] * (r_des - r)) + (p * (Iy * q) - q * (Ix * p))
+
+        f_1, f_2, f_3, f_4 = [
+            row[0] * b_0 + row[1] * b_1 + row[2] * b_2 + row[3] * c_des
+            for row in a_inv]
+
+        # Linear drag in body coordinates. The integration does not keep R
+        # orthogonal, so R * v_b = vel is solved with the adjugate.
+        c_00 = r11 * r22 - r12 * r21
+        c_01 = r12 * r20 - r10 * r22
+        c_02 = r10 * r21 - r11 * r20
+        det = r00 * c_00 + r01 * c_01 + r02 * c_02
+
+        d_0 = drag[0] * (c_00 * vx + (r02 * r21 - r01 * r22) * vy
+                         + (r01 * r12 - r02 * r11) * vz) / det
+        d_1 = drag[1] * (c_01 * vx + (r00 * r22 - r02 * r20) * vy
+                         + (r02 * r10 - r00 * r12) * vz) / det
+        d_2 = drag[2] * (c_02 * vx + (r01 * r20 - r00 * r21) * vy
+                         + (r00 * r11 - r01 * r10) * vz) / det
+
+        # Accelerations
+        thrust = f_1 + f_2 + f_3 + f_4
+        acc_x = thrust * r02 - (r00 * d_0 + r01 * d_1 + r02 * d_2)
+        acc_y = thrust * r12 - (r10 * d_0 + r11 * d_1 + r12 * d_2)
+        acc_z = thrust * r22 - (r20 * d_0 + r21 * d_1 + r22 * d_2)
+
+        if forces is None:
+            forces = self._external_force()
+        acc_x += forces[0]
+        acc_y += forces[1]
+        acc_z += forces[2]
 
-        # R23_des = cos(roll_cmd) * sin(yaw_des) * sin(pitch_cmd)
-        #         - cos(yaw_des) * sin(roll_cmd)
-        r_23_des = (np.cos(roll) * np.sin(yaw_des) * np.sin(pitch) -
-                    np.cos(yaw_des) * np.sin(roll))
+        # Angular velocity changes
+        p_dot = (L * (f_2 - f_4) + inertia_diff[0] * r * q) / Ix
+        q_dot = (L * (f_3 - f_1) + inertia_diff[1] * r * p) / Iy
+        r_dot = (K * (f_1 - f_2 + f_3 - f_4) + inertia_diff[2] * p * q) / Iz
 
-        # p_des = (R21*(R13_des-R13) - R11*(R23_des-R23))/(R33*tau_rp)
-        p_des = (self.state.R[1, 0] * (r_13_des - self.state.R[0, 2]) -
-                 self.state.R[0, 0] * (r_23_des - self.state.R[1, 2]))
-        p_des /= self.state.R[2, 2] * self.params.tau_rp
+        out[:] = (vx, vy, vz,
+                  ax, ay, az,
+                  acc_x / m, acc_y / m, acc_z / m - g,
+                  p_dot, q_dot, r_dot,
+                  r01 * r - r02 * q, r02 * p - r00 * r, r00 * q - r01 * p,
+                  r11 * r - r12 * q, r12 * p - r10 * r, r10 * q - r11 * p,
+                  r21 * r - r22 * q, r22 * p - r20 * r, r20 * q - r21 * p)
 
-        # q_des = (R22*(R13_des-R13) - R12*(R23_des-R23))/(R33*tau_rp)
-        q_des = (self.state.R[1, 1] * (r_13_des - self.state.R[0, 2]) -
-                 self.state.R[0, 1] * (r_23_des - self.state.R[1, 2]))
-        q_des /= self.state.R[2, 2] * self.params.tau_rp
 
-        # Return everything!
-        return p_des, q_des, r_des, c_des
+class BatchQuadrotorDynamics(object):
+    """Simulate the dynamics of several quadrotors at once.
 
-    def _determine_forces(self, p_des, q_des, r_des, c_des):
-        """Convert desired angular rates and thrust to rotor forces."""
-        L = self.params.L
-        K = self.params.K
-        m = self.params.m
+    This is a vectorized version of `QuadrotorDynamics`, i.e. it computes the
+    same dynamics for `n` quadrotors, where every quadrotor gets its own
+    inputs. The states are stored in a `BatchState`.
 
-        a = np.array(((0, L, 0, -L),
-                      (-L, 0, L, 0),
-                      (K, -K, K, -K),
-                      (1 / m, 1 / m, 1 / m, 1 / m)),
-                     dtype=np.float64)
+    Attributes
+    ----------
+    n : int
+        Number of quadrotors.
+    state : BatchState
+        States of all quadrotors.
+    external_forces: list
+        a list of callables that take the batch state as input and return
+        forces on the quadrotors in global coordinates with shape (n, 3).
+    integrator: str
+        Integration scheme, one of 'euler', 'semi_implicit' or 'rk4'.
+    substeps: int
+        Number of integration steps per call of `update_position`.
+    """
 
-        # The inertial matrix
-        j = np.diag((self.params.Ix, self.params.Iy, self.params.Iz))
+    def __init__(self, n, pos=None, vel=None, acc=None, R=None,
+                 external_forces=None, integrator='euler', substeps=1):
+        """Initialize batched quadrocopter dynamics.
 
-        # The current angular velocity vector
-        omega = self.state.omega
+        Parameters
+        ----------
+        n : int
+            Number of quadrotors.
+        pos: array-like
+            Initial positions, either shape (3,) or (n, 3)
+        vel: array-like
+            Initial velocities, either shape (3,) or (n, 3)
+        acc: array-like
+            Initial accelerations, either shape (3,) or (n, 3)
+        R: array-like
+            Initial rotation matrices, either shape (3, 3) or (n, 3, 3)
+        external_forces: list
+            a list of callables that take the batch state as input and return
+            forces on the quadrotors in global coordinates.
+        integrator: str
+            Integration scheme, see `QuadrotorDynamics`.
+        substeps: int
+            Number of integration steps per call of `update_position`.
+        """
+        _check_integrator(integrator, substeps)
 
-        # The rate vector (our approximation of omega_dot)
-        rate_vector = np.array(
-            (((1 / self.params.tau_p) * (p_des - self.state.omega[0])),
-             ((1 / self.params.tau_q) * (q_des - self.state.omega[1])),
-             ((1 / self.params.tau_r) * (r_des - self.state.omega[2])))).T
+        self.n = n
+        self.state = BatchState(n)
+        self.params = Parameters()
+        self.integrator = integrator
+        self.substeps = substeps
 
-        b = j.dot(rate_vector) + np.cross(omega, j.dot(omega))
+        if external_forces is None:
+            self.external_forces = ()
+        else:
+            self.external_forces = external_forces
 
-        # Add c_des to the bottom of the row vector
-        b = np.concatenate((b, [c_des]))
+        if pos is not None:
+            self.state.pos = pos
+        if vel is not None:
+            self.state.vel = vel
+        if acc is not None:
+            self.state.acc = acc
+        if R is not None:
+            self.state.R = R
 
-        # Return the four rotor forces
-        return np.linalg.solve(a, b)
+        self._stages = np.zeros((5,) + self.state.x.shape)
 
-    def _forces_to_derivatives(self, forces):
-        """Compute the state derivatives based on applied forces."""
-        # Update position
-        derivatives = State()
+        self.setup_constants()
 
-        derivatives.pos[:] = self.state.vel
+    def setup_constants(self):
+        """Precompute the constants used by the dynamics from `params`."""
+        params = self.params
 
-        drag = self._compute_drag()
+        self._mixing_inv_t = np.linalg.inv(_mixing_matrix(params)).T
+        self._inertia = np.array((params.Ix, params.Iy, params.Iz))
+        self._rate_gains = 1. / np.array((params.tau_p,
+                                          params.tau_q,
+                                          params.tau_r))
+        self._drag = np.array((params.CD_bx, params.CD_by, params.CD_bz))
+        self._dt = params.inner_loop_cycle * 1e-6
 
-        # Update accelerations
-        derivatives.acc = np.sum(forces) * self.state.R[:, 2] - drag
+    def update_position(self, inputs, duration=None):
+        """Compute the derivatives and integrate them based on inputs.
 
-        # Add external forces
+        Parameters
+        ----------
+        inputs : array-like
+            Array of shape (n, 4) containing the pitch, roll, z velocity
+            and yaw velocity commands for every quadrotor.
+        duration: float
+            Simulated time in seconds. Default: None ; which will use the
+            inner loop cycle of the parameters.
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        if duration is None:
+            duration = self._dt
+        h = duration / self.substeps
+
+        for _ in range(self.substeps):
+            derivatives = partial(self._derivatives, inputs=inputs,
+                                  forces=self._external_force())
+            _integrate(self.integrator, derivatives, self.state.x, h,
+                       self._stages)
+            self.state.invalidate()
+
+    def _external_force(self):
+        """Return the sum of the external forces on the current states."""
+        forces = 0.
         for force in self.external_forces:
-            derivatives.acc += force(self.state)
+            forces = forces + force(self.state)
+        return forces
 
-        # Normalize with mass and add gravity
-        derivatives.acc /= self.params.m
-        derivatives.acc[2] -= self.params.g
+    def _derivatives(self, x, inputs, out, forces=None):
+        """Write the state derivatives for states `x` and `inputs` to `out`.
 
-        # Update velocities
-        derivatives.vel[:] = self.state.acc
+        Vectorized version of `QuadrotorDynamics._fused_derivatives`.
+        """
+        params = self.params
+        Ix, Iy, Iz = self._inertia
 
-        p, q, r = self.state.omega
-        derivatives.R = self.state.R.dot(np.array([[0, -r, q],
-                                                   [r, 0, -p],
-                                                   [-q, p, 0]]))
+        pitch, roll, z_vel, yaw_vel = np.asarray(inputs, dtype=float).T
+        (_, _, _, vx, vy, vz, _, _, _, p, q, r,
+         r00, r01, r02, r10, r11, r12, r20, r21, r22) = x.T
 
-        # Angular velocity changes
-        f1, f2, f3, f4 = forces
+        # Current roll and yaw angles, see euler_from_matrix
+        regular = np.sqrt(r00 * r00 + r10 * r10) > _EPS
+        roll_cur = np.where(regular, np.arctan2(r21, r22),
+                            np.arctan2(-r12, r11))
+        yaw_cur = np.where(regular, np.arctan2(r10, r00), 0.)
 
-        # p' = (1/Ix)*(L*(f2-f4) + (Iy-Iz)*r*q)
-        p_dot = (self.params.L * (f2 - f4) +
-                 (self.params.Iy - self.params.Iz) *
-                 self.state.omega[2] * self.state.omega[1]) / self.params.Ix
+        # Desired rates and thrust
+        z_ddot_des = (z_vel - vz) / params.tau_Iz
+        c_des = (params.g + z_ddot_des) / r22
 
-        # q' = (1/Iy)*(L*(f3-f1) + (Iz-Ix)*r*p)
-        q_dot = (self.params.L * (f3 - f1) +
-                 (self.params.Iz - self.params.Ix) *
-                 self.state.omega[2] * self.state.omega[0]) / self.params.Iy
+        yaw_des = yaw_vel * params.tau_Iyaw + yaw_cur
+        sin_yaw, cos_yaw = np.sin(yaw_des), np.cos(yaw_des)
+        sin_roll, cos_roll = np.sin(roll), np.cos(roll)
+        sin_pitch = np.sin(pitch)
 
-        # r' = (1/Iz)*(K*(f1-f2+f3-f4) + (Ix-Iy)*p*q)
-        r_dot = (self.params.K * (f1 - f2 + f3 - f4) +
-                 (self.params.Ix - self.params.Iy) *
-                 self.state.omega[0] * self.state.omega[1]) / self.params.Iz
+        e_13 = (sin_yaw * sin_roll + cos_yaw * cos_roll * sin_pitch) - r02
+        e_23 = (cos_roll * sin_yaw * sin_pitch - cos_yaw * sin_roll) - r12
 
-        derivatives.omega = np.array([p_dot, q_dot, r_dot])
+        p_des = (r10 * e_13 - r00 * e_23) / (r22 * params.tau_rp)
+        q_des = (r11 * e_13 - r01 * e_23) / (r22 * params.tau_rp)
+        r_des = yaw_vel
 
-        return derivatives
+        # Rotor forces
+        gains = self._rate_gains
+        b = np.stack((
+            Ix * (gains[0] * (p_des - p)) + (q * (Iz * r) - r * (Iy * q)),
+            Iy * (gains[1] * (q_des - q)) + (r * (Ix * p) - p * (Iz * r)),
+            Iz * (gains[2] * (r_des - r)) + (p * (Iy * q) - q * (Ix * p)),
+            c_des), axis=1)
+        f_1, f_2, f_3, f_4 = b.dot(self._mixing_inv_t).T
+
+        # Drag, solve R * v_b = vel with the adjugate.
+        c_00 = r11 * r22 - r12 * r21
+        c_01 = r12 * r20 - r10 * r22
+        c_02 = r10 * r21 - r11 * r20
+        det = r00 * c_00 + r01 * c_01 + r02 * c_02
+
+        drag = self._drag
+        d_0 = drag[0] * (c_00 * vx + (r02 * r21 - r01 * r22) * vy
+                         + (r01 * r12 - r02 * r11) * vz) / det
+        d_1 = drag[1] * (c_01 * vx + (r00 * r22 - r02 * r20) * vy
+                         + (r02 * r10 - r00 * r12) * vz) / det
+        d_2 = drag[2] * (c_02 * vx + (r01 * r20 - r00 * r21) * vy
+                         + (r00 * r11 - r01 * r10) * vz) / det
+
+        # Accelerations
+        thrust = f_1 + f_2 + f_3 + f_4
+        acc = out[:, 6:9]
+        acc[:, 0] = thrust * r02 - (r00 * d_0 + r01 * d_1 + r02 * d_2)
+        acc[:, 1] = thrust * r12 - (r10 * d_0 + r11 * d_1 + r12 * d_2)
+        acc[:, 2] = thrust * r22 - (r20 * d_0 + r21 * d_1 + r22 * d_2)
+
+        if forces is None:
+            forces = self._external_force()
+        acc += forces
+
+        acc /= params.m
+        acc[:, 2] -= params.g
+
+        out[:, 0:6] = x[:, 3:9]
 
-    def _integrate_derivatives(self, derivatives, dt):
-        """Simple euler integration to determine new states."""
-        self.state.pos += dt * derivatives.pos
-        self.state.vel += dt * derivatives.vel
-        self.state.acc[:] = derivatives.acc
+        # Angular velocity changes
+        out[:, 9] = (params.L * (f_2 - f_4) + (Iy - Iz) * r * q) / Ix
+        out[:, 10] = (params.L * (f_3 - f_1) + (Iz - Ix) * r * p) / Iy
+        out[:, 11] = (params.K * (f_1 - f_2 + f_3 - f_4)
+                      + (Ix - Iy) * p * q) / Iz
 
-        self.state.R += dt * derivatives.R
-        self.state.omega += dt * derivatives.omega
+        # Rotation matrix changes, R * skew(omega)
+        _rotation_derivative(x, out)
 
-    def _compute_drag(self):
-        """Compute velocities and applies linear drag model.
 
-        Inverts the current rotation matrix and solves for the components of
-        quadrocopter velocities in the body coordinates. Then a simple linear
-        drag model equation is applied. This is done because the quadrocopter
-        platform areas don't change in this refernce frame. The drag forces are
-        returned in global coordinates.
-        """
-        v_b = np.linalg.solve(self.state.R, self.state.vel)
+def _check_integrator(integrator, substeps):
+    """Raise a ValueError for invalid integration settings."""
+    if integrator not in INTEGRATORS:
+        raise ValueError("%s is not a valid integrator, use one of %s."
+                         % (integrator, INTEGRATORS))
+    if int(substeps) != substeps or substeps < 1:
+        raise ValueError("substeps has to be a positive integer, got %s."
+                         % substeps)
 
-        drag_model = np.array((self.params.CD_bx,
-                               self.params.CD_by,
-                               self.params.CD_bz)) * v_b
 
-        return self.state.R.dot(drag_model)
+def _integrate(integrator, derivatives, x, h, stages):
+    """Advance the flat state `x` in place by a step of length `h`.
+
+    Parameters
+    ----------
+    integrator: str
+        One of `INTEGRATORS`.
+    derivatives: callable
+        ``derivatives(x, out=out)`` writes the derivatives of `x` in the layout
+        of `State.x` into `out`.
+    x: ndarray
+        State in the layout of `State.x`, or a batch of such states stacked
+        along the first axis.
+    h: float
+        Step length in seconds.
+    stages: ndarray
+        Buffer of shape ``(5,) + x.shape``.
+
+    Notes
+    -----
+    'euler' is the original scheme, which integrates the velocity with the
+    acceleration stored in the state, i.e. lags one step behind. The other
+    schemes integrate the velocity with the current acceleration. In every
+    case the acceleration slot holds the acceleration at the beginning of the
+    step afterwards.
+    """
+    k_1 = stages[0]
+    derivatives(x, out=k_1)
+
+    if integrator == 'euler':
+        x[..., 0:6] += h * k_1[..., 0:6]
+        x[..., 6:9] = k_1[..., 6:9]
+        x[..., 9:21] += h * k_1[..., 9:21]
+    elif integrator == 'semi_implicit':
+        # velocities first, then positions and attitude with the new rates
+        x[..., 6:9] = k_1[..., 6:9]
+        x[..., 3:6] += h * k_1[..., 6:9]
+        x[..., 0:3] += h * x[..., 3:6]
+        x[..., 9:12] += h * k_1[..., 9:12]
+        _rotation_derivative(x, k_1)
+        x[..., 12:21] += h * k_1[..., 12:21]
+    else:
+        k_2, k_3, k_4, x_stage = stages[1:]
+
+        # the velocity is driven by the current acceleration
+        k_1[..., 3:6] = k_1[..., 6:9]
+        for k, k_prev, c in ((k_2, k_1, h / 2), (k_3, k_2, h / 2),
+                             (k_4, k_3, h)):
+            np.multiply(k_prev, c, out=x_stage)
+            x_stage += x
+            derivatives(x_stage, out=k)
+            k[..., 3:6] = k[..., 6:9]
+
+        k_2 += k_3
+        k_2 *= 2
+        k_2 += k_1
+        k_2 += k_4
+        x += h / 6 * k_2
+        x[..., 6:9] = k_1[..., 6:9]
+
+
+def _rotation_derivative(x, out):
+    """Write R * skew(omega) of the flat state `x` to `out`."""
+    p, q, r = x[..., 9], x[..., 10], x[..., 11]
+    (r00, r01, r02, r10, r11, r12, r20, r21, r22) = [x[..., i]
+                                                     for i in range(12, 21)]
+    out[..., 12] = r01 * r - r02 * q
+    out[..., 13] = r02 * p - r00 * r
+    out[..., 14] = r00 * q - r01 * p
+    out[..., 15] = r11 * r - r12 * q
+    out[..., 16] = r12 * p - r10 * r
+    out[..., 17] = r10 * q - r11 * p
+    out[..., 18] = r21 * r - r22 * q
+    out[..., 19] = r22 * p - r20 * r
+    out[..., 20] = r20 * q - r21 * p
+
+
+def _mixing_matrix(params):
+    """Return the matrix mapping rotor forces to torques and thrust."""
+    L = params.L
+    K = params.K
+    m = params.m
+
+    return np.array(((0, L, 0, -L),
+                     (-L, 0, L, 0),
+                     (K, -K, K, -K),
+                     (1 / m, 1 / m, 1 / m, 1 / m)),
+                    dtype=np.float64)
 
 
 def wind_creator(direction, strength):
     """
     Return callable that computes the wind force on the quadrotor.
 
+    The returned callable accepts a `State` as well as a `BatchState`.
+
     Parameters:
     direction: 3d-array
         Direction vector for the wind.
     strength: float
         Strength of the wind in N / m^2
     """
-    direction = np.asarray(direction, dtype=np.float).squeeze()
+    direction = np.array(direction, dtype=float).squeeze()
     direction /= np.linalg.norm(direction)
 
     quadrotor_length = 0.3
@@ -254,6 +581,8 @@ def wind_creator(direction, strength):
                           quadrotor_length * quadrotor_height,
                           quadrotor_length ** 2))
 
+    force_direction = strength * direction
+
     def wind_force(state):
         """Return wind force.
 
@@ -261,17 +590,18 @@ def wind_creator(direction, strength):
 
         Parameters
         ----------
-        state :
+        state : State or BatchState
         """
         # Project surface areas into the wind direction
-        area = np.abs(direction.dot(state.R)) * norm_area
-        force = np.sum(area) * strength * direction
-        return force
+        area = np.abs(direction.dot(state.R)).dot(norm_area)
+        if np.ndim(area):
+            return area[:, None] * force_direction
+        return area * force_direction
 
     return wind_force
 
 
-def random_disturbance_creator(covariance, mean=None):
+def random_disturbance_creator(covariance, mean=None, n=None, seed=None):
     """Add gaussian disturbance forces with a certain covariance function.
 
     Parameters
@@ -280,26 +610,138 @@ def random_disturbance_creator(covariance, mean=None):
         A 3x3 array of the covariance matrix
     mean: np.array
         A 1d array of the 3 mean values (defaults to zero-mean)
+    n: int
+        Number of quadrotors for use with `BatchQuadrotorDynamics`.
+        Default: None ; for a single quadrotor.
+    seed: int
+        Seed of the random number generator.
 
     Returns
     -------
-    disturbance: callable
-        A function that can be used as an external force in quadsim
+    disturbance: RandomDisturbance
+        A callable that can be used as an external force in quadsim
     """
-    if mean is None:
-        mean = np.zeros((3,))
+    return RandomDisturbance(covariance, mean, n=n, seed=seed)
 
-    def random_force(state):
-        """Return wind force.
+
+class RandomDisturbance(object):
+    """Gaussian disturbance forces.
+
+    The covariance is factored once and the disturbances are drawn in blocks
+    from a dedicated random number generator. Calling `reset` with the number
+    of steps of a rollout draws the disturbances of the whole rollout at once.
+
+    Attributes
+    ----------
+    covariance: ndarray
+        The 3x3 covariance matrix.
+    mean: ndarray
+        The 3 mean values.
+    n: int or None
+        Number of quadrotors, None for a single quadrotor.
+    block_size: int
+        Number of steps drawn when the current block is exhausted.
+    """
+
+    def __init__(self, covariance, mean=None, n=None, seed=None,
+                 block_size=1000):
+        """Initialize the disturbance.
+
+        Parameters
+        ----------
+        covariance: np.array
+            A 3x3 array of the covariance matrix
+        mean: np.array
+            A 1d array of the 3 mean values (defaults to zero-mean)
+        n: int
+            Number of quadrotors. Default: None ; for a single quadrotor.
+        seed: int
+            Seed of the random number generator.
+        block_size: int
+            Number of steps drawn when the current block is exhausted.
+        """
+        self.covariance = np.asarray(covariance, dtype=float)
+        if mean is None:
+            self.mean = np.zeros((3,))
+        else:
+            self.mean = np.asarray(mean, dtype=float)
+        self.n = n
+        self.block_size = block_size
+
+        self._factor = _covariance_factor(self.covariance)
+        self.seed(seed)
+
+    def __call__(self, state):
+        """Return the disturbance force of the next step.
 
         Parameters
         ----------
-        state: State
+        state: State or BatchState
 
         Returns
         -------
         force: np.array
+            Array of shape (3,), or (n, 3) for n quadrotors.
         """
-        return np.random.multivariate_normal(mean, covariance)
+        if self._index >= len(self._block):
+            self._draw(self.block_size)
+        force = self._block[self._index]
+        self._index += 1
+        return force
+
+    def seed(self, seed=None):
+        """Reseed the random number generator and discard drawn forces."""
+        self._rng = np.random.RandomState(seed)
+        # separate stream for the seeds of batched disturbances
+        self._children = np.random.RandomState(self._rng.randint(2**31))
+        self._block = ()
+        self._index = 0
+
+    def reset(self, steps=None):
+        """Draw the disturbances for the next `steps` steps.
 
-    return random_force
+        Disturbances that have been drawn but not used are discarded.
+        """
+        if steps is None:
+            steps = self.block_size
+        self._draw(steps)
+
+    def snapshot(self):
+        """Return the state of the generator and the drawn forces."""
+        return self._rng.get_state(), self._block, self._index
+
+    def restore(self, snapshot):
+        """Restore a state returned by `snapshot`."""
+        state, self._block, self._index = snapshot
+        self._rng.set_state(state)
+
+    def batch(self, n):
+        """Return a disturbance for n quadrotors with an independent stream."""
+        return RandomDisturbance(self.covariance, self.mean, n=n,
+                                 seed=self._children.randint(2**31),
+                                 block_size=self.block_size)
+
+    def _draw(self, steps):
+        if self.n is None:
+            shape = (steps, 3)
+        else:
+            shape = (steps, self.n, 3)
+        block = self._rng.standard_normal(shape).dot(self._factor.T)
+        block += self.mean
+        self._block = block
+        self._index = 0
+
+
+def _covariance_factor(covariance):
+    """Return F with F * F.T = covariance.
+
+    Uses the Cholesky factorization and falls back to the eigendecomposition
+    for singular covariance matrices.
+    """
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        if eigenvalues.min() < -1e-8 * max(eigenvalues.max(), 1.):
+            raise ValueError("Covariance is not positive semi-definite.")
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
@@ -12,10 +12,14 @@ from .transformations import (vector_norm,
                               quaternion_multiply,
                               quaternion_conjugate,
                               quaternion_matrix,
-                              quaternion_about_axis)
+                              quaternion_about_axis,
+                              quaternion_multiply_batch,
+                              quaternion_matrix_batch,
+                              quaternion_about_axis_batch)
 
 __all__ = ['omega_from_quat_quat', 'apply_omega_to_quat', 'global_to_body',
-           'body_to_global']
+           'body_to_global', 'apply_omega_to_quat_batch',
+           'global_to_body_batch', 'body_to_global_batch']
 
 
 def omega_from_quat_quat(q1, q2, dt):
@@ -159,3 +163,77 @@ def body_to_global(q, vec):
     # quaternion_matrix(q)[:3,:3] is the matrix from body to global frame
     # that matrix is multiplied by omega
     return np.dot(quaternion_matrix(q)[:3, :3], vec)
+
+
+def apply_omega_to_quat_batch(q, omega, dt):
+    """
+    Apply angular velocities to an array of quaternions over dt.
+
+    Batched version of `apply_omega_to_quat`.
+
+    Parameters:
+    -----------
+    q: ndarray
+        Array of quaternions with shape (N, 4)
+    omega: ndarray
+        Angular velocities with shape (N, 3)
+    dt: float
+        time difference
+
+    Returns:
+    --------
+    ndarray
+        The quaternions of the orientations after rotation with omega for dt
+        seconds.
+    """
+    q = np.asarray(q, dtype=np.float64)
+
+    # rotation angle around each axis
+    w = np.asarray(omega, dtype=np.float64) * dt
+    angle = np.sqrt(np.sum(w * w, axis=-1))
+
+    # quaternions corresponding to these rotations
+    r = quaternion_about_axis_batch(angle, w)
+
+    # only rotate if the angle we rotate through is actually significant
+    significant = (angle >= np.finfo(float).eps * 4.0)[..., None]
+    return np.where(significant, quaternion_multiply_batch(r, q), q)
+
+
+def global_to_body_batch(q, vec):
+    """
+    Convert vectors from global to body coordinates.
+
+    Batched version of `global_to_body`.
+
+    Parameters:
+    -----------
+    q: ndarray
+        The rotation quaternions with shape (N, 4)
+    vec: ndarray
+        The vectors in global coordinates with shape (N, 3)
+
+    Returns:
+    vec: ndarray
+        The vectors in body coordinates
+    """
+    return np.einsum('...ji,...j->...i', quaternion_matrix_batch(q), vec)
+
+
+def body_to_global_batch(q, vec):
+    """Convert vectors from body to global coordinates.
+
+    Batched version of `body_to_global`.
+
+    Parameters:
+    -----------
+    q: ndarray
+        The rotation quaternions with shape (N, 4)
+    vec: ndarray
+        The vectors in body coordinates with shape (N, 3)
+
+    Returns:
+    vec: ndarray
+        The vectors in global coordinates
+    """
+    return np.einsum('...ij,...j->...i', quaternion_matrix_batch(q), vec)
@@ -1031,6 +1031,64 @@ def euler_matrix(ai, aj, ak, axes='sxyz'):
     return M
 
 
+def euler_matrix_batch(ai, aj, ak, axes='sxyz'):
+    """Return rotation matrices from arrays of Euler angles.
+
+    Batched version of euler_matrix. Returns rotation matrices of shape
+    (N, 3, 3) instead of homogeneous matrices.
+
+    >>> angles = numpy.random.random((3, 5))
+    >>> R = euler_matrix_batch(*angles, axes='syxz')
+    >>> numpy.allclose(R[2], euler_matrix(*angles[:, 2], axes='syxz')[:3, :3])
+    True
+
+    """
+    try:
+        firstaxis, parity, repetition, frame = _AXES2TUPLE[axes]
+    except (AttributeError, KeyError):
+        _ = _TUPLE2AXES[axes]
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = _NEXT_AXIS[i+parity]
+    k = _NEXT_AXIS[i-parity+1]
+
+    ai, aj, ak = numpy.broadcast_arrays(*[numpy.asarray(a, dtype=numpy.float64)
+                                          for a in (ai, aj, ak)])
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        ai, aj, ak = -ai, -aj, -ak
+
+    si, sj, sk = numpy.sin(ai), numpy.sin(aj), numpy.sin(ak)
+    ci, cj, ck = numpy.cos(ai), numpy.cos(aj), numpy.cos(ak)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
+
+    M = numpy.empty(ai.shape + (3, 3))
+    if repetition:
+        M[..., i, i] = cj
+        M[..., i, j] = sj*si
+        M[..., i, k] = sj*ci
+        M[..., j, i] = sj*sk
+        M[..., j, j] = -cj*ss+cc
+        M[..., j, k] = -cj*cs-sc
+        M[..., k, i] = -sj*ck
+        M[..., k, j] = cj*sc+cs
+        M[..., k, k] = cj*cc-ss
+    else:
+        M[..., i, i] = cj*ck
+        M[..., i, j] = sj*sc-cs
+        M[..., i, k] = sj*cc+ss
+        M[..., j, i] = cj*sk
+        M[..., j, j] = sj*ss+cc
+        M[..., j, k] = sj*cs-sc
+        M[..., k, i] = -sj
+        M[..., k, j] = cj*si
+        M[..., k, k] = cj*ci
+    return M
+
+
 def euler_from_matrix(matrix, axes='sxyz'):
     """Return Euler angles from rotation matrix for specified axis sequence.
 
@@ -1089,6 +1147,55 @@ def euler_from_matrix(matrix, axes='sxyz'):
     return ax, ay, az
 
 
+def euler_from_matrix_batch(matrix, axes='sxyz'):
+    """Return Euler angles from rotation matrices for specified axis sequence.
+
+    Batched version of euler_from_matrix for arrays of shape (N, 3, 3) or
+    (N, 4, 4). Returns an array of shape (N, 3).
+
+    >>> R = euler_matrix_batch(*numpy.random.random((3, 5)), axes='syxz')
+    >>> angles = euler_from_matrix_batch(R, 'syxz')
+    >>> numpy.allclose(angles[1], euler_from_matrix(R[1], 'syxz'))
+    True
+
+    """
+    try:
+        firstaxis, parity, repetition, frame = _AXES2TUPLE[axes.lower()]
+    except (AttributeError, KeyError):
+        _ = _TUPLE2AXES[axes]
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = _NEXT_AXIS[i+parity]
+    k = _NEXT_AXIS[i-parity+1]
+
+    M = numpy.asarray(matrix, dtype=numpy.float64)[..., :3, :3]
+    if repetition:
+        sy = numpy.sqrt(M[..., i, j]*M[..., i, j] + M[..., i, k]*M[..., i, k])
+        regular = sy > _EPS
+        ax = numpy.where(regular,
+                         numpy.arctan2( M[..., i, j],  M[..., i, k]),
+                         numpy.arctan2(-M[..., j, k],  M[..., j, j]))
+        ay = numpy.arctan2(sy, M[..., i, i])
+        az = numpy.where(regular,
+                         numpy.arctan2( M[..., j, i], -M[..., k, i]), 0.0)
+    else:
+        cy = numpy.sqrt(M[..., i, i]*M[..., i, i] + M[..., j, i]*M[..., j, i])
+        regular = cy > _EPS
+        ax = numpy.where(regular,
+                         numpy.arctan2( M[..., k, j],  M[..., k, k]),
+                         numpy.arctan2(-M[..., j, k],  M[..., j, j]))
+        ay = numpy.arctan2(-M[..., k, i], cy)
+        az = numpy.where(regular,
+                         numpy.arctan2( M[..., j, i],  M[..., i, i]), 0.0)
+
+    if parity:
+        ax, ay, az = -ax, -ay, -az
+    if frame:
+        ax, az = az, ax
+    return numpy.stack((ax, ay, az), axis=-1)
+
+
 def euler_from_quaternion(quaternion, axes='sxyz'):
     """Return Euler angles from quaternion for specified axis sequence.
 
@@ -1157,6 +1264,66 @@ def quaternion_from_euler(ai, aj, ak, axes='sxyz'):
     return quaternion
 
 
+def quaternion_from_euler_batch(ai, aj, ak, axes='sxyz'):
+    """Return quaternions from arrays of Euler angles and axis sequence.
+
+    Batched version of quaternion_from_euler. Returns an array of shape
+    (N, 4).
+
+    >>> angles = numpy.random.random((3, 5))
+    >>> q = quaternion_from_euler_batch(*angles, axes='ryxz')
+    >>> numpy.allclose(q[3], quaternion_from_euler(*angles[:, 3], axes='ryxz'))
+    True
+
+    """
+    try:
+        firstaxis, parity, repetition, frame = _AXES2TUPLE[axes.lower()]
+    except (AttributeError, KeyError):
+        _ = _TUPLE2AXES[axes]
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = _NEXT_AXIS[i+parity]
+    k = _NEXT_AXIS[i-parity+1]
+
+    ai, aj, ak = numpy.broadcast_arrays(*[numpy.asarray(a, dtype=numpy.float64)
+                                          for a in (ai, aj, ak)])
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        aj = -aj
+
+    ai = ai / 2.0
+    aj = aj / 2.0
+    ak = ak / 2.0
+    ci = numpy.cos(ai)
+    si = numpy.sin(ai)
+    cj = numpy.cos(aj)
+    sj = numpy.sin(aj)
+    ck = numpy.cos(ak)
+    sk = numpy.sin(ak)
+    cc = ci*ck
+    cs = ci*sk
+    sc = si*ck
+    ss = si*sk
+
+    quaternion = numpy.empty(ai.shape + (4, ), dtype=numpy.float64)
+    if repetition:
+        quaternion[..., i] = cj*(cs + sc)
+        quaternion[..., j] = sj*(cc + ss)
+        quaternion[..., k] = sj*(cs - sc)
+        quaternion[..., 3] = cj*(cc - ss)
+    else:
+        quaternion[..., i] = cj*sc - sj*cs
+        quaternion[..., j] = cj*ss + sj*cc
+        quaternion[..., k] = cj*cs - sj*sc
+        quaternion[..., 3] = cj*cc + sj*ss
+    if parity:
+        quaternion[..., j] *= -1
+
+    return quaternion
+
+
 def quaternion_about_axis(angle, axis):
     """Return quaternion for rotation about axis.
 
@@ -1174,6 +1341,28 @@ def quaternion_about_axis(angle, axis):
     return quaternion
 
 
+def quaternion_about_axis_batch(angle, axis):
+    """Return quaternions for rotations about axes.
+
+    Batched version of quaternion_about_axis for angles of shape (N, ) and
+    axes of shape (N, 3).
+
+    >>> q = quaternion_about_axis_batch([0.123, 0.0], [(1, 0, 0), (0, 0, 0)])
+    >>> numpy.allclose(q, [[0.06146124, 0, 0, 0.99810947], [0, 0, 0, 1]])
+    True
+
+    """
+    angle = numpy.asarray(angle, dtype=numpy.float64)
+    axis = numpy.asarray(axis, dtype=numpy.float64)[..., :3]
+    quaternion = numpy.empty(axis.shape[:-1] + (4, ), dtype=numpy.float64)
+    qlen = numpy.sqrt(numpy.sum(axis*axis, axis=-1))
+    regular = qlen > _EPS
+    scale = numpy.sin(angle/2.0) / numpy.where(regular, qlen, 1.0)
+    quaternion[..., :3] = axis * numpy.where(regular, scale, 1.0)[..., None]
+    quaternion[..., 3] = numpy.cos(angle/2.0)
+    return quaternion
+
+
 def quaternion_matrix(quaternion):
     """Return homogeneous rotation matrix from quaternion.
 
@@ -1196,6 +1385,38 @@ def quaternion_matrix(quaternion):
         ), dtype=numpy.float64)
 
 
+def quaternion_matrix_batch(quaternion):
+    """Return rotation matrices from quaternions.
+
+    Batched version of quaternion_matrix for quaternions of shape (N, 4).
+    Returns rotation matrices of shape (N, 3, 3) instead of homogeneous
+    matrices.
+
+    >>> R = quaternion_matrix_batch([[0.06146124, 0, 0, 0.99810947]])
+    >>> numpy.allclose(R[0], rotation_matrix(0.123, (1, 0, 0))[:3, :3])
+    True
+
+    """
+    q = numpy.array(quaternion, dtype=numpy.float64)[..., :4]
+    nq = numpy.sum(q*q, axis=-1)
+    regular = nq >= _EPS
+    q *= numpy.sqrt(2.0 / numpy.where(regular, nq, 1.0))[..., None]
+    q = q[..., :, None] * q[..., None, :]
+
+    M = numpy.empty(q.shape[:-2] + (3, 3))
+    M[..., 0, 0] = 1.0-q[..., 1, 1]-q[..., 2, 2]
+    M[..., 0, 1] =     q[..., 0, 1]-q[..., 2, 3]
+    M[..., 0, 2] =     q[..., 0, 2]+q[..., 1, 3]
+    M[..., 1, 0] =     q[..., 0, 1]+q[..., 2, 3]
+    M[..., 1, 1] = 1.0-q[..., 0, 0]-q[..., 2, 2]
+    M[..., 1, 2] =     q[..., 1, 2]-q[..., 0, 3]
+    M[..., 2, 0] =     q[..., 0, 2]-q[..., 1, 3]
+    M[..., 2, 1] =     q[..., 1, 2]+q[..., 0, 3]
+    M[..., 2, 2] = 1.0-q[..., 0, 0]-q[..., 1, 1]
+    M[~regular] = numpy.identity(3)
+    return M
+
+
 def quaternion_from_matrix(matrix):
     """Return quaternion from rotation matrix.
 
@@ -1245,6 +1466,27 @@ def quaternion_multiply(quaternion1, quaternion0):
         -x1*x0 - y1*y0 - z1*z0 + w1*w0), dtype=numpy.float64)
 
 
+def quaternion_multiply_batch(quaternion1, quaternion0):
+    """Return multiplication of two arrays of quaternions.
+
+    Batched version of quaternion_multiply for arrays of shape (N, 4).
+
+    >>> q = quaternion_multiply_batch([[1, -2, 3, 4]], [[-5, 6, 7, 8]])
+    >>> numpy.allclose(q, [[-44, -14, 48, 28]])
+    True
+
+    """
+    q0 = numpy.asarray(quaternion0, dtype=numpy.float64)
+    q1 = numpy.asarray(quaternion1, dtype=numpy.float64)
+    x0, y0, z0, w0 = [q0[..., n] for n in range(4)]
+    x1, y1, z1, w1 = [q1[..., n] for n in range(4)]
+    return numpy.stack((
+         x1*w0 + y1*z0 - z1*y0 + w1*x0,
+        -x1*z0 + y1*w0 + z1*x0 + w1*y0,
+         x1*y0 - y1*x0 + z1*w0 + w1*z0,
+        -x1*x0 - y1*y0 - z1*z0 + w1*w0), axis=-1)
+
+
 def quaternion_conjugate(quaternion):
     """Return conjugate of quaternion.
 
@@ -6,6 +6,18 @@ from SafeRLBench.base import EnvironmentBase
 from SafeRLBench.spaces import BoundedSpace
 
 
+def _default_height(x):
+    return -cos(pi * x)
+
+
+def _default_gradient(x):
+    return pi * sin(pi * x)
+
+
+def _default_curvature(x):
+    return pi**2 * cos(pi * x)
+
+
 class GeneralMountainCar(EnvironmentBase):
     """Implementation of a GeneralMountainCar Environment.
 
@@ -25,6 +37,8 @@ class GeneralMountainCar(EnvironmentBase):
         Goal along x-coordinate
     """
 
+    deterministic = True
+
     def __init__(self,
                  state_space=BoundedSpace(array([-1, -0.07]),
                                           array([1, 0.07])),
@@ -46,7 +60,8 @@ class GeneralMountainCar(EnvironmentBase):
             If contour is None, a default shape will be generated. A valid
             tuple needs to contain a function for the height at a position
             in the first element and a function for the gradient at a position
-            in the second argument.
+            in the second argument. An optional third function for the second
+            derivative enables rollout_gradient(policy).
         gravitation : double
         power : double
         goal : double
@@ -64,16 +79,13 @@ class GeneralMountainCar(EnvironmentBase):
 
         # setup contour
         if contour is None:
-            def _hx(x):
-                return -cos(pi * x)
-            self._hx = _hx
-
-            def _dydx(x):
-                return pi * sin(pi * x)
-            self._dydx = _dydx
+            self._hx = _default_height
+            self._dydx = _default_gradient
+            self._d2ydx2 = _default_curvature
         else:
             self._hx = contour[0]
             self._dydx = contour[1]
+            self._d2ydx2 = contour[2] if len(contour) > 2 else None
 
         # init state
         self.state = copy(state)
@@ -110,18 +122,75 @@ class GeneralMountainCar(EnvironmentBase):
     def _reset(self):
         self.state = copy(self.initial_state)
 
+    def _snapshot(self):
+        return copy(self.state)
+
+    def _restore(self, snapshot):
+        self.state = copy(snapshot)
+
+    def _rollout_gradient(self, policy):
+        if self._d2ydx2 is None:
+            raise NotImplementedError('The second derivative of the contour '
+                                      + 'is needed for analytic gradients.')
+
+        parameters = policy.parameters
+        bounds = self.state_space
+
+        # sensitivity of (position, velocity) to the parameters.
+        sensitivity = np.zeros((2, np.size(parameters)))
+        grad = np.zeros(np.size(parameters))
+        trace = []
+
+        self.reset()
+        for n in range(self.horizon):
+            position = self.state[0]
+            da_ds, da_dpar = policy.jacobians(self.state)
+            action = policy(self.state)
+            trace.append(self.update(action))
+
+            # saturated actions do not depend on the parameters.
+            da = (da_ds.dot(sensitivity) + da_dpar)[0]
+            if abs(np.ravel(action)[0]) > 1:
+                da = 0
+
+            # the position is updated with the velocity before clipping.
+            dvel = (sensitivity[1] + self.power * da
+                    - self.gravitation * self._d2ydx2(position)
+                    * sensitivity[0])
+            sensitivity[0] += dvel
+            sensitivity[1] = dvel
+
+            velocity, position = self.state[1], self.state[0]
+            if not bounds.lower[1] < velocity < bounds.upper[1]:
+                sensitivity[1] = 0
+            if not bounds.lower[0] < position < bounds.upper[0]:
+                sensitivity[0] = 0
+
+            grad += self._dydx(position) * sensitivity[0]
+
+            if (self.position() >= self.goal):
+                break
+
+        return trace, grad.reshape(np.shape(parameters))
+
+    def _config_key(self):
+        bounds = self.state_space
+        initial_state = np.asarray(self.initial_state, dtype=float)
+        return (bounds.lower.tobytes(), bounds.upper.tobytes(),
+                self.action_space.shape, initial_state.tobytes(),
+                self._hx, self._dydx, self.gravitation, self.power,
+                self.goal, self.horizon)
+
     def _reward(self):
         return(self.height() - 1)
 
-    def _rollout(self, policy):
+    def _rollout_iter(self, policy):
         self.reset()
-        trace = []
         for n in range(self.horizon):
             action = policy(self.state)
-            trace.append(self.update(action))
+            yield self.update(action)
             if (self.position() >= self.goal):
-                return trace
-        return trace
+                return
 
     def height(self):
         """Compute current height."""
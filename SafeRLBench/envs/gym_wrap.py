@@ -63,15 +63,13 @@ class GymWrap(EnvironmentBase):
         self.environment.reset()
         self.done = False
 
-    def _rollout(self, policy):
-        trace = []
+    def _rollout_iter(self, policy):
         for n in range(self.horizon):
             if self.render:
                 self.environment.render()
-            trace.append(self.update(policy(self.state)))
+            yield self.update(policy(self.state))
             if self.done:
                 break
-        return trace
 
     @property
     def state(self):
@@ -36,6 +36,8 @@ class LinearCar(EnvironmentBase):
         Action space as deduced from the state.
     """
 
+    deterministic = True
+
     def __init__(self, state=array([[0.], [0.]]), goal=array([[1.], [0.]]),
                  step=0.01, eps=0, horizon=100):
         """
@@ -86,15 +88,150 @@ class LinearCar(EnvironmentBase):
     def _reset(self):
         self.state = copy(self.initial_state)
 
-    def _rollout(self, policy):
+    def _snapshot(self):
+        return copy(self.state)
+
+    def _restore(self, snapshot):
+        self.state = copy(snapshot)
+
+    def _config_key(self):
+        initial_state = np.asarray(self.initial_state, dtype=float)
+        goal = np.asarray(self.goal, dtype=float)
+        return (initial_state.shape, initial_state.tobytes(), goal.tobytes(),
+                self.step, self.eps, self.horizon)
+
+    def _rollout_iter(self, policy):
         self.reset()
+        for n in range(self.horizon):
+            action = policy(self.state)
+            yield self.update(action)
+            if (self.eps != 0 and self._achieved()):
+                return
+
+    def _rollout_gradient(self, policy):
+        d = self.action_space.shape[0]
+        parameters = policy.parameters
+
+        # sensitivity of the flattened (pos, vel) state to the parameters.
+        sensitivity = np.zeros((2 * d, np.size(parameters)))
+        grad = np.zeros(np.size(parameters))
         trace = []
+
+        self.reset()
         for n in range(self.horizon):
+            da_ds, da_dpar = policy.jacobians(self.state)
             action = policy(self.state)
             trace.append(self.update(action))
+
+            # saturated actions do not depend on the parameters.
+            da = da_ds.dot(sensitivity) + da_dpar
+            da[np.abs(np.ravel(action)) > 1] = 0
+
+            sensitivity[d:] += self.step * da
+            sensitivity[:d] += sensitivity[d:]
+
+            diff = np.ravel(self.state - self.goal)
+            dist = norm(diff)
+            if dist > 0:
+                grad -= diff.dot(sensitivity) / dist
+
             if (self.eps != 0 and self._achieved()):
-                return trace
-        return trace
+                break
+
+        return trace, grad.reshape(np.shape(parameters))
+
+    def _rollout_batch(self, policy, parameters):
+        # Under a linear policy the one dimensional car is an affine closed
+        # loop as long as the actions do not saturate.
+        from SafeRLBench.policy import LinearPolicy
+        n = len(parameters)
+        flat = parameters.reshape(n, -1)
+        if (type(policy) is not LinearPolicy
+                or self.initial_state.shape != (2, 1)
+                or policy.d_state != 2 or policy.d_action != 1
+                or flat.shape[1] not in (2, 3)):
+            return super(LinearCar, self)._rollout_batch(policy, parameters)
+
+        gains = flat[:, 0:2].astype(float)
+        if flat.shape[1] == 3:
+            bias = flat[:, 2].astype(float)
+        else:
+            bias = np.zeros(n)
+
+        states = self._closed_loop_states(gains, bias)
+        returns, lengths = self._batch_returns(states)
+
+        # fall back to stepping where the actions saturate before the end.
+        actions = (np.einsum('ij,itj->it', gains, states[:, :-1])
+                   + bias[:, None])
+        alive = np.arange(self.horizon) < lengths[:, None]
+        with np.errstate(invalid='ignore'):
+            saturated = (~(np.abs(actions) <= 1) & alive).any(axis=1)
+
+        if saturated.any():
+            states = self._stepped_states(policy, parameters[saturated])
+            returns[saturated], lengths[saturated] = self._batch_returns(
+                states)
+
+        return returns, lengths
+
+    def _closed_loop_states(self, gains, bias):
+        """Compute the states of unsaturated rollouts with matrix powers.
+
+        The closed loop is written as a homogeneous 3x3 matrix M, the states
+        along the horizon are then given by M^t x0, where the powers are
+        computed in log(horizon) vectorized matrix products.
+        """
+        n, step = len(gains), self.step
+        loop = np.zeros((n, 3, 3))
+        loop[:, 0, 0] = 1 + step * gains[:, 0]
+        loop[:, 0, 1] = 1 + step * gains[:, 1]
+        loop[:, 1, 0] = step * gains[:, 0]
+        loop[:, 1, 1] = 1 + step * gains[:, 1]
+        loop[:, 0:2, 2] = step * bias[:, None]
+        loop[:, 2, 2] = 1
+
+        powers = np.empty((self.horizon + 1, n, 3, 3))
+        powers[0] = np.eye(3)
+        filled, power = 1, loop
+        with np.errstate(over='ignore', invalid='ignore'):
+            while filled <= self.horizon:
+                m = min(filled, self.horizon + 1 - filled)
+                np.matmul(powers[:m], power, out=powers[filled:filled + m])
+                power = np.matmul(power, power)
+                filled += m
+
+            x0 = np.append(np.ravel(self.initial_state), 1.)
+            states = powers[..., 0:2, :].dot(x0)
+
+        return states.swapaxes(0, 1)
+
+    def _stepped_states(self, policy, parameters):
+        """Compute the states of saturated rollouts step by step."""
+        n = len(parameters)
+        states = np.empty((n, self.horizon + 1, 2))
+        states[:, 0] = np.ravel(self.initial_state)
+        for t in range(self.horizon):
+            action = policy.map_population(parameters, states[:, t])
+            vel = states[:, t, 1] + self.step * np.clip(action, -1, 1)
+            states[:, t + 1, 0] = states[:, t, 0] + vel
+            states[:, t + 1, 1] = vel
+        return states
+
+    def _batch_returns(self, states):
+        """Compute returns and lengths from batched state trajectories."""
+        n = len(states)
+        with np.errstate(invalid='ignore'):
+            rewards = -norm(states[:, 1:] - np.ravel(self.goal), axis=2)
+
+        lengths = np.full(n, self.horizon, dtype=int)
+        if self.eps != 0 and self.horizon > 0:
+            achieved = np.abs(rewards) < self.eps
+            done = achieved.any(axis=1)
+            lengths[done] = achieved[done].argmax(axis=1) + 1
+            rewards[np.arange(self.horizon) >= lengths[:, None]] = 0
+
+        return rewards.sum(axis=1), lengths
 
     def _reward(self):
         return -norm(self.state - self.goal)
@@ -1,10 +1,16 @@
 """Markov Decision Process Implementations."""
 
 import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
 
 from SafeRLBench import EnvironmentBase
 from SafeRLBench.spaces import DiscreteSpace
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 
 class MDP(EnvironmentBase):
     """Discrete Markov Decision Process Environment.
@@ -25,6 +31,23 @@ class MDP(EnvironmentBase):
         Initial state of the process. If None, it will be set to 0.
     state : int
         Current state of the system.
+
+    Methods
+    -------
+    policy_evaluation(policy, discount=1., horizon=None)
+        Compute the exact value function of a tabular policy.
+    value_iteration(discount=1., horizon=None, eps=1e-8, max_it=10000)
+        Compute the optimal value function and a greedy policy.
+    policy_iteration(discount, max_it=1000)
+        Compute the optimal value function and policy by policy iteration.
+
+    Notes
+    -----
+    The transition and reward matrices of every action may either be dense
+    arrays or ``scipy.sparse`` matrices. Since the model is fully known, the
+    dynamic programming methods compute values without any rollouts, e.g.
+    the expected reward of a rollout under a tabular policy ``pi`` is given
+    by ``mdp.policy_evaluation(pi, horizon=mdp.horizon)[mdp.init_state]``.
     """
 
     def __init__(self, transitions, rewards, horizon=100, init_state=None,
@@ -49,7 +72,7 @@ class MDP(EnvironmentBase):
 
         # determine state and action space
         self.action_space = DiscreteSpace(len(transitions))
-        self.state_space = DiscreteSpace(len(transitions[0]))
+        self.state_space = DiscreteSpace(np.shape(transitions[0])[0])
 
         # if initial state is none, we will use 0 as an initial state
         if init_state is None:
@@ -83,17 +106,224 @@ class MDP(EnvironmentBase):
     def _update(self, action):
         prev_state = self.state
 
+        p = self.transitions[action][self.state]
+        if sparse.issparse(p):
+            p = p.toarray().ravel()
+
         # choose next state
         self.state = self.random.choice(np.arange(self.state_space.dimension),
-                                        p=self.transitions[action][self.state])
+                                        p=p)
         # determine reward
-        reward = self.rewards[action][prev_state][self.state]
+        rewards = self.rewards[action]
+        if sparse.issparse(rewards):
+            reward = rewards[prev_state, self.state]
+        else:
+            reward = rewards[prev_state][self.state]
 
         return action, self.state, reward
 
     def _reset(self):
         self.state = self.init_state
 
+    def _snapshot(self):
+        return self.state, self.random.get_state()
+
+    def _restore(self, snapshot):
+        self.state, random_state = snapshot
+        self.random.set_state(random_state)
+
+    def policy_evaluation(self, policy, discount=1., horizon=None):
+        """Compute the exact value function of a tabular policy.
+
+        Parameters
+        ----------
+        policy : array-like or callable
+            Either an integer array of shape (n_states,) containing the
+            action for every state, a float array of shape
+            (n_states, n_actions) containing the action probabilities for
+            every state or a callable mapping a state to an action.
+        discount : float
+            Discount factor.
+        horizon : int
+            If None, the infinite horizon value function is computed by
+            solving the linear Bellman equation, which requires a discount
+            strictly smaller than one. Otherwise the expected (discounted)
+            reward over `horizon` steps is computed.
+
+        Returns
+        -------
+        values : ndarray
+            Array of shape (n_states,) containing the value of every state.
+        """
+        p_pi, r_pi = self._policy_model(policy)
+        n_states = self.state_space.dimension
+
+        if horizon is not None:
+            values = np.zeros(n_states)
+            for _ in range(horizon):
+                values = r_pi + discount * p_pi.dot(values)
+            return values
+
+        _check_discount(discount)
+
+        if sparse.issparse(p_pi):
+            lhs = sparse.identity(n_states, format='csc') - discount * p_pi
+            return spsolve(lhs.tocsc(), r_pi)
+        return np.linalg.solve(np.eye(n_states) - discount * p_pi, r_pi)
+
+    def value_iteration(self, discount=1., horizon=None, eps=1e-8,
+                        max_it=10000):
+        """Compute the optimal value function and a greedy policy.
+
+        Parameters
+        ----------
+        discount : float
+            Discount factor.
+        horizon : int
+            If None, the infinite horizon problem is solved, which requires a
+            discount strictly smaller than one. Otherwise exactly `horizon`
+            backups are computed and the returned policy is the optimal
+            first action of the finite horizon problem.
+        eps : float
+            Iteration stops once the maximal change of the values is smaller
+            than `eps`. Ignored for finite horizons.
+        max_it : int
+            Maximal number of backups for the infinite horizon problem.
+
+        Returns
+        -------
+        values : ndarray
+            Array of shape (n_states,) containing the optimal values.
+        policy : ndarray
+            Integer array of shape (n_states,) containing the greedy action
+            for every state.
+        """
+        model = self._model()
+        values = np.zeros(self.state_space.dimension)
+
+        if horizon is not None:
+            q = _q_values(model, values, discount)
+            for _ in range(horizon - 1):
+                values = q.max(axis=0)
+                q = _q_values(model, values, discount)
+            return q.max(axis=0), q.argmax(axis=0)
+
+        _check_discount(discount)
+
+        for _ in range(max_it):
+            q = _q_values(model, values, discount)
+            new_values = q.max(axis=0)
+            done = np.max(np.abs(new_values - values)) < eps
+            values = new_values
+            if done:
+                break
+        else:
+            logger.warning('Value iteration did not converge after %d '
+                           + 'iterations.', max_it)
+
+        return values, _q_values(model, values, discount).argmax(axis=0)
+
+    def policy_iteration(self, discount, max_it=1000):
+        """Compute the optimal value function and policy by policy iteration.
+
+        Parameters
+        ----------
+        discount : float
+            Discount factor, strictly smaller than one.
+        max_it : int
+            Maximal number of policy improvement steps.
+
+        Returns
+        -------
+        values : ndarray
+            Array of shape (n_states,) containing the optimal values.
+        policy : ndarray
+            Integer array of shape (n_states,) containing the optimal action
+            for every state.
+        """
+        _check_discount(discount)
+
+        model = self._model()
+        policy = np.zeros(self.state_space.dimension, dtype=int)
+
+        for _ in range(max_it):
+            values = self.policy_evaluation(policy, discount)
+            q = _q_values(model, values, discount)
+
+            # only switch actions on strict improvement to avoid cycling
+            # between equally good actions.
+            states = np.arange(len(policy))
+            improve = q.max(axis=0) > q[policy, states] + 1e-12
+            if not improve.any():
+                return values, policy
+            policy[improve] = q.argmax(axis=0)[improve]
+
+        logger.warning('Policy iteration did not converge after %d '
+                       + 'iterations.', max_it)
+        return self.policy_evaluation(policy, discount), policy
+
+    def _model(self):
+        # Return the transition matrices and the expected rewards for every
+        # state and action, i.e. r[a, s] = sum_s' P[a, s, s'] * R[a, s, s'].
+        if any(sparse.issparse(p) for p in self.transitions):
+            transitions = [sparse.csr_matrix(p) for p in self.transitions]
+            rewards = np.array([
+                np.asarray(p.multiply(r).sum(axis=1)).ravel()
+                for p, r in zip(transitions, self.rewards)])
+        else:
+            transitions = np.asarray(self.transitions, dtype=float)
+            # the rewards may still be sparse if the transitions are not
+            rewards = np.asarray([r.toarray() if sparse.issparse(r) else r
+                                  for r in self.rewards])
+            rewards = np.sum(transitions * rewards, axis=2)
+        return transitions, rewards
+
+    def _policy_model(self, policy):
+        # Return the transition matrix and expected reward under the policy.
+        transitions, rewards = self._model()
+        n_states = self.state_space.dimension
+        n_actions = self.action_space.dimension
+        states = np.arange(n_states)
+
+        if callable(policy):
+            policy = [policy(s) for s in states]
+        policy = np.asarray(policy)
+
+        if policy.shape == (n_states,):
+            # deterministic policy, convert to action probabilities.
+            probs = np.zeros((n_states, n_actions))
+            probs[states, policy.astype(int)] = 1.
+        elif policy.shape == (n_states, n_actions):
+            probs = policy
+        else:
+            raise ValueError('Policy with shape %s invalid.'
+                             % str(policy.shape))
+
+        r_pi = np.sum(probs.T * rewards, axis=0)
+
+        if isinstance(transitions, np.ndarray):
+            p_pi = np.einsum('sa,ast->st', probs, transitions)
+        else:
+            p_pi = sum(sparse.diags(probs[:, a]).dot(p)
+                       for a, p in enumerate(transitions))
+            p_pi = sparse.csr_matrix(p_pi)
+
+        return p_pi, r_pi
+
+
+def _q_values(model, values, discount):
+    # Compute the Bellman backup q[a, s] for all actions and states.
+    transitions, rewards = model
+    if isinstance(transitions, np.ndarray):
+        return rewards + discount * transitions.dot(values)
+    return rewards + discount * np.array([p.dot(values) for p in transitions])
+
+
+def _check_discount(discount):
+    if not 0 <= discount < 1:
+        raise ValueError('Discount %f needs to be in [0, 1) for the infinite '
+                         'horizon problem.' % discount)
+
 
 def _get_test_args():
     # private method that will generate arguments for mdp testing.
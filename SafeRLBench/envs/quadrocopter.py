@@ -4,8 +4,9 @@ from __future__ import division, print_function, absolute_import
 
 from SafeRLBench import EnvironmentBase
 from SafeRLBench.spaces import RdSpace
+from SafeRLBench.cache import RolloutCache
 
-from ._quadrocopter import QuadrotorDynamics
+from ._quadrocopter import QuadrotorDynamics, BatchQuadrotorDynamics
 from ._quadrocopter import StateVector
 
 from functools import partial
@@ -17,6 +18,7 @@ from numpy import array
 from numpy import pi, cos, sin
 from numpy.linalg import norm
 
+import math
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,6 +26,15 @@ logger = logging.getLogger(__name__)
 # Available reference functions.
 REFERENCE_TYPES = ['circle', 'stationary', 'oscillate']
 
+# Precomputed reference tables, shared across Reference instances and keyed
+# by name, resolved keyword arguments and period. The least recently used
+# table is discarded once more than 32 are stored.
+_REFERENCE_TABLES = RolloutCache(maxsize=32)
+
+# Entries of the StateVector stored in the reference record, i.e. position,
+# velocity, euler angles and body angular velocity.
+_RECORD_INDEX = np.r_[0:6, 9:12, 15:18]
+
 
 class Quadrocopter(EnvironmentBase):
     """Quadrocopter simulation.
@@ -34,6 +45,18 @@ class Quadrocopter(EnvironmentBase):
         Number of iterations for the main simulation
     pre_sim_horizon : int
         Number of iterations for the pre-simulation.
+    record_trajectory : bool
+        Whether the positions visited during a rollout are recorded.
+    integrator : str
+        Integration scheme of the dynamics.
+    substeps : int or None
+        Number of integration steps per period.
+    external_forces : list
+        Callables returning external forces on the quadrocopter.
+    trajectory : ndarray
+        Positions visited since the last reset, starting with a zero row.
+    trajectory_time : ndarray
+        Simulation times corresponding to the visited positions.
     _model : model object
         Object simulating the quadrotor dynamics.
     """
@@ -41,7 +64,8 @@ class Quadrocopter(EnvironmentBase):
     def __init__(self,
                  init_pos=None, init_vel=None, num_sec=9,
                  num_init_sec=4, ref='circle', period=1 / 70.,
-                 seed=None):
+                 seed=None, record_trajectory=True, integrator='euler',
+                 substeps=None, external_forces=None):
         """Quadrocopter initialization.
 
         Parameters
@@ -59,15 +83,39 @@ class Quadrocopter(EnvironmentBase):
             'stationary' or 'oscillate'.
         period : float
         seed : int
+        record_trajectory : bool
+            Whether the positions visited during a rollout should be
+            recorded. Disable it when the trajectory is not needed.
+        integrator : str
+            Integration scheme of the dynamics, one of 'euler',
+            'semi_implicit' or 'rk4'. Default: 'euler'.
+        substeps : int
+            Number of integration steps per period, i.e. every update
+            simulates `period` seconds. Default: None ; which will simulate
+            a single step of the inner loop cycle of the dynamics per update,
+            independent of the period.
+        external_forces : list
+            Callables that take the model state and return external forces
+            in global coordinates, see `wind_creator` and
+            `random_disturbance_creator`. For `rollout_batch` they have to
+            accept a `BatchState` too, or provide a `batch(n)` method that
+            returns such a callable. Forces with a `reset(steps)` method
+            are reset with the number of integration steps of a rollout on
+            every reset, and forces with a `seed` method are seeded along
+            with the environment.
         """
         # spaces
         self.state_space = RdSpace((22,))
         self.action_space = RdSpace((4,))
 
+        if external_forces is None:
+            external_forces = []
+        self.external_forces = external_forces
+
         # seed
+        self._seed = None
         if seed is not None:
-            np.random.seed = seed
-            self._seed = seed
+            self.seed = seed
 
         # initial position
         if init_pos is None:
@@ -83,8 +131,16 @@ class Quadrocopter(EnvironmentBase):
         if len(init_vel) != 3:
             raise ValueError("init_vel with invalid length %d.", init_vel)
 
+        self._init_pos = init_pos
+        self._init_vel = init_vel
+
+        self.horizon = int(1. / period) * num_sec
+        self.pre_sim_horizon = int(1. / period) * num_init_sec
+
         # initialize model
-        self._model = QuadrotorDynamics(init_pos, init_vel)
+        self.integrator = integrator
+        self.substeps = substeps
+        self._model = self._create_model()
 
         if isinstance(ref, string_types):
             self.reference = Reference(ref, period)
@@ -92,55 +148,170 @@ class Quadrocopter(EnvironmentBase):
             self.reference = ref
             self.period = ref.period
 
+        self.reference.precompute(self.horizon)
         self.reference.reset(self.state)
 
-        self.horizon = int(1. / period) * num_sec
-        self.pre_sim_horizon = int(1. / period) * num_init_sec
-
         self.period = self.reference.period
 
-        self._init_pos = init_pos
-        self._init_vel = init_vel
+        # simulated time per update, None uses the inner loop cycle.
+        if substeps is None:
+            self._duration = None
+        else:
+            self._duration = self.period
 
-        self._trajectory = np.atleast_2d(np.zeros(3))
-        self._time = []
+        # preallocate trajectory buffers, they are reused across resets.
+        self.record_trajectory = record_trajectory
+        if record_trajectory:
+            self._trajectory = np.zeros((self.horizon + 1, 3))
+            self._time = np.zeros(self.horizon + 1)
         self._step = 0
 
     def _update(self, action):
         assert self.action_space.contains(action), "Invalid action."
 
-        self._model.update_position(action)
+        self._model.update_position(action, self._duration)
 
         self._step += 1
         time = self._step * self.period
 
-        self._time.append(time)
-        self._trajectory = np.vstack((self._trajectory, self.state.pos))
+        if self.record_trajectory:
+            self._record(time)
 
         reward = self._reward()
         self.reference.update(self.state, time)
 
-        return action, self.state.copy(), reward
+        return action, self.state, reward
+
+    def _create_model(self, n=None):
+        # single model if n is None, otherwise a batch of n models.
+        substeps = 1 if self.substeps is None else self.substeps
+
+        if n is None:
+            forces = self.external_forces
+        else:
+            forces = [force.batch(n) if hasattr(force, 'batch') else force
+                      for force in self.external_forces]
+
+        # draw the disturbances of the whole rollout at once.
+        for force in forces:
+            if hasattr(force, 'reset'):
+                force.reset(self.horizon * substeps)
+
+        if n is None:
+            return QuadrotorDynamics(self._init_pos, self._init_vel,
+                                     external_forces=forces,
+                                     integrator=self.integrator,
+                                     substeps=substeps)
+        return BatchQuadrotorDynamics(n, self._init_pos, self._init_vel,
+                                      external_forces=forces,
+                                      integrator=self.integrator,
+                                      substeps=substeps)
 
     def _reset(self):
-        self._model = QuadrotorDynamics(self._init_pos, self._init_vel)
+        self._model = self._create_model()
         self.reference.reset(self.state)
-        self._trajectory = np.atleast_2d(np.zeros(3))
-        self._time = []
         self._step = 0
 
-    def _rollout(self, policy):
+    def _snapshot(self):
+        snapshot = {
+            'x': self._model.state.x.copy(),
+            'step': self._step,
+            'reference': self.reference.snapshot(),
+            'forces': [force.snapshot() if hasattr(force, 'snapshot')
+                       else None for force in self._model.external_forces]
+        }
+        if self.record_trajectory:
+            snapshot['trajectory'] = (self.trajectory.copy(),
+                                      self.trajectory_time.copy())
+        return snapshot
+
+    def _restore(self, snapshot):
+        self._model.state.x[:] = snapshot['x']
+        self._model.state.invalidate()
+        self._step = snapshot['step']
+        self.reference.restore(snapshot['reference'])
+
+        for force, state in zip(self._model.external_forces,
+                                snapshot['forces']):
+            if state is not None:
+                force.restore(state)
+
+        if self.record_trajectory:
+            trajectory, time = snapshot['trajectory']
+            if len(trajectory) > len(self._trajectory):
+                self._trajectory = np.zeros_like(trajectory)
+                self._time = np.zeros(len(trajectory))
+            self._trajectory[:len(trajectory)] = trajectory
+            self._time[:len(time)] = time
+
+    def _rollout_iter(self, policy):
         if hasattr(policy, 'reference'):
             policy.reference = self.reference
         self.reset()
-        trace = []
         for n in range(self.horizon):
             action = policy(self.state)
-            trace.append(self.update(action))
-        return trace
+            yield self.update(action)
+
+    def _rollout_batch(self, policy, parameters):
+        # Only the quadrocopter controller can be simulated vectorized.
+        from SafeRLBench.policy import NonLinearQuadrocopterController
+        if not isinstance(policy, NonLinearQuadrocopterController):
+            return super(Quadrocopter, self)._rollout_batch(policy,
+                                                            parameters)
+
+        n = len(parameters)
+        model = self._create_model(n)
+        state = model.state
+
+        references = self.reference.evaluate_batch(state.state_vectors, 0.)
+        returns = np.zeros(n)
+
+        for step in range(1, self.horizon + 1):
+            actions = policy.map_population(parameters, state.state_vectors,
+                                            references)
+            model.update_position(actions, self._duration)
+
+            states = state.state_vectors
+            rewards = (-norm(states[:, 0:3] - references[:, 0:3], axis=1)
+                       - norm(states[:, 3:6] - references[:, 3:6], axis=1))
+            rewards[np.isnan(rewards)] = -1.79769313e+308
+            returns += rewards
+
+            references = self.reference.evaluate_batch(states,
+                                                       step * self.period)
+
+        return returns, np.full(n, self.horizon, dtype=int)
+
+    def _record(self, time):
+        # grow the buffers if we step beyond the horizon.
+        if self._step >= len(self._trajectory):
+            trajectory, time_buffer = self._trajectory, self._time
+            self._trajectory = np.concatenate((trajectory,
+                                               np.zeros_like(trajectory)))
+            self._time = np.concatenate((time_buffer,
+                                         np.zeros_like(time_buffer)))
+
+        self._trajectory[self._step] = self._model.state.pos
+        self._time[self._step - 1] = time
+
+    @property
+    def trajectory(self):
+        """Return the positions visited since the last reset."""
+        if not self.record_trajectory:
+            logger.warning("Trajectory has not been recorded.")
+            return None
+        return self._trajectory[:self._step + 1]
+
+    @property
+    def trajectory_time(self):
+        """Return the times corresponding to the recorded positions."""
+        if not self.record_trajectory:
+            logger.warning("Trajectory has not been recorded.")
+            return None
+        return self._time[:self._step]
 
     def _reward(self):
-        state = self.state
+        state = self._model.state
         ref = self.reference.reference
 
         reward = -norm(state.pos - ref.pos) - norm(state.vel - ref.vel)
@@ -160,10 +331,20 @@ class Quadrocopter(EnvironmentBase):
         np.random.seed(value)
         self._seed = value
 
+        # independent streams for the external forces.
+        forces = [force for force in self.external_forces
+                  if hasattr(force, 'seed')]
+        seeds = np.random.RandomState(value).randint(2**31, size=len(forces))
+        for force, seed in zip(forces, seeds):
+            force.seed(seed)
+
     @property
     def state(self):
-        """Provide access to state_vector."""
-        # this whole state vector implementation is annoyingly inefficient.
+        """Provide access to state_vector.
+
+        Returns a copy of the state vector cached by the model, modifying it
+        does not change the state of the environment.
+        """
         return self._model.state.state_vector
 
     @state.setter
@@ -172,7 +353,14 @@ class Quadrocopter(EnvironmentBase):
 
 
 class Reference(object):
-    """Reference object for quadrocopter environment."""
+    """Reference object for quadrocopter environment.
+
+    Apart from the yaw of the circle reference, the references only depend
+    on the time. They are tabulated at multiples of the period once per name,
+    keyword arguments and period, and the tables are shared across resets
+    and instances. Times that are not a multiple of the period are evaluated
+    directly.
+    """
 
     def __init__(self, name='circle', period=1. / 70, keep_record=True,
                  **kwargs):
@@ -197,11 +385,13 @@ class Reference(object):
         self._name = name
         self.period = period
         self._iter = 0
+        self._kwargs = kwargs
         self._reference_function = self._reference_chooser(**kwargs)
+        self._table = self._lookup_table(1)
         self._current_ref = None
         self.keep_record = keep_record
         if keep_record:
-            self._record = []
+            self._record = np.zeros((1, len(_RECORD_INDEX)))
 
     @property
     def name(self):
@@ -213,34 +403,69 @@ class Reference(object):
         if value not in REFERENCE_TYPES:
             raise ValueError(value + ' is not a valid reference.')
 
-        self.reset()
-
         self._name = value
-        self._reference_function = self._ref_chooser()
+        self._reference_function = self._reference_chooser(**self._kwargs)
+
+        self.reset()
 
     @property
     def record(self):
-        """Return the reference record of the simulation."""
+        """Return the reference record of the simulation.
+
+        The record is a view of a buffer which is reused after a reset.
+        """
         if self.keep_record:
-            return np.atleast_2d(self._record)
+            return self._record[:self._iter]
         else:
             logger.warning("Reference record has not been saved.")
 
+    def precompute(self, steps):
+        """Make sure the reference is tabulated for `steps` updates.
+
+        Parameters
+        ----------
+        steps : int
+            Number of updates after a reset.
+        """
+        if len(self._table) <= steps:
+            self._grow(steps + 1)
+        if self.keep_record and len(self._record) < steps:
+            self._record = np.zeros((steps, len(_RECORD_INDEX)))
+
+    def snapshot(self):
+        """Return a copy of the internal state, see `restore`."""
+        record = self.record.copy() if self.keep_record else None
+        return self._iter, np.array(self._current_ref), record
+
+    def restore(self, snapshot):
+        """Restore the internal state from a snapshot."""
+        self._iter, ref, record = snapshot
+        self._current_ref = ref.copy().view(StateVector)
+        if self.keep_record:
+            if len(record) > len(self._record):
+                self._record = np.zeros_like(record)
+            self._record[:len(record)] = record
+
     def reset(self, state=None):
         """Reset internal state."""
         self._iter = 0
-        self._current_ref = self._reference_function(state, 0, False)
-        if self.keep_record:
-            self._record = []
+        self._table = self._lookup_table(len(self._table))
+        # the circle yaw is written into a private copy of the table.
+        if self._name == 'circle':
+            self._table = self._table.copy()
+        self._current_ref = self._table_reference(0, state)
 
     def update(self, state, time, finished=False):
         """Compute the state of the reference object."""
-        ref = self._reference_function(state, time, finished)
+        index = int(round(time / self.period))
+        if index >= 0 and abs(time - index * self.period) <= 1e-9 * time:
+            ref = self._table_reference(index, state)
+        else:
+            ref = self._reference_function(state, time, finished)
         self._iter += 1
 
         if self.keep_record:
-            ref_value = np.hstack((ref.pos, ref.vel, ref.euler, ref.omega_b))
-            self._update_record(ref_value)
+            self._update_record(ref)
 
         self._current_ref = ref
 
@@ -251,9 +476,84 @@ class Reference(object):
         """Return the reference."""
         return self._current_ref
 
-    def _update_record(self, ref_value):
-        self._record.append(ref_value)
-        assert self._iter == len(self._record)
+    def evaluate_batch(self, states, time):
+        """Compute the references for a batch of states.
+
+        This does not change the internal state of the reference object.
+
+        Parameters
+        ----------
+        states : ndarray
+            Array of shape (n, 22) containing states in the `StateVector`
+            layout.
+        time : float
+            Current time.
+
+        Returns
+        -------
+        references : ndarray
+            Array of shape (n, 22) containing the references.
+        """
+        index = int(round(time / self.period))
+        if index >= 0 and abs(time - index * self.period) <= 1e-9 * time:
+            ref = self._lookup_table(index + 1)[index]
+        else:
+            ref = self._reference_function(states[0].view(StateVector), time,
+                                           False)
+        references = np.tile(ref, (len(states), 1))
+
+        # the yaw of the circle reference depends on the state.
+        if self._name == 'circle':
+            references[:, 11] = pi + np.arctan2(states[:, 1], states[:, 0])
+
+        return references
+
+    def _table_reference(self, index, state):
+        """Return the tabulated reference of update `index`."""
+        if index >= len(self._table):
+            self._grow(index + 1)
+        ref = self._table[index]
+        if self._name == 'circle' and state is not None:
+            ref[11] = pi + math.atan2(state[1], state[0])
+        return ref.view(StateVector)
+
+    def _grow(self, length):
+        """Replace the table by one with at least `length` rows."""
+        length = max(length, 2 * len(self._table))
+        table = self._lookup_table(length)
+        if self._name == 'circle':
+            table = table.copy()
+            table[:len(self._table), 11] = self._table[:, 11]
+        self._table = table
+
+    def _lookup_table(self, length):
+        """Return a shared table of the reference with `length` rows or more.
+
+        Row `i` contains the reference at time ``i * period``, the yaw of the
+        circle reference is not set.
+        """
+        keywords = tuple(sorted(
+            (key, tuple(np.ravel(value).tolist()))
+            for key, value in self._reference_function.keywords.items()))
+        key = (self._name, keywords, self.period)
+
+        table = _REFERENCE_TABLES.get(key)
+        if table is None or len(table) < length:
+            state = StateVector()
+            table = np.array([self._reference_function(state, i * self.period,
+                                                       False)
+                              for i in range(length)])
+            table.flags.writeable = False
+            _REFERENCE_TABLES.put(key, table)
+
+        return table
+
+    def _update_record(self, ref):
+        # grow the buffer if we step beyond its length.
+        if self._iter > len(self._record):
+            self._record = np.concatenate((self._record,
+                                           np.zeros_like(self._record)))
+        self._record[self._iter - 1] = ref[_RECORD_INDEX]
 
     def _reference_chooser(self, **kwargs):
         # CIRCLE
@@ -9,14 +9,72 @@ from __future__ import absolute_import
 import inspect
 from functools import partial
 
+from SafeRLBench import EnvironmentBase
 import SafeRLBench.envs as envs
+from SafeRLBench.envs.quadrocopter import Reference, _REFERENCE_TABLES
+from SafeRLBench.envs._quadrocopter import QuadrotorDynamics, StateVector
+from SafeRLBench.envs._quadrocopter import BatchQuadrotorDynamics
+from SafeRLBench.envs._quadrocopter import random_disturbance_creator
+from SafeRLBench.envs._quadrocopter import wind_creator
+from SafeRLBench.envs._quadrocopter import quaternions as quat
+from SafeRLBench.envs._quadrocopter import transformations as tf
+from SafeRLBench.policy import LinearPolicy, NonLinearQuadrocopterController
 
 import numpy as np
+from scipy import sparse
 
 import gym
 gym.undo_logger_setup()
 
 from mock import Mock
+from unittest2 import TestCase
+
+
+def _reference_derivatives(model, pitch, roll, z_vel, yaw_vel):
+    """Compute the quadrotor derivatives step by step with numpy."""
+    params, state = model.params, model.state
+    R = state.R
+    roll_cur, _, yaw_cur = state.rpy
+
+    # desired angular rates and thrust
+    c_des = (params.g + (z_vel - state.vel[2]) / params.tau_Iz) / R[2, 2]
+    yaw_des = yaw_vel * params.tau_Iyaw + yaw_cur
+    r_13_des = (np.sin(yaw_des) * np.sin(roll)
+                + np.cos(yaw_des) * np.cos(roll) * np.sin(pitch))
+    r_23_des = (np.cos(roll) * np.sin(yaw_des) * np.sin(pitch)
+                - np.cos(yaw_des) * np.sin(roll))
+    e_13, e_23 = r_13_des - R[0, 2], r_23_des - R[1, 2]
+    p_des = (R[1, 0] * e_13 - R[0, 0] * e_23) / (R[2, 2] * params.tau_rp)
+    q_des = (R[1, 1] * e_13 - R[0, 1] * e_23) / (R[2, 2] * params.tau_rp)
+    rates = np.array([p_des, q_des, yaw_vel])
+
+    # rotor forces
+    j = np.diag((params.Ix, params.Iy, params.Iz))
+    gains = 1. / np.array((params.tau_p, params.tau_q, params.tau_r))
+    omega = state.omega
+    b = j.dot(gains * (rates - omega)) + np.cross(omega, j.dot(omega))
+    mixing = np.array([[0, params.L, 0, -params.L],
+                       [-params.L, 0, params.L, 0],
+                       [params.K, -params.K, params.K, -params.K],
+                       [1. / params.m] * 4])
+    f1, f2, f3, f4 = np.linalg.solve(mixing, np.append(b, c_des))
+
+    # linear drag in body coordinates
+    drag = np.array((params.CD_bx, params.CD_by, params.CD_bz))
+    v_b = np.linalg.solve(R, state.vel)
+    acc = (f1 + f2 + f3 + f4) * R[:, 2] - R.dot(drag * v_b)
+    acc = acc / params.m - np.array([0, 0, params.g])
+
+    p, q, r = omega
+    omega_dot = np.array([
+        (params.L * (f2 - f4) + (params.Iy - params.Iz) * r * q) / params.Ix,
+        (params.L * (f3 - f1) + (params.Iz - params.Ix) * r * p) / params.Iy,
+        (params.K * (f1 - f2 + f3 - f4) + (params.Ix - params.Iy) * p * q)
+        / params.Iz])
+    R_dot = R.dot(np.array([[0, -r, q], [r, 0, -p], [-q, p, 0]]))
+
+    return np.concatenate((state.vel, state.acc, acc, omega_dot,
+                           R_dot.ravel()))
 
 
 class TestEnvironments(object):
@@ -124,3 +182,624 @@ class TestEnvironments(object):
             else:
                 assert(np.isclose(t_verify[1], t[1]))
             assert(np.isclose(t_verify[2], t[2]))
+
+
+class TestMDP(TestCase):
+    """Test the dynamic programming methods of the MDP environment."""
+
+    def setUp(self):
+        """Create a dense and a sparse test MDP."""
+        transitions, rewards, _, init_state, seed = envs.mdp._get_test_args()
+        self.dense = envs.MDP(transitions, rewards, 10, init_state, seed)
+        self.sparse = envs.MDP([sparse.csr_matrix(t) for t in transitions],
+                               [sparse.csr_matrix(r) for r in rewards],
+                               10, init_state, seed)
+
+    def test_mdp_dense_sparse(self):
+        """Test: MDP: dense and sparse layouts agree."""
+        v_dense, pi_dense = self.dense.value_iteration(0.9)
+        v_sparse, pi_sparse = self.sparse.value_iteration(0.9)
+
+        assert(np.allclose(v_dense, v_sparse))
+        assert(all(pi_dense == pi_sparse))
+
+        assert(np.allclose(self.dense.policy_evaluation(pi_dense, 0.9),
+                           self.sparse.policy_evaluation(pi_dense, 0.9)))
+
+        # sparse rollouts work as well.
+        trace = self.sparse.rollout(lambda s: pi_sparse[s])
+        self.assertEqual(len(trace), 10)
+
+    def test_mdp_mixed_layouts(self):
+        """Test: MDP: dense transitions with sparse rewards and vice versa."""
+        transitions, rewards, _, init_state, seed = envs.mdp._get_test_args()
+        v_dense, pi_dense = self.dense.value_iteration(0.9)
+
+        mixed = [
+            envs.MDP(transitions, [sparse.csr_matrix(r) for r in rewards],
+                     10, init_state, seed),
+            envs.MDP([sparse.csr_matrix(t) for t in transitions], rewards,
+                     10, init_state, seed)]
+
+        for mdp in mixed:
+            values, policy = mdp.value_iteration(0.9)
+            assert(np.allclose(values, v_dense))
+            assert(all(policy == pi_dense))
+
+    def test_mdp_value_policy_iteration(self):
+        """Test: MDP: value iteration and policy iteration agree."""
+        v_vi, pi_vi = self.dense.value_iteration(0.9, eps=1e-12)
+        v_pi, pi_pi = self.dense.policy_iteration(0.9)
+
+        assert(np.allclose(v_vi, v_pi))
+        assert(all(pi_vi == pi_pi))
+
+        # the optimal values are a fixed point of the policy evaluation.
+        assert(np.allclose(self.dense.policy_evaluation(pi_pi, 0.9), v_pi))
+
+        with self.assertRaises(ValueError):
+            self.dense.policy_iteration(1.)
+
+    def test_mdp_policy_evaluation(self):
+        """Test: MDP: exact evaluation matches rollouts."""
+        env = self.dense
+
+        # always taking action 1 yields a deterministic reward sequence.
+        values = env.policy_evaluation(lambda s: 1, horizon=env.horizon)
+        trace = env.rollout(lambda s: 1)
+        self.assertAlmostEqual(values[env.init_state],
+                               sum([t[2] for t in trace]))
+
+        # the uniform random policy is evaluated in expectation.
+        probs = np.full((5, 2), 0.5)
+        values = env.policy_evaluation(probs, horizon=env.horizon)
+
+        random = np.random.RandomState(0)
+        rewards = [sum([t[2] for t in env.rollout(
+                        lambda s: random.randint(2))]) for _ in range(2000)]
+
+        self.assertAlmostEqual(values[env.init_state], np.mean(rewards),
+                               delta=0.1)
+
+
+class TestQuadrocopter(TestCase):
+    """Test the Quadrocopter environment."""
+
+    def test_quadrocopter_state_cache(self):
+        """Test: QUADROCOPTER: cached state vector."""
+        env = envs.Quadrocopter()
+
+        state = env.state
+        cached = env._model.state._state_vector
+        pos = state.pos[0]
+
+        # the returned vector is a copy of the cache and may be modified.
+        state.pos[0] = 10.
+        self.assertEqual(env.state.pos[0], pos)
+        self.assertIs(env._model.state._state_vector, cached)
+        state.pos[0] = pos
+
+        env.update(np.zeros(4))
+        assert(not np.allclose(env.state, state))
+
+        model_state = env._model.state
+        assert(np.allclose(env.state.omega_g,
+                           model_state.R.dot(model_state.omega)))
+        assert(np.allclose(env.state.pos, model_state.pos))
+
+        # assigning the state invalidates the cache.
+        env.state = state
+        assert(np.allclose(env.state, state))
+
+    def test_quadrotor_state_in_place(self):
+        """Test: QUADROCOPTER: in place changes update derived values."""
+        model = QuadrotorDynamics()
+        state = model.state
+        rpy, vector = state.rpy, state.state_vector
+
+        with self.assertRaises(ValueError):
+            state.rpy[0] = 1.
+
+        state.R[:] = tf.euler_matrix(.1, -.2, .3)[:3, :3]
+        state.omega[1] = 2.
+        state.pos[2] = -1.
+
+        assert(np.allclose(state.rpy, [.1, -.2, .3]))
+        assert(np.allclose(state.quaternion,
+                           tf.quaternion_from_euler(.1, -.2, .3)))
+        assert(np.allclose(state.omega_g, state.R.dot([0., 2., 0.])))
+
+        vector = state.state_vector
+        self.assertEqual(vector.pos[2], -1.)
+        self.assertEqual(vector.omega_b[1], 2.)
+        assert(np.allclose(vector.euler, [.1, -.2, .3]))
+        assert(not np.allclose(rpy, state.rpy))
+
+        # writes to the flat array are detected as well.
+        state.x[3] = 5.
+        self.assertEqual(state.state_vector.vel[0], 5.)
+
+    def test_quadrocopter_trajectory(self):
+        """Test: QUADROCOPTER: trajectory recording."""
+        env = envs.Quadrocopter()
+        buffer = env._trajectory
+
+        trace = env.rollout(lambda state: np.zeros(4))
+
+        self.assertEqual(env.trajectory.shape, (env.horizon + 1, 3))
+        self.assertEqual(env.trajectory_time.shape, (env.horizon,))
+        assert(np.allclose(env.trajectory[-1], trace[-1][1][0:3]))
+
+        # buffers are reused across resets.
+        env.reset()
+        self.assertIs(env._trajectory, buffer)
+        self.assertEqual(len(env.trajectory), 1)
+
+        env = envs.Quadrocopter(record_trajectory=False)
+        env.rollout(lambda state: np.zeros(4))
+        self.assertIsNone(env.trajectory)
+
+    def test_quadrotor_fused_dynamics(self):
+        """Test: QUADROCOPTER: fused dynamics match the reference model."""
+        random = np.random.RandomState(0)
+
+        for _ in range(10):
+            model = QuadrotorDynamics(random.randn(3), random.randn(3),
+                                      random.randn(3))
+            model.state.omega = random.randn(3)
+            inputs = 0.3 * random.randn(4)
+
+            derivatives = model.dynamics_derivative(*inputs)
+            out = np.concatenate((derivatives.pos, derivatives.vel,
+                                  derivatives.acc, derivatives.omega,
+                                  derivatives.R.ravel()))
+
+            expected = _reference_derivatives(model, *inputs)
+
+            assert(np.allclose(out, expected, rtol=1e-12, atol=1e-12))
+
+    def test_quadrotor_integrators(self):
+        """Test: QUADROCOPTER: integrators converge to the same solution."""
+        inputs = np.array([0.05, -0.03, 0.2, 0.1])
+
+        def simulate(integrator, substeps):
+            model = QuadrotorDynamics(np.array([1., 0., 0.]),
+                                      np.array([0., 1.5, 0.]),
+                                      integrator=integrator,
+                                      substeps=substeps)
+            model.state.omega = np.array([.3, -.2, .1])
+            for _ in range(5):
+                model.update_position(inputs, 0.1)
+            # the acceleration slot is not an integrated quantity.
+            return np.delete(model.state.x, range(6, 9))
+
+        reference = simulate('rk4', 1000)
+
+        errors = {}
+        for integrator in ['euler', 'semi_implicit', 'rk4']:
+            errors[integrator] = [np.abs(simulate(integrator, substeps)
+                                         - reference).max()
+                                  for substeps in [10, 20]]
+
+        # first order for the euler schemes, fourth order for rk4.
+        for integrator, (coarse, fine) in errors.items():
+            order = 4 if integrator == 'rk4' else 1
+            self.assertGreater(coarse / fine, 0.8 * 2 ** order)
+        self.assertLess(errors['rk4'][0], 1e-6)
+
+        self.assertRaises(ValueError, QuadrotorDynamics, integrator='rk5')
+        self.assertRaises(ValueError, QuadrotorDynamics, substeps=0)
+
+    def test_quadrocopter_substeps(self):
+        """Test: QUADROCOPTER: substeps simulate one period per update."""
+        env = envs.Quadrocopter(num_sec=1, integrator='rk4', substeps=3)
+        policy = NonLinearQuadrocopterController()
+
+        policy.reference = env.reference
+        env.reset()
+        model = QuadrotorDynamics(env._init_pos, env._init_vel,
+                                  integrator='rk4', substeps=6)
+        action = policy(env.state)
+        env.update(action)
+        model.update_position(action, 2 * env.period)
+        env.update(action)
+
+        assert(np.allclose(env._model.state.x, model.state.x))
+
+        parameters = np.array([[.7, .7, .7, .5, .707],
+                               [.5, .6, .8, .4, .9]])
+        returns, _ = env.rollout_batch(policy, parameters)
+
+        for par, ret in zip(parameters, returns):
+            policy.parameters = par
+            trace = env.rollout(policy)
+            self.assertAlmostEqual(sum([t[2] for t in trace]), ret)
+
+    def test_quadrocopter_reference_table(self):
+        """Test: QUADROCOPTER: precomputed reference tables."""
+        state = StateVector()
+        state.pos = [0.5, -0.3, 0.]
+
+        for name in ['circle', 'oscillate', 'stationary']:
+            ref = Reference(name, 1 / 70., radius=0.8)
+            ref.precompute(20)
+            ref.reset(state)
+
+            # tables are shared across instances.
+            other = Reference(name, 1 / 70., radius=0.8)
+            self.assertIs(other._lookup_table(20), ref._lookup_table(20))
+
+            records = []
+            # off the time grid and beyond the table, too.
+            for time in [i * ref.period for i in range(1, 40)] + [0.123]:
+                value = ref.update(state, time)
+                expected = ref._reference_function(state, time, False)
+                assert(np.allclose(value, expected))
+                records.append(np.hstack((expected.pos, expected.vel,
+                                          expected.euler, expected.omega_b)))
+
+            assert(np.allclose(ref.record, records))
+
+            ref.reset(state)
+            self.assertEqual(len(ref.record), 0)
+
+        # the shared tables are bounded.
+        for radius in np.linspace(.1, 1., 40):
+            Reference('circle', 1 / 70., radius=radius)
+        self.assertEqual(len(_REFERENCE_TABLES), _REFERENCE_TABLES.maxsize)
+
+    def test_quadrocopter_disturbances(self):
+        """Test: QUADROCOPTER: external force generators."""
+        # singular covariance, factored by the eigendecomposition.
+        covariance = np.array([[1., 1., 0.], [1., 1., 0.], [0., 0., .5]])
+        mean = np.array([0., 1., -1.])
+
+        disturbance = random_disturbance_creator(covariance, mean, seed=0)
+        forces = np.array([disturbance(None) for _ in range(20000)])
+
+        assert(np.allclose(forces.mean(axis=0), mean, atol=0.05))
+        assert(np.allclose(np.cov(forces.T), covariance, atol=0.05))
+
+        disturbance.seed(0)
+        assert(np.allclose(disturbance(None), forces[0]))
+
+        batch = disturbance.batch(5)
+        self.assertEqual(batch(None).shape, (5, 3))
+
+        # the wind force works on batches of states.
+        wind = wind_creator([1., 1., 0.], 2.)
+        model = BatchQuadrotorDynamics(3, R=np.eye(3))
+        model.state.R[1] = [[0., -1., 0.], [1., 0., 0.], [0., 0., 1.]]
+        expected = [wind(QuadrotorDynamics(R=R).state)
+                    for R in model.state.R]
+        assert(np.allclose(wind(model.state), expected))
+
+        # seeding the environment seeds the disturbances.
+        env = envs.Quadrocopter(num_sec=1,
+                                external_forces=[disturbance, wind])
+        policy = NonLinearQuadrocopterController()
+
+        returns = []
+        for _ in range(2):
+            env.seed = 1
+            returns.append(sum([t[2] for t in env.rollout(policy)]))
+        self.assertEqual(returns[0], returns[1])
+
+    def test_quadrocopter_rollout_batch(self):
+        """Test: QUADROCOPTER: batched rollouts match rollouts."""
+        env = envs.Quadrocopter(num_sec=2)
+        policy = NonLinearQuadrocopterController()
+
+        parameters = np.array([[.7, .7, .7, .5, .707],
+                               [.5, .6, .8, .4, .9],
+                               [.9, .8, .5, .6, .5]])
+
+        returns, lengths = env.rollout_batch(policy, parameters)
+
+        assert(all(lengths == env.horizon))
+        assert(np.allclose(policy.parameters, parameters[0]))
+        self.assertEqual(env.monitor.rollout_cnt, 3)
+
+        for par, ret in zip(parameters, returns):
+            policy.parameters = par
+            trace = env.rollout(policy)
+            self.assertAlmostEqual(sum([t[2] for t in trace]), ret)
+
+
+class TestTransformations(TestCase):
+    """Test the batched rotation conversions of the quadrocopter."""
+
+    def test_euler_batch(self):
+        """Test: TRANSFORMATIONS: batched euler conversions match loops."""
+        angles = 4 * np.pi * (np.random.RandomState(0).rand(3, 20) - 0.5)
+        # include gimbal lock for the sxyz and szxz sequences.
+        angles[:, 0] = [0.3, np.pi / 2, 0.2]
+        angles[:, 1] = [0.3, 0., 0.2]
+
+        for axes in tf._AXES2TUPLE.keys():
+            matrices = tf.euler_matrix_batch(*angles, axes=axes)
+            quaternions = tf.quaternion_from_euler_batch(*angles, axes=axes)
+            euler = tf.euler_from_matrix_batch(matrices, axes=axes)
+
+            for n, (ai, aj, ak) in enumerate(angles.T):
+                matrix = tf.euler_matrix(ai, aj, ak, axes)
+                assert(np.allclose(matrices[n], matrix[:3, :3]))
+                assert(np.allclose(quaternions[n],
+                                   tf.quaternion_from_euler(ai, aj, ak,
+                                                            axes)))
+                assert(np.allclose(euler[n],
+                                   tf.euler_from_matrix(matrix, axes)))
+
+    def test_quaternion_batch(self):
+        """Test: TRANSFORMATIONS: batched quaternion helpers match loops."""
+        random = np.random.RandomState(1)
+        q = np.array([tf.random_quaternion(rand) for rand in
+                      random.rand(10, 3)])
+        q[0] = [0., 0., 0., 0.]
+        omega = random.randn(10, 3)
+        omega[1] = 0.
+        vec = random.randn(10, 3)
+
+        assert(np.allclose(tf.quaternion_matrix_batch(q),
+                           [tf.quaternion_matrix(x)[:3, :3] for x in q]))
+        assert(np.allclose(quat.apply_omega_to_quat_batch(q, omega, 0.1),
+                           [quat.apply_omega_to_quat(x, w, 0.1)
+                            for x, w in zip(q, omega)]))
+        assert(np.allclose(quat.global_to_body_batch(q, vec),
+                           [quat.global_to_body(x, v)
+                            for x, v in zip(q, vec)]))
+        assert(np.allclose(quat.body_to_global_batch(q, vec),
+                           [quat.body_to_global(x, v)
+                            for x, v in zip(q, vec)]))
+
+
+class TestSnapshot(TestCase):
+    """Test environment snapshots."""
+
+    def check_branches(self, env, policy, prefix=5, steps=10):
+        """Check that continuations after a restore agree."""
+        env.reset()
+        for _ in range(prefix):
+            env.update(policy(env.state))
+
+        snapshot = env.snapshot()
+
+        branches = []
+        for _ in range(2):
+            env.restore(snapshot)
+            branches.append([env.update(policy(env.state))
+                             for _ in range(steps)])
+
+        for (a_0, s_0, r_0), (a_1, s_1, r_1) in zip(*branches):
+            assert(np.allclose(s_0, s_1))
+            self.assertEqual(r_0, r_1)
+
+        # a restore after a reset continues the snapshot, too.
+        env.reset()
+        env.restore(snapshot)
+        a, s, r = env.update(policy(env.state))
+        assert(np.allclose(s, branches[0][0][1]))
+
+    def test_snapshot(self):
+        """Test: ENVIRONMENTBASE: snapshots reproduce continuations."""
+        self.check_branches(envs.LinearCar(),
+                            lambda s: np.array([0.5 - s[0, 0]]))
+        self.check_branches(envs.GeneralMountainCar(),
+                            lambda s: np.array([np.sign(s[1]) + 0.1]))
+        self.check_branches(envs.MDP(*envs.mdp._get_test_args()),
+                            lambda s: s % 2)
+
+        disturbance = random_disturbance_creator(0.1 * np.eye(3), seed=0)
+        env = envs.Quadrocopter(num_sec=1, external_forces=[disturbance])
+        policy = NonLinearQuadrocopterController(reference=env.reference)
+        self.check_branches(env, policy)
+
+        # records are restored as well.
+        env.reset()
+        trace = [env.update(policy(env.state)) for _ in range(3)]
+        snapshot = env.snapshot()
+        env.update(policy(env.state))
+        env.restore(snapshot)
+        self.assertEqual(len(env.trajectory), 4)
+        self.assertEqual(len(env.reference.record), 3)
+        assert(np.allclose(env.trajectory[-1], trace[-1][1][0:3]))
+
+    def test_snapshot_not_implemented(self):
+        """Test: ENVIRONMENTBASE: snapshots raise if not implemented."""
+        class Environment(EnvironmentBase):
+            def _update(self, action):
+                pass
+
+            def _reset(self):
+                pass
+
+        env = Environment(None, None)
+        self.assertRaises(NotImplementedError, env.snapshot)
+        self.assertRaises(NotImplementedError, env.restore, None)
+
+
+class TestRolloutIter(TestCase):
+    """Test the streaming rollout implementation."""
+
+    def test_rollout_iter(self):
+        """Test: ENVIRONMENTBASE: rollout_iter yields the rollout."""
+        policy = LinearPolicy(2, 1, par=[-1., -1., 1.])
+        environments = [envs.LinearCar(eps=0.5), envs.LinearCar(),
+                        envs.GeneralMountainCar()]
+
+        for env in environments:
+            trace = env.rollout(policy)
+            streamed = list(env.rollout_iter(policy))
+
+            self.assertEqual(len(trace), len(streamed))
+            for (a_0, s_0, r_0), (a_1, s_1, r_1) in zip(trace, streamed):
+                assert(np.allclose(s_0, s_1))
+                self.assertEqual(r_0, r_1)
+
+            # early termination of the linear car.
+            if env is environments[0]:
+                self.assertLess(len(trace), env.horizon)
+
+    def test_rollout_iter_early_stop(self):
+        """Test: ENVIRONMENTBASE: consumers of rollout_iter can stop early."""
+        env = envs.LinearCar()
+        policy = LinearPolicy(2, 1, par=[-1., -1., 0.])
+
+        for n, transition in enumerate(env.rollout_iter(policy)):
+            if n == 4:
+                break
+
+        assert(np.allclose(env.state, transition[1]))
+        self.assertEqual(env.monitor.rollout_cnt, 1)
+
+    def test_rollout_iter_fallback(self):
+        """Test: ENVIRONMENTBASE: rollout_iter with a custom _rollout."""
+        class Environment(EnvironmentBase):
+            def _update(self, action):
+                pass
+
+            def _reset(self):
+                pass
+
+            def _rollout(self, policy):
+                return [(0, 1, 2), (3, 4, 5)]
+
+        env = Environment(None, None)
+        self.assertEqual(list(env.rollout_iter(None)), [(0, 1, 2), (3, 4, 5)])
+
+    def test_rollout_super(self):
+        """Test: ENVIRONMENTBASE: overrides may call the default rollout."""
+        class Environment(EnvironmentBase):
+            def __init__(self):
+                super(Environment, self).__init__(None, None, horizon=3)
+                self.state = 0
+
+            def _update(self, action):
+                self.state += action
+                return action, self.state, float(self.state)
+
+            def _reset(self):
+                self.state = 0
+
+        class Rollout(Environment):
+            def _rollout(self, policy):
+                trace = super(Rollout, self)._rollout(policy)
+                return trace + [(0, -1, -1.)]
+
+        class Both(Rollout):
+            def _rollout_iter(self, policy):
+                for action, state, reward in super(Both,
+                                                   self)._rollout_iter(policy):
+                    yield action, state, 2 * reward
+
+        def policy(state):
+            return 1
+
+        trace = Rollout().rollout(policy)
+        self.assertEqual(trace, [(1, 1, 1.), (1, 2, 2.), (1, 3, 3.),
+                                 (0, -1, -1.)])
+        self.assertEqual(list(Rollout().rollout_iter(policy)), trace)
+
+        env = Both()
+        self.assertEqual(list(env.rollout_iter(policy)),
+                         [(1, 1, 2.), (1, 2, 4.), (1, 3, 6.)])
+        self.assertEqual(env.rollout(policy),
+                         [(1, 1, 2.), (1, 2, 4.), (1, 3, 6.), (0, -1, -1.)])
+
+
+class TestRolloutGradient(TestCase):
+    """Test analytic rollout gradients."""
+
+    def finite_differences(self, env, policy, h=1e-6):
+        parameters = policy.parameters
+        grad = np.zeros(len(parameters))
+        for n, variation in enumerate(h * np.eye(len(parameters))):
+            policy.parameters = parameters + variation
+            ret_plus = sum([t[2] for t in env._rollout(policy)])
+            policy.parameters = parameters - variation
+            ret_minus = sum([t[2] for t in env._rollout(policy)])
+            grad[n] = (ret_plus - ret_minus) / (2 * h)
+        policy.parameters = parameters
+        return grad
+
+    def test_rollout_gradient(self):
+        """Test: ENVIRONMENTBASE: rollout gradients."""
+        cases = [
+            (envs.LinearCar(), [-.5, -1.2, .3]),
+            # saturated actions
+            (envs.LinearCar(), [-5., -3., 2.]),
+            (envs.LinearCar(eps=0.1), [-.5, -1.2, .3]),
+            (envs.GeneralMountainCar(), [.3, 10., .2]),
+            (envs.GeneralMountainCar(), [3., 100., .5]),
+        ]
+        for env, par in cases:
+            policy = LinearPolicy(2, 1, par=par)
+            trace, grad = env.rollout_gradient(policy)
+
+            self.assertEqual(len(trace), len(env._rollout(policy)))
+            assert(np.allclose(grad, self.finite_differences(env, policy),
+                               rtol=1e-5, atol=1e-6))
+
+    def test_rollout_gradient_not_implemented(self):
+        """Test: ENVIRONMENTBASE: rollout gradient not implemented."""
+        env = envs.GeneralMountainCar(contour=(np.cos, np.sin))
+        with self.assertRaises(NotImplementedError):
+            env.rollout_gradient(LinearPolicy(2, 1, par=[1., 1.]))
+
+        class Environment(EnvironmentBase):
+            def _update(self, action):
+                pass
+
+            def _reset(self):
+                pass
+
+        env = Environment(None, None)
+        with self.assertRaises(NotImplementedError):
+            env.rollout_gradient(LinearPolicy(1, 1, par=[1.]))
+
+
+class TestRolloutBatch(TestCase):
+    """Test the default batched rollout implementation."""
+
+    def test_rollout_batch(self):
+        """Test: ENVIRONMENTBASE: sequential batched rollouts."""
+        env = envs.LinearCar()
+        policy = LinearPolicy(2, 1, par=[-1., -1., 0.])
+
+        parameters = [[-1., -1., 0.], [-2., -1., 0.5]]
+        returns, lengths = env.rollout_batch(policy, parameters)
+
+        assert(all(policy.parameters == [-1., -1., 0.]))
+        self.assertEqual(env.monitor.rollout_cnt, 2)
+
+        for par, ret, length in zip(parameters, returns, lengths):
+            policy.parameters = par
+            trace = env.rollout(policy)
+            self.assertEqual(len(trace), length)
+            self.assertAlmostEqual(sum([t[2] for t in trace]), ret)
+
+    def test_linear_car_rollout_batch(self):
+        """Test: LINEARCAR: closed form batched rollouts."""
+        random = np.random.RandomState(0)
+        parameters = np.c_[-3 * random.rand(20, 2), random.rand(20) - .5]
+        # saturate the actions for some parameters.
+        parameters[:4] *= 50
+
+        for eps in [0, 0.05]:
+            env = envs.LinearCar(eps=eps, horizon=50)
+            policy = LinearPolicy(2, 1, par=[-1., -1., 0.])
+            returns, lengths = env.rollout_batch(policy, parameters)
+
+            for par, ret, length in zip(parameters, returns, lengths):
+                policy.parameters = par
+                trace = env._rollout(policy)
+                self.assertEqual(len(trace), length)
+                self.assertAlmostEqual(sum([t[2] for t in trace]) / ret, 1.)
+
+        # unbiased policies take the same path.
+        env = envs.LinearCar(horizon=50)
+        policy = LinearPolicy(2, 1, par=[-1., -1.])
+        returns, _ = env.rollout_batch(policy, parameters[:, 0:2])
+        policy.parameters = parameters[5, 0:2]
+        trace = env._rollout(policy)
+        self.assertAlmostEqual(sum([t[2] for t in trace]) / returns[5], 1.)
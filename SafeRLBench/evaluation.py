@@ -0,0 +1,328 @@
+"""Batched policy evaluation."""
+
+from __future__ import division
+
+from SafeRLBench import config
+
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from copy import deepcopy
+import hashlib
+import pickle
+import threading
+
+__all__ = ('evaluate', 'backends')
+
+"""Tuple of the available evaluation backends."""
+backends = ('serial', 'vectorized', 'thread', 'process')
+
+# process pools with the token of the last payload they received, keyed by
+# (id(env_factory), n_jobs) and ordered by their last use
+_pools = OrderedDict()
+_max_pools = 4
+
+# (payload token, environment, policy) replica of a process pool worker
+_replica = None
+
+
+def evaluate(env_factory, policy, params_batch, n_episodes=1, seeds=None,
+             backend='serial', n_jobs=None, average=False, traces=False,
+             monitor=True):
+    """Evaluate a policy on an environment for a batch of parameters.
+
+    Performs `n_episodes` rollouts for every parameter in `params_batch` and
+    returns the matrix of their rewards. The parameters of the policy will be
+    the same before and after the call.
+
+    Parameters
+    ----------
+    env_factory :
+        Either an environment instance, i.e. a subclass of `EnvironmentBase`,
+        or a callable without arguments returning a new environment, e.g. an
+        environment class. If an instance is passed, the serial and
+        vectorized backends use it directly and the thread and process
+        backends work on copies of it.
+    policy : Policy
+        Policy instance used to select the actions.
+    params_batch : array-like
+        Batch of policy parameters, the first dimension indexes the
+        parameters.
+    n_episodes : int
+        Number of rollouts for every parameter.
+    seeds : array-like
+        Optional sequence of `n_episodes` seeds. The environment and the
+        policy, if they have a `seed` attribute, are reseeded with the seed of
+        an episode before each of its rollouts, such that all parameters are
+        evaluated on common random numbers. With the vectorized backend they
+        are reseeded once per episode instead.
+    backend : str
+        One of the strings listed in the Notes section.
+    n_jobs : int
+        Number of workers of the thread and process backends. By default
+        `config.n_jobs` will be used.
+    average : bool
+        If True, the rewards of a rollout are averaged over its length
+        instead of summed.
+    traces : bool
+        If True, the traces of the rollouts are returned as well. Not
+        supported by the vectorized backend.
+    monitor : bool
+        If True and an environment instance is passed, the rollouts are
+        counted by its monitor. As for `EnvironmentBase.rollout`, rollouts
+        served from the rollout cache are not counted.
+
+    Returns
+    -------
+    rewards : ndarray
+        Array of shape (n, n_episodes) containing the total, respectively
+        average, reward of every rollout.
+    traces : list
+        Only if `traces` is True. Nested list, such that traces[i][j] is the
+        trace of the j-th rollout of the i-th parameter.
+
+    Notes
+    -----
+    These strings can be used to select a backend.
+
+    +--------------+-----------------------------------------------+
+    |'serial'      | Rollouts in a loop, consulting the rollout    |
+    |              | cache if it is enabled. The only backend      |
+    |              | using the cache.                              |
+    +--------------+-----------------------------------------------+
+    |'vectorized'  | One rollout_batch call per episode.           |
+    +--------------+-----------------------------------------------+
+    |'thread'      | Batch split among a thread pool.              |
+    +--------------+-----------------------------------------------+
+    |'process'     | Batch split among a process pool.             |
+    +--------------+-----------------------------------------------+
+
+    The thread and process backends create one replica of the environment
+    and the policy per worker, which is reused for all parts of the batch
+    the worker evaluates. Without seeds and traces, every worker evaluates
+    its parts with rollout_batch.
+
+    The process pools are kept alive between calls, one per environment and
+    number of workers, and at most four at a time. The environment and the
+    policy are pickled once per call and sent to every worker at most once,
+    all other parts of the batch only carry their parameters. Workers keep
+    their replica across calls until environment or policy change.
+    """
+    if backend not in backends:
+        raise ValueError('Invalid backend %s, use one of %s.'
+                         % (backend, str(backends)))
+    if traces and backend == 'vectorized':
+        raise ValueError('The vectorized backend does not provide traces.')
+    if seeds is not None and len(seeds) != n_episodes:
+        raise ValueError('Need one seed for each of the %d episodes.'
+                         % n_episodes)
+
+    # the serial backend also accepts lists of arbitrary parameters
+    parameters = params_batch
+    if backend != 'serial':
+        parameters = np.asarray(parameters)
+    if n_jobs is None:
+        n_jobs = config.n_jobs
+
+    is_instance = _is_environment(env_factory)
+    monitor = monitor and is_instance
+    if backend in ('serial', 'vectorized') and not is_instance:
+        # the local backends only need a single environment
+        env_factory = env_factory()
+
+    initialized = getattr(policy, 'initialized', True)
+    if initialized:
+        current = policy.parameters
+
+    if backend in ('serial', 'vectorized'):
+        # the local backends count the simulated rollouts themselves
+        results = [_evaluate_chunk(env_factory, policy, parameters,
+                                   n_episodes, seeds, backend == 'vectorized',
+                                   traces, cached=backend == 'serial',
+                                   monitor=monitor)]
+    elif monitor:
+        with env_factory.monitor_rollout_batch(len(parameters) * n_episodes):
+            results = _run_pool(env_factory, policy, parameters, n_episodes,
+                                seeds, backend, n_jobs, traces)
+    else:
+        results = _run_pool(env_factory, policy, parameters, n_episodes,
+                            seeds, backend, n_jobs, traces)
+
+    if initialized:
+        policy.parameters = current
+
+    rewards = np.concatenate([r for r, _, _ in results])
+    if average:
+        lengths = np.concatenate([n for _, n, _ in results])
+        rewards = rewards / np.maximum(lengths, 1)
+
+    if traces:
+        return rewards, [t for _, _, chunk in results for t in chunk]
+    return rewards
+
+
+def _run_pool(env_factory, policy, parameters, n_episodes, seeds, backend,
+              n_jobs, traces):
+    """Evaluate the parameters on a pool, returning a list of chunks."""
+    chunks = np.array_split(parameters,
+                            max(min(4 * n_jobs, len(parameters)), 1))
+    args = (n_episodes, seeds, seeds is None and not traces, traces)
+    if backend == 'thread':
+        return _run_threads(env_factory, policy, chunks, n_jobs, args)
+    return _run_processes(env_factory, policy, chunks, n_jobs, args)
+
+
+def _is_environment(obj):
+    """Return True if obj is an environment instance and not a factory."""
+    return not isinstance(obj, type) and hasattr(obj, '_rollout_batch')
+
+
+def _replicate(env_factory, policy):
+    """Return a new replica of the environment and the policy."""
+    if _is_environment(env_factory):
+        env = deepcopy(env_factory)
+    else:
+        env = env_factory()
+    return env, deepcopy(policy)
+
+
+def _reseed(env, policy, seed):
+    """Reseed environment and policy, if they support it."""
+    for obj in (env, policy):
+        if hasattr(obj, 'seed'):
+            obj.seed = seed
+
+
+def _evaluate_chunk(env, policy, parameters, n_episodes, seeds, vectorized,
+                    traces, cached=False, monitor=False):
+    """Evaluate a chunk of parameters on an environment.
+
+    Returns the returns and lengths of the rollouts as arrays of shape
+    (n, n_episodes) and the nested list of traces, if traces is True. If
+    cached is True, the rollout cache is consulted and if monitor is True,
+    the simulated rollouts are counted by the monitor of env.
+    """
+    n = len(parameters)
+    returns = np.zeros((n, n_episodes))
+    lengths = np.zeros((n, n_episodes), dtype=int)
+    chunk_traces = [[None] * n_episodes for _ in range(n)] if traces else []
+
+    for j in range(n_episodes):
+        seed = None if seeds is None else seeds[j]
+
+        if vectorized:
+            if seed is not None:
+                _reseed(env, policy, seed)
+            if monitor:
+                with env.monitor_rollout_batch(n):
+                    returns[:, j], lengths[:, j] = env._rollout_batch(
+                        policy, parameters)
+            else:
+                returns[:, j], lengths[:, j] = env._rollout_batch(policy,
+                                                                  parameters)
+            continue
+
+        for i, par in enumerate(parameters):
+            policy.parameters = par
+            if seed is None and cached:
+                trace = env._cached_rollout(policy, monitor=monitor)
+            else:
+                if seed is not None:
+                    _reseed(env, policy, seed)
+                if monitor:
+                    with env.monitor_rollout():
+                        trace = env._rollout(policy)
+                else:
+                    trace = env._rollout(policy)
+
+            returns[i, j] = sum([t[2] for t in trace])
+            lengths[i, j] = len(trace)
+            if traces:
+                chunk_traces[i][j] = trace
+
+    return returns, lengths, chunk_traces
+
+
+def _run_threads(env_factory, policy, chunks, n_jobs, args):
+    """Evaluate the chunks on a thread pool with one replica per thread."""
+    local = threading.local()
+
+    def run(chunk):
+        if not hasattr(local, 'replica'):
+            local.replica = _replicate(env_factory, policy)
+        env, replica_policy = local.replica
+        return _evaluate_chunk(env, replica_policy, chunk, *args)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as ex:
+        return list(ex.map(run, chunks))
+
+
+def _process_chunk(token, payload, chunk, args):
+    """Evaluate a chunk on the replica of a process pool worker.
+
+    The replica is unpickled from payload and kept by the worker until a
+    chunk with another token arrives. Returns None if the worker holds no
+    replica for token and the chunk was sent without payload.
+    """
+    global _replica
+    if _replica is None or _replica[0] != token:
+        if payload is None:
+            return None
+        env, policy = pickle.loads(payload)
+        if not _is_environment(env):
+            env = env()
+        _replica = (token, env, policy)
+    _, env, policy = _replica
+    return _evaluate_chunk(env, policy, chunk, *args)
+
+
+def _get_pool(key):
+    """Return the [pool, token] entry of key, creating the pool if needed."""
+    entry = _pools.pop(key, None)
+    if entry is None:
+        entry = [ProcessPoolExecutor(max_workers=key[1]), None]
+    _pools[key] = entry
+    while len(_pools) > _max_pools:
+        _, (pool, _) = _pools.popitem(last=False)
+        pool.shutdown(wait=False)
+    return entry
+
+
+def _run_processes(env_factory, policy, chunks, n_jobs, args):
+    """Evaluate the chunks on a persistent process pool.
+
+    The environment and the policy are pickled once per call and only sent
+    along with the first chunk of every worker. The token identifies their
+    content, such that workers keep their replica across calls as long as
+    environment and policy do not change. Chunks which reach a worker
+    without replica are sent again with the payload.
+    """
+    payload = pickle.dumps((env_factory, policy), pickle.HIGHEST_PROTOCOL)
+    token = hashlib.sha1(payload).hexdigest()
+
+    key = (id(env_factory), n_jobs)
+    entry = _get_pool(key)
+    pool, shipped = entry
+    # if the pool has seen the payload before, the workers most likely still
+    # hold their replica and the payload is only sent on demand
+    first = 0 if shipped == token else n_jobs
+    entry[1] = token
+
+    try:
+        futures = [pool.submit(_process_chunk, token,
+                               payload if n < first else None, chunk, args)
+                   for n, chunk in enumerate(chunks)]
+        results = []
+        for chunk, future in zip(chunks, futures):
+            result = future.result()
+            if result is None:
+                result = pool.submit(_process_chunk, token, payload, chunk,
+                                     args).result()
+            results.append(result)
+    except Exception:
+        # do not reuse a pool which may be broken
+        _pools.pop(key, None)
+        pool.shutdown(wait=False)
+        raise
+    return results
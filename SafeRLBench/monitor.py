@@ -4,6 +4,7 @@ import logging
 import time
 
 from SafeRLBench import config
+from SafeRLBench.evaluation import evaluate
 
 from contextlib import contextmanager
 
@@ -31,6 +32,10 @@ class EnvMonitor(object):
         Context manager for monitoring environment rollout. It should be used
         when invoking the private ``_rollout`` implementation from the
         interface method.
+    monitor_rollout_batch(n)
+        Context manager for monitoring a batch of `n` rollouts. It should be
+        used when invoking the private ``_rollout_batch`` implementation from
+        the interface method.
     monitor_reset()
         Context manager for monitoring environment resets. It should be used
         when invoking the private ``_reset`` implementation from the interface
@@ -57,6 +62,13 @@ class EnvMonitor(object):
         yield self
         self._after_rollout()
 
+    @contextmanager
+    def monitor_rollout_batch(self, n):
+        """Context monitoring a batch of rollouts."""
+        self._before_rollout()
+        yield self
+        self._after_rollout_batch(n)
+
     @contextmanager
     def monitor_reset(self):
         """Context monitoring reset."""
@@ -105,6 +117,16 @@ class EnvMonitor(object):
         """
         self.monitor.rollout_cnt += 1
 
+    def _after_rollout_batch(self, n):
+        """Monitor environment after a batch of rollouts.
+
+        Parameters
+        ----------
+        n : int
+            Number of rollouts in the batch.
+        """
+        self.monitor.rollout_cnt += n
+
     def _before_reset(self):
         """Monitor environment before reset.
 
@@ -235,17 +257,12 @@ class AlgoMonitor(object):
             if config.monitor_verbosity > 0:
                 logger.info('Computing traces for %s run...', str(self))
 
-            for parameters in self.monitor.parameters:
-
-                self.policy.parameters = parameters
-
-                # compute trace
-                trace = self.environment._rollout(self.policy)
-                self.monitor.traces.append(trace)
+            rewards, traces = evaluate(self.environment, self.policy,
+                                       self.monitor.parameters, traces=True,
+                                       monitor=False)
 
-                # compute total reward
-                reward = sum([t[2] for t in trace])
-                self.monitor.rewards.append(reward)
+            self.monitor.traces.extend([trace for trace, in traces])
+            self.monitor.rewards.extend(rewards[:, 0])
 
     def _before_step(self):
         """Monitor algorithm before step.
@@ -361,6 +378,9 @@ class AlgoData(object):
         List of traces for parameters.
     rewards : List
         List of rewards for parameters.
+    population_rewards : List
+        Rewards of the population evaluated in each step of population based
+        algorithms.
     """
 
     def __init__(self):
@@ -378,3 +398,4 @@ class AlgoData(object):
         self.parameters = []
         self.traces = []
         self.rewards = []
+        self.population_rewards = []
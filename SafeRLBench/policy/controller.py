@@ -110,6 +110,80 @@ class NonLinearQuadrocopterController(Policy):
 
         return action
 
+    def map_population(self, parameters, states, references=None):
+        """Map a population of states to actions, one per parameter set.
+
+        Vectorized version of `map`, which evaluates the controller with the
+        i-th parameter set on the i-th state.
+
+        Parameters
+        ----------
+        parameters : array-like
+            Array of shape (n, 5) containing the controller parameters.
+        states : array-like
+            Array of shape (n, 22) containing states in the `StateVector`
+            layout.
+        references : array-like
+            Array of shape (n, 22) containing the reference for every state.
+            If None, the current reference of the reference object will be
+            used for all states.
+
+        Returns
+        -------
+        actions : ndarray
+            Array of shape (n, 4) containing the actions.
+        """
+        parameters = np.array(parameters, dtype=float)
+        states = np.asarray(states)
+        if references is None:
+            references = np.atleast_2d(self.reference.reference)
+
+        pos, vel, acc = states[:, 0:3], states[:, 3:6], states[:, 6:9]
+        ref_pos, ref_vel = references[:, 0:3], references[:, 3:6]
+
+        # Make sure the critical parameters are non zero.
+        critical = parameters[:, [0, 1, 3, 4]]
+        if (critical < 1e-3).any():
+            logger.warning('Controller parameters too small, they have been '
+                           + 'clipped to 1e-3"')
+            parameters[:, [0, 1, 3, 4]] = np.maximum(critical, 1e-3)
+        tau_x, tau_y, tau_z, tau_w, zeta = parameters.T
+
+        # desired acceleration in x and y (global coordinates, [m/s^2] )
+        ax = (2. * zeta / tau_x * (ref_vel[:, 0] - vel[:, 0])
+              + 1. / (tau_x**2) * (ref_pos[:, 0] - pos[:, 0]))
+        ay = (2. * zeta / tau_y * (ref_vel[:, 1] - vel[:, 1])
+              + 1. / (tau_y**2) * (ref_pos[:, 1] - pos[:, 1]))
+
+        # Normalize by thrust
+        thrust = np.sqrt(ax**2 + ay**2 + (9.81 + acc[:, 2])**2)
+        ax = ax / thrust
+        ay = ay / thrust
+
+        # Rotate desired accelerations into the yaw-rotated inertial frame
+        yaw = states[:, 11]
+        ax_b = ax * np.cos(yaw) + ay * np.sin(yaw)
+        ay_b = -ax * np.sin(yaw) + ay * np.cos(yaw)
+
+        # Same precision as the actions computed by map.
+        action = np.empty((len(states), 4), dtype=np.float32)
+
+        # Get euler angles from rotation matrix
+        action[:, 1] = np.arcsin(-ay_b)
+        action[:, 0] = np.arcsin(ax_b / np.cos(action[:, 1]))
+
+        # Z-velocity command m/sec)
+        z_err = ref_vel[:, 2] - vel[:, 2]
+        action[:, 2] = (2. * self._zeta_z / tau_z * z_err
+                        + 1. / (tau_z**2) * (ref_pos[:, 2] - pos[:, 2]))
+
+        # Yaw rate command (rad/sec)??
+        yaw_err = (np.mod(references[:, 11] - yaw + np.pi, 2 * np.pi)
+                   - np.pi)
+        action[:, 3] = yaw_err / tau_w + references[:, 17]
+
+        return action
+
     @property
     def parameters(self):
         """Set controller parameters."""
@@ -84,6 +84,85 @@ class LinearPolicy(Policy):
             ret = self._parameters.dot(state) + self._bias
         return ret
 
+    def map_batch(self, states):
+        """Map a batch of states to actions.
+
+        Parameters
+        ----------
+        states : array-like
+            Array of shape (n, d_state) containing elements of state space.
+
+        Returns
+        -------
+        actions : ndarray
+            Array of shape (n, d_action) containing the actions, or shape
+            (n,) if d_action is 1.
+        """
+        states = np.reshape(states, (len(states), self.d_state))
+        weights = self._parameters.reshape(self.d_action, self.d_state)
+        actions = states.dot(weights.T) + self._bias
+        return self._batch_actions(actions)
+
+    def map_population(self, parameters, states):
+        """Map a population of states to actions, one per parameter set.
+
+        Vectorized version of `map`, which evaluates the policy with the
+        i-th parameter set on the i-th state.
+
+        Parameters
+        ----------
+        parameters : array-like
+            Array of shape (n, ...) containing parameter sets in the same
+            representation as accepted by `parameters`.
+        states : array-like
+            Array of shape (n, d_state) containing elements of state space.
+
+        Returns
+        -------
+        actions : ndarray
+            Array of shape (n, d_action) containing the actions, or shape
+            (n,) if d_action is 1.
+        """
+        n = len(parameters)
+        parameters = np.reshape(parameters, (n, -1))
+        states = np.reshape(states, (n, self.d_state))
+
+        weights = parameters[:, 0:self.par_dim].reshape(n, self.d_action,
+                                                        self.d_state)
+        actions = np.einsum('pij,pj->pi', weights, states)
+        if self.biased:
+            actions += parameters[:, self.par_dim:]
+        return self._batch_actions(actions)
+
+    def _batch_actions(self, actions):
+        if self.d_action == 1:
+            return actions[:, 0]
+        return actions
+
+    def jacobians(self, state):
+        """Compute the derivatives of the action.
+
+        Parameters
+        ----------
+        state : array-like
+            Element of state space.
+
+        Returns
+        -------
+        da_ds : ndarray
+            Derivative of the action with respect to the flattened state with
+            shape (d_action, d_state).
+        da_dpar : ndarray
+            Derivative of the action with respect to the flattened parameters
+            with shape (d_action, parameters.size).
+        """
+        state = np.ravel(state)
+        da_ds = self._parameters.reshape(self.d_action, self.d_state)
+        da_dpar = np.kron(np.eye(self.d_action), state)
+        if self.biased:
+            da_dpar = np.c_[da_dpar, np.ones(self.d_action)]
+        return da_ds, da_dpar
+
     @property
     def parameters(self):
         """Property to access parameters.
@@ -182,6 +261,32 @@ class DiscreteLinearPolicy(LinearPolicy):
 
         return action
 
+    def map_batch(self, states):
+        """Map a batch of states to the discrete action space.
+
+        See `LinearPolicy.map_batch`.
+        """
+        cont_actions = super(DiscreteLinearPolicy, self).map_batch(states)
+        return self._discretize(cont_actions)
+
+    def map_population(self, parameters, states):
+        """Map a population of states to the discrete action space.
+
+        See `LinearPolicy.map_population`.
+        """
+        cont_actions = super(DiscreteLinearPolicy,
+                             self).map_population(parameters, states)
+        return self._discretize(cont_actions)
+
+    def _discretize(self, cont_actions):
+        if self.d_action == 1:
+            return (cont_actions >= 0).astype(int)
+        return (cont_actions > 0).astype(int)
+
+    def jacobians(self, state):
+        """Raise NotImplementedError, discrete actions are not smooth."""
+        raise NotImplementedError('Discrete actions are not differentiable.')
+
 
 class NoisyLinearPolicy(LinearPolicy, ProbPolicy):
     """
@@ -201,10 +306,14 @@ class NoisyLinearPolicy(LinearPolicy, ProbPolicy):
         Boolean indicating if parameters have been initialized.
     biased : boolean
         Flag indicating if the policy is supposed to be biased or not.
+    random_state : RandomState
+        Random number generator of the noise.
+    seed : int
+        Seed of the random number generator, assigning a seed reseeds it.
     """
 
     def __init__(self, d_state, d_action, sigma,
-                 par=None, par_space=None, biased=False):
+                 par=None, par_space=None, biased=False, seed=None):
         """Initialize Noisy Linear Policy.
 
         Parameters
@@ -222,16 +331,30 @@ class NoisyLinearPolicy(LinearPolicy, ProbPolicy):
             (d_state * d_action,)
         biased : boolean
             Flag indicating if the policy is supposed to be biased or not.
+        seed : int
+            Seed for the random number generator of the noise.
         """
         assert(d_state > 0 and d_action > 0)
 
         self.sigma = sigma
 
         self.random_state = np.random.RandomState()
+        self.seed = seed
 
         super(NoisyLinearPolicy, self).__init__(d_state, d_action, par,
                                                 par_space, biased)
 
+    @property
+    def seed(self):
+        """Seed of the noise."""
+        return self._seed
+
+    @seed.setter
+    def seed(self, value):
+        if value is not None:
+            self.random_state.seed(value)
+        self._seed = value
+
     def map(self, state):
         """Map a state to an action.
 
@@ -248,7 +371,94 @@ class NoisyLinearPolicy(LinearPolicy, ProbPolicy):
         noise = self.random_state.normal(0, self.sigma)
         return super(NoisyLinearPolicy, self).map(state) + noise
 
+    def map_batch(self, states):
+        """Map a batch of states to noisy actions.
+
+        See `LinearPolicy.map_batch`, as for `map` a single noise sample is
+        drawn for every state.
+        """
+        actions = super(NoisyLinearPolicy, self).map_batch(states)
+        return self._add_noise(actions)
+
+    def map_population(self, parameters, states):
+        """Map a population of states to noisy actions.
+
+        See `LinearPolicy.map_population`, as for `map` a single noise sample
+        is drawn for every state.
+        """
+        actions = super(NoisyLinearPolicy,
+                        self).map_population(parameters, states)
+        return self._add_noise(actions)
+
+    def _add_noise(self, actions):
+        noise = self.random_state.normal(0, self.sigma, len(actions))
+        if actions.ndim > 1:
+            noise = noise[:, None]
+        return actions + noise
+
     def grad_log_prob(self, state, action):
-        """Compute the gradient of the logarithm of the probability dist."""
-        noise = action - super(NoisyLinearPolicy, self).map(state)
-        return - 2 * noise * self.parameters / self.sigma**2
+        """Compute the gradient of the logarithm of the probability dist.
+
+        For the gaussian density of the action around the linear mapping,
+        the gradient is (action - mapping) * d(mapping)/d(parameters) /
+        sigma**2.
+        """
+        noise = (np.ravel(action)
+                 - np.ravel(super(NoisyLinearPolicy, self).map(state)))
+        _, da_dpar = self.jacobians(state)
+        grad = noise.dot(da_dpar) / self.sigma**2
+        return grad.reshape(np.shape(self.parameters))
+
+    def log_prob(self, state, action):
+        """Compute the logarithm of the gaussian density of the action."""
+        noise = (np.ravel(action)
+                 - np.ravel(super(NoisyLinearPolicy, self).map(state)))
+        return np.sum(-0.5 * (noise / self.sigma)**2
+                      - np.log(self.sigma * np.sqrt(2 * np.pi)))
+
+    def log_prob_batch(self, states, actions):
+        """Compute log_prob for every state action pair of a trace.
+
+        Parameters
+        ----------
+        states : array-like
+            Array of shape (h, d_state) containing the states.
+        actions : array-like
+            Array of shape (h, d_action) containing the actions.
+
+        Returns
+        -------
+        log_probs : ndarray
+            Array of shape (h,).
+        """
+        h = len(actions)
+        mean = super(NoisyLinearPolicy, self).map_batch(states)
+        noise = np.reshape(actions, (h, -1)) - np.reshape(mean, (h, -1))
+        return np.sum(-0.5 * (noise / self.sigma)**2
+                      - np.log(self.sigma * np.sqrt(2 * np.pi)), axis=1)
+
+    def grad_log_prob_batch(self, states, actions):
+        """Compute grad_log_prob for every state action pair of a trace.
+
+        Parameters
+        ----------
+        states : array-like
+            Array of shape (h, d_state) containing the states.
+        actions : array-like
+            Array of shape (h, d_action) containing the actions.
+
+        Returns
+        -------
+        grads : ndarray
+            Array of shape (h,) + parameters.shape.
+        """
+        h = len(actions)
+        states = np.reshape(states, (h, self.d_state))
+        mean = super(NoisyLinearPolicy, self).map_batch(states)
+        noise = (np.reshape(actions, (h, -1))
+                 - np.reshape(mean, (h, -1))) / self.sigma**2
+
+        grads = np.einsum('hk,hj->hkj', noise, states).reshape(h, -1)
+        if self.biased:
+            grads = np.c_[grads, noise.sum(axis=1)]
+        return grads.reshape((h,) + np.shape(self.parameters))
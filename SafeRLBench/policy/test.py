@@ -7,6 +7,7 @@ from SafeRLBench.envs._quadrocopter import StateVector
 from SafeRLBench.policy import (NeuralNetwork,
                                 LinearPolicy,
                                 DiscreteLinearPolicy,
+                                NoisyLinearPolicy,
                                 NonLinearQuadrocopterController)
 
 import numpy as np
@@ -154,6 +155,122 @@ class TestLinearPolicy(TestCase):
         assert(all(dp2([1, 1]) == [1, 0]))
         assert(all(dp2([-1, -1]) == [0, 1]))
 
+    def test_map_batch(self):
+        """Test: LINEARPOLICY: batched maps."""
+        random = np.random.RandomState(0)
+        states = random.randn(6, 3)
+
+        for cls in [LinearPolicy, DiscreteLinearPolicy]:
+            for d_action, biased in [(1, True), (2, True), (2, False)]:
+                size = 3 * d_action + biased
+                parameters = random.randn(6, size)
+                lp = cls(3, d_action, par=parameters[0])
+
+                actions = lp.map_batch(states)
+                population = lp.map_population(parameters, states)
+                for n, state in enumerate(states):
+                    assert(np.allclose(actions[n], lp(state)))
+
+                for par, state, action in zip(parameters, states, population):
+                    lp.parameters = par
+                    assert(np.allclose(action, lp(state)))
+
+        nlp = NoisyLinearPolicy(3, 2, .1, par=random.randn(6))
+        nlp.random_state.seed(0)
+        actions = nlp.map_batch(states)
+        nlp.random_state.seed(0)
+        for state, action in zip(states, actions):
+            assert(np.allclose(action, nlp(state)))
+
+    def test_grad_log_prob_batch(self):
+        """Test: NOISYLINEARPOLICY: batched grad_log_prob."""
+        random = np.random.RandomState(0)
+        states = random.randn(5, 2, 1)
+        actions = random.randn(5, 1)
+
+        for par in [random.randn(3), random.randn(2)]:
+            nlp = NoisyLinearPolicy(2, 1, .1, par=par)
+            grads = nlp.grad_log_prob_batch(states, actions)
+
+            self.assertEqual(grads.shape, (5,) + par.shape)
+            for grad, state, action in zip(grads, states, actions):
+                assert(np.allclose(grad, nlp.grad_log_prob(state, action)))
+
+    def test_grad_log_prob(self):
+        """Test: NOISYLINEARPOLICY: score function of the gaussian density."""
+        random = np.random.RandomState(0)
+        states = random.randn(4, 2, 1)
+
+        def log_density(nlp, state, action):
+            mean = np.ravel(LinearPolicy.map(nlp, state))
+            return np.sum(-0.5 * ((np.ravel(action) - mean) / nlp.sigma)**2)
+
+        for d_action, par in [(1, random.randn(3)), (1, random.randn(2)),
+                              (2, random.randn(2, 2))]:
+            nlp = NoisyLinearPolicy(2, d_action, .5, par=par)
+            actions = random.randn(4, d_action)
+
+            grads = nlp.grad_log_prob_batch(states, actions)
+            self.assertEqual(grads.shape, (4,) + par.shape)
+
+            # central differences of the log density
+            for grad, state, action in zip(grads, states, actions):
+                assert(np.allclose(grad, nlp.grad_log_prob(state, action)))
+                for idx in np.ndindex(par.shape):
+                    variation = np.zeros(par.shape)
+                    variation[idx] = 1e-6
+                    nlp.parameters = par + variation
+                    plus = log_density(nlp, state, action)
+                    nlp.parameters = par - variation
+                    minus = log_density(nlp, state, action)
+                    nlp.parameters = par
+                    self.assertAlmostEqual(grad[idx], (plus - minus) / 2e-6,
+                                           places=5)
+
+    def test_log_prob(self):
+        """Test: NOISYLINEARPOLICY: log probabilities."""
+        random = np.random.RandomState(0)
+        states = random.randn(5, 2, 1)
+        actions = random.randn(5, 1)
+
+        nlp = NoisyLinearPolicy(2, 1, .5, par=random.randn(3))
+        log_probs = nlp.log_prob_batch(states, actions)
+
+        self.assertEqual(log_probs.shape, (5,))
+        for log_prob, state, action in zip(log_probs, states, actions):
+            mean = LinearPolicy.map(nlp, state)
+            density = (np.exp(-(action - mean)**2 / (2 * .5**2))
+                       / np.sqrt(2 * np.pi * .5**2))
+            self.assertAlmostEqual(log_prob, np.log(density).item())
+            self.assertAlmostEqual(log_prob, nlp.log_prob(state, action))
+
+        # multiple actions are independent gaussians
+        nlp = NoisyLinearPolicy(2, 2, .5, par=random.randn(2, 2))
+        actions = random.randn(5, 2)
+        log_probs = nlp.log_prob_batch(states, actions)
+        for log_prob, state, action in zip(log_probs, states, actions):
+            self.assertAlmostEqual(log_prob, nlp.log_prob(state, action))
+
+    def test_jacobians(self):
+        """Test: LINEARPOLICY: jacobians."""
+        lp = LinearPolicy(3, 2, par=np.arange(7.))
+        state = np.array([1., -2., .5])
+
+        da_ds, da_dpar = lp.jacobians(state)
+        self.assertEqual(da_ds.shape, (2, 3))
+        self.assertEqual(da_dpar.shape, (2, 7))
+
+        # the map is linear in the state and the parameters.
+        delta = np.array([.1, .2, -.3])
+        assert(np.allclose(lp(state + delta) - lp(state), da_ds.dot(delta)))
+
+        mapped = lp(state)
+        lp.parameters = np.arange(7.) + delta[0]
+        assert(np.allclose(lp(state) - mapped, da_dpar.sum(axis=1) * .1))
+
+        with self.assertRaises(NotImplementedError):
+            DiscreteLinearPolicy(2, 1, par=[1, 1]).jacobians([1, 1])
+
 
 class TestController(TestCase):
     """Test NonLinearQuadrocopterController."""
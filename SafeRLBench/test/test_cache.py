@@ -0,0 +1,111 @@
+from SafeRLBench import config, evaluate
+from SafeRLBench.cache import RolloutCache
+from SafeRLBench.envs import LinearCar, GeneralMountainCar
+from SafeRLBench.policy import LinearPolicy, NoisyLinearPolicy
+
+from unittest2 import TestCase
+
+import numpy as np
+
+
+class TestRolloutCache(TestCase):
+    """Test RolloutCache class."""
+
+    def tearDown(self):
+        config.rollout_cache_set(None)
+
+    def test_lru(self):
+        """Test: CACHE: least recently used eviction and counters."""
+        cache = RolloutCache(2)
+
+        cache.put('a', [1])
+        cache.put('b', [2])
+        self.assertEqual(cache.get('a'), [1])
+
+        # 'b' is now the least recently used entry
+        cache.put('c', [3])
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 0)
+
+        with self.assertRaises(ValueError):
+            RolloutCache(0)
+
+    def test_rollout_memoization(self):
+        """Test: CACHE: rollouts of deterministic environments."""
+        config.rollout_cache_set(8)
+        cache = config.rollout_cache
+
+        for env in [LinearCar(), GeneralMountainCar()]:
+            cache.clear()
+            policy = LinearPolicy(2, 1, par=[.5, -.3, .1])
+
+            trace = env.rollout(policy)
+            cnt = env.monitor.rollout_cnt
+
+            # same configuration and parameters are served from the cache
+            cached = env.rollout(policy)
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(env.monitor.rollout_cnt, cnt)
+            self.assertEqual(len(cached), len(trace))
+            for (a1, s1, r1), (a2, s2, r2) in zip(trace, cached):
+                self.assertTrue(np.all(s1 == s2))
+                self.assertEqual(r1, r2)
+
+            # changing the parameters or the configuration misses
+            policy.parameters = [.5, -.3, .2]
+            env.rollout(policy)
+            env.horizon = 10
+            self.assertEqual(len(env.rollout(policy)), 10)
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(cache.misses, 3)
+
+    def test_rollout_not_cached(self):
+        """Test: CACHE: stochastic policies and disabled cache."""
+        env = LinearCar()
+        policy = NoisyLinearPolicy(2, 1, sigma=.1, par=[.5, -.3, .1])
+
+        config.rollout_cache_set(8)
+        env.rollout(policy)
+        env.rollout(policy)
+        self.assertEqual(len(config.rollout_cache), 0)
+        self.assertEqual(config.rollout_cache.misses, 0)
+
+        config.rollout_cache_set(0)
+        self.assertIsNone(config.rollout_cache)
+        env.rollout(LinearPolicy(2, 1, par=[.5, -.3, .1]))
+        self.assertEqual(env.monitor.rollout_cnt, 3)
+
+    def test_rollout_copies(self):
+        """Test: CACHE: modifying returned traces does not affect the cache."""
+        config.rollout_cache_set(8)
+        env = LinearCar()
+        policy = LinearPolicy(2, 1, par=[.5, -.3, .1])
+
+        trace = env.rollout(policy)
+        state = trace[0][1].copy()
+        trace[0][1][:] = 0.
+
+        cached = env.rollout(policy)
+        cached[0][1][:] = 1.
+        self.assertTrue(np.all(env.rollout(policy)[0][1] == state))
+
+    def test_evaluate_counts_misses(self):
+        """Test: CACHE: evaluate does not count cache hits."""
+        config.rollout_cache_set(8)
+        env = LinearCar()
+        policy = LinearPolicy(2, 1, par=[.5, -.3, .1])
+        parameters = [[.5, -.3, .1], [.5, -.3, .2]]
+
+        env.rollout(policy)
+        cnt = env.monitor.rollout_cnt
+
+        evaluate(env, policy, parameters, n_episodes=2)
+        self.assertEqual(env.monitor.rollout_cnt, cnt + 1)
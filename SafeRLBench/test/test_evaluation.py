@@ -0,0 +1,93 @@
+from SafeRLBench import evaluate
+from SafeRLBench.envs import LinearCar
+from SafeRLBench.policy import LinearPolicy, NoisyLinearPolicy
+
+from unittest2 import TestCase
+
+import numpy as np
+
+
+class TestEvaluate(TestCase):
+    """Test evaluate function."""
+
+    def setUp(self):
+        self.parameters = np.array([[-.5, -1.2, .3],
+                                    [-1., -1., 0.],
+                                    [-.2, -.8, .1]])
+
+    def test_backends(self):
+        """Test: EVALUATE: backends agree on deterministic rollouts."""
+        env = LinearCar(horizon=20)
+        policy = LinearPolicy(2, 1, par=[.5, -.3, .1])
+
+        expected = np.zeros((3, 1))
+        for n, par in enumerate(self.parameters):
+            policy.parameters = par
+            expected[n] = sum([t[2] for t in env.rollout(policy)])
+        policy.parameters = [.5, -.3, .1]
+
+        for backend in ['serial', 'vectorized', 'thread', 'process']:
+            cnt = env.monitor.rollout_cnt
+            rewards = evaluate(env, policy, self.parameters, n_episodes=2,
+                               backend=backend, n_jobs=2)
+
+            self.assertEqual(rewards.shape, (3, 2))
+            assert(np.allclose(rewards, expected))
+            assert(np.all(policy.parameters == [.5, -.3, .1]))
+            self.assertEqual(env.monitor.rollout_cnt, cnt + 6)
+
+        # environment factories are not monitored
+        rewards = evaluate(lambda: LinearCar(horizon=20), policy,
+                           self.parameters, backend='thread', n_jobs=2)
+        assert(np.allclose(rewards, expected))
+
+        with self.assertRaises(ValueError):
+            evaluate(env, policy, self.parameters, backend='gpu')
+
+    def test_seeds_and_traces(self):
+        """Test: EVALUATE: common random numbers and traces."""
+        env = LinearCar(horizon=20)
+        policy = NoisyLinearPolicy(2, 1, sigma=.1, par=[-1., -1.])
+        parameters = np.array([[-1., -1.], [-1., -1.]])
+
+        rewards, traces = evaluate(env, policy, parameters, n_episodes=2,
+                                   seeds=[0, 1], traces=True, average=True)
+
+        # equal parameters see the same noise within an episode
+        self.assertEqual(rewards[0, 0], rewards[1, 0])
+        self.assertNotEqual(rewards[0, 0], rewards[0, 1])
+        self.assertEqual(len(traces), 2)
+        self.assertAlmostEqual(rewards[1, 1],
+                               np.mean([t[2] for t in traces[1][1]]))
+
+        process = evaluate(LinearCar(horizon=20), policy, parameters,
+                           n_episodes=2, seeds=[0, 1], average=True,
+                           backend='process', n_jobs=2)
+        assert(np.allclose(process, rewards))
+
+        with self.assertRaises(ValueError):
+            evaluate(env, policy, parameters, backend='vectorized',
+                     traces=True)
+
+    def test_process_pool(self):
+        """Test: EVALUATE: process pools persist and replicas stay fresh."""
+        from SafeRLBench import evaluation
+
+        env = LinearCar(horizon=20)
+        policy = LinearPolicy(2, 1, par=[.5, -.3, .1])
+
+        rewards = evaluate(env, policy, self.parameters, backend='process',
+                           n_jobs=2, monitor=False)
+        pool = evaluation._pools[(id(env), 2)][0]
+        again = evaluate(env, policy, self.parameters, backend='process',
+                         n_jobs=2, monitor=False)
+        assert(evaluation._pools[(id(env), 2)][0] is pool)
+        assert(np.allclose(again, rewards))
+
+        # changes of the environment reach the replicas
+        env.horizon = 10
+        expected = evaluate(env, policy, self.parameters)
+        changed = evaluate(env, policy, self.parameters, backend='process',
+                           n_jobs=2, monitor=False)
+        assert(np.allclose(changed, expected))
+        assert(not np.allclose(changed, rewards))
@@ -0,0 +1,86 @@
+"""Benchmark for the GPOMDP estimator in the horizon.
+
+Measures the time per trace spent on baselines and gradient by the former
+nested loop implementation and by the cumulative sums of
+``GPOMDPEstimator``, as well as the time per trace of the complete estimator
+on a LinearCar.
+
+Usage: python misc/benchmarks/gpomdp.py
+"""
+from __future__ import print_function, division
+
+import timeit
+
+import numpy as np
+
+from SafeRLBench.algo.policygradient import GPOMDPEstimator
+from SafeRLBench.envs import LinearCar
+from SafeRLBench.policy import NoisyLinearPolicy
+
+
+def loop_update(scores, rewards, b_nom, b_div, n):
+    """Former O(horizon^2) update for a single trace."""
+    h = len(scores)
+    shape = scores.shape[1:]
+    b_n = np.zeros((h,) + shape)
+    for k in range(h):
+        update = scores[k]
+        for j in range(k + 1):
+            b_n[j] += update
+
+    fac = n / (n + 1)
+    b_n = b_n**2
+    b_div = fac * b_div + b_n / (n + 1)
+    for k in range(h):
+        b_nom[k] = fac * b_nom[k]
+        b_nom[k] += b_n[k] * rewards[k] / (n + 1)
+    b = b_nom / b_div
+
+    grad_update = np.zeros(shape)
+    update = np.zeros(shape)
+    for k in range(h):
+        update += scores[k]
+        grad_update += update * (-b[k] + rewards[k])
+    return grad_update
+
+
+def cumsum_update(scores, rewards, b_nom, b_div):
+    """Cumulative sum update for a single trace."""
+    b_n = np.cumsum(scores[::-1], axis=0)[::-1]**2
+    b_nom = b_nom + b_n * rewards[:, None]
+    b_div = b_div + b_n
+    b = b_nom / b_div
+    return (np.cumsum(scores, axis=0) * (rewards[:, None] - b)).sum(axis=0)
+
+
+def main(horizons=(50, 100, 200, 400, 800), number=5):
+    """Run the benchmark."""
+    random = np.random.RandomState(0)
+
+    print('%8s %14s %14s %16s' % ('horizon', 'loop [ms]', 'cumsum [ms]',
+                                  'estimator [ms]'))
+    for h in horizons:
+        scores = random.randn(h, 3)
+        rewards = random.randn(h)
+        b_nom = np.ones((h, 3))
+        b_div = np.ones((h, 3))
+
+        t_loop = timeit.timeit(
+            lambda: loop_update(scores, rewards, b_nom.copy(), b_div, 1),
+            number=number) / number * 1e3
+        t_cumsum = timeit.timeit(
+            lambda: cumsum_update(scores, rewards, b_nom, b_div),
+            number=number) / number * 1e3
+
+        env = LinearCar(horizon=h)
+        policy = NoisyLinearPolicy(2, 1, 0.1, par=np.array([-1., -1., 0.]))
+        estimator = GPOMDPEstimator(env, policy.parameter_space, max_it=10,
+                                    eps=0, batch_size=10)
+        t_est = timeit.timeit(lambda: estimator(policy),
+                              number=1) / 10 * 1e3
+
+        print('%8d %14.3f %14.3f %16.3f' % (h, t_loop, t_cumsum, t_est))
+
+
+if __name__ == '__main__':
+    main()
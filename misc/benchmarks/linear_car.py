@@ -0,0 +1,46 @@
+"""Microbenchmark for batched LinearCar rollouts.
+
+Compares the closed form ``LinearCar.rollout_batch`` for linear policies with
+the sequential default implementation.
+
+Usage: python misc/benchmarks/linear_car.py
+"""
+from __future__ import print_function, division
+
+import timeit
+
+import numpy as np
+
+from SafeRLBench import EnvironmentBase
+from SafeRLBench.envs import LinearCar
+from SafeRLBench.policy import LinearPolicy
+
+
+def main(n=300, horizon=200, number=3):
+    """Run the benchmark."""
+    random = np.random.RandomState(0)
+    parameters = np.c_[-3 * random.rand(n, 2), random.rand(n) - .5]
+
+    env = LinearCar(horizon=horizon)
+    policy = LinearPolicy(2, 1, par=parameters[0])
+
+    def sequential():
+        return EnvironmentBase._rollout_batch(env, policy, parameters)
+
+    def batch():
+        return env._rollout_batch(policy, parameters)
+
+    error = np.abs(sequential()[0] - batch()[0]).max()
+
+    t_loop = timeit.timeit(sequential, number=number) / number * 1e3
+    t_batch = timeit.timeit(batch, number=number) / number * 1e3
+
+    print('%d parameters, horizon %d' % (n, horizon))
+    print('sequential [ms] %10.3f' % t_loop)
+    print('batch [ms]      %10.3f' % t_batch)
+    print('speedup         %9.1fx' % (t_loop / t_batch))
+    print('max abs error   %10.3g' % error)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Microbenchmark for the quadrotor dynamics step.
+
+Times ``QuadrotorDynamics.update_position`` with the available integration
+schemes.
+
+Usage: python misc/benchmarks/quadrotor_dynamics.py
+"""
+from __future__ import print_function, division
+
+import timeit
+
+import numpy as np
+
+from SafeRLBench.envs._quadrocopter import QuadrotorDynamics
+from SafeRLBench.envs._quadrocopter.quadrotor_dynamics import INTEGRATORS
+
+
+def main(steps=20000):
+    """Run the benchmark."""
+    inputs = np.array([0.01, -0.02, 0.1, 0.05])
+
+    for integrator in INTEGRATORS:
+        model = QuadrotorDynamics(np.array([1., 0., 0.]),
+                                  np.array([0., np.pi / 2, 0.]),
+                                  integrator=integrator)
+        t = timeit.timeit(lambda: model.update_position(inputs),
+                          number=steps)
+        print('%-14s %10.0f steps/sec' % (integrator, steps / t))
+
+
+if __name__ == '__main__':
+    main()
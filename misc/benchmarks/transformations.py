@@ -0,0 +1,58 @@
+"""Microbenchmark for the batched rotation conversions.
+
+Compares the batched conversions in ``transformations`` and ``quaternions``
+with loops over the per-rotation functions.
+
+Usage: python misc/benchmarks/transformations.py
+"""
+from __future__ import print_function, division
+
+import timeit
+
+import numpy as np
+
+from SafeRLBench.envs._quadrocopter import quaternions as quat
+from SafeRLBench.envs._quadrocopter import transformations as tf
+
+
+def main(n=1000, number=10):
+    """Run the benchmark."""
+    random = np.random.RandomState(0)
+    angles = 2 * np.pi * random.rand(3, n)
+    matrices = tf.euler_matrix_batch(*angles)
+    q = tf.quaternion_from_euler_batch(*angles)
+    omega = random.randn(n, 3)
+
+    cases = [
+        ('euler_matrix',
+         lambda: [tf.euler_matrix(*a) for a in angles.T],
+         lambda: tf.euler_matrix_batch(*angles)),
+        ('euler_from_matrix',
+         lambda: [tf.euler_from_matrix(m) for m in matrices],
+         lambda: tf.euler_from_matrix_batch(matrices)),
+        ('quaternion_from_euler',
+         lambda: [tf.quaternion_from_euler(*a) for a in angles.T],
+         lambda: tf.quaternion_from_euler_batch(*angles)),
+        ('global_to_body',
+         lambda: [quat.global_to_body(x, w) for x, w in zip(q, omega)],
+         lambda: quat.global_to_body_batch(q, omega)),
+        ('body_to_global',
+         lambda: [quat.body_to_global(x, w) for x, w in zip(q, omega)],
+         lambda: quat.body_to_global_batch(q, omega)),
+        ('apply_omega_to_quat',
+         lambda: [quat.apply_omega_to_quat(x, w, 0.01)
+                  for x, w in zip(q, omega)],
+         lambda: quat.apply_omega_to_quat_batch(q, omega, 0.01)),
+    ]
+
+    print('%d rotations' % n)
+    print('%-22s %10s %10s %9s' % ('', 'loop [ms]', 'batch [ms]', 'speedup'))
+    for name, loop, batch in cases:
+        t_loop = timeit.timeit(loop, number=number) / number * 1e3
+        t_batch = timeit.timeit(batch, number=number) / number * 1e3
+        speedup = t_loop / t_batch
+        print('%-22s %10.3f %10.3f %8.1fx' % (name, t_loop, t_batch, speedup))
+
+
+if __name__ == '__main__':
+    main()